@@ -4,6 +4,6 @@ Exports all routers for import in main.py.
 """
 
 # This file makes app/api a Python package
-# and allows imports like: from app.api import public, quiz, progress, essays, admin, chat
+# and allows imports like: from app.api import public, quiz, progress, essays, admin, chat, rag
 
-__all__ = ["public", "quiz", "progress", "essays", "admin", "chat"]
\ No newline at end of file
+__all__ = ["public", "quiz", "progress", "essays", "admin", "chat", "rag"]
\ No newline at end of file
@@ -2,18 +2,31 @@
 Admin routes - requires API key + admin UUID.
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.auth import verify_admin, UserContext
-from app.core.database import supabase_admin
+from app.core.database import supabase_admin, get_db
 from app.services.pdf_service import pdf_service
 from app.services.rag_service import rag_service
+from app.services.corpus_service import corpus_service
+from app.services.index_health_service import index_health_service
+from app.services.llm_metrics import llm_metrics
+from app.services.circuit_breaker import circuit_breakers
+from app.services.model_router import model_router
+from app.services.prompt_context_service import prompt_context_service
+from app.models.models import EssayPrompt
 from app.schemas import (
-    SubjectEnum, BLLRuleIngest, BLLRule, AdminStats, UserInfo
+    SubjectEnum, BLLRuleIngest, BLLRule, AdminStats, UserInfo, IndexHealthReport, LLMUsageReport,
+    EssayPromptCreate, EssayPromptInfo
 )
-from typing import List
+from typing import List, Optional
 import tempfile
 import os
+import logging
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
@@ -82,6 +95,9 @@ async def ingest_shorter_pdf(
                 except Exception as e:
                     errors.append(f"Failed to create embedding: {str(e)}")
         
+        corpus_service.bump_via_supabase(supabase_admin, subject)
+        prompt_context_service.request_refresh(subject)
+        
     except Exception as e:
         errors.append(f"PDF processing error: {str(e)}")
     finally:
@@ -158,6 +174,8 @@ async def upload_statute_pdf(
             supabase_admin.table("study_materials").update({
                 "is_processed": True
             }).eq("id", material_id).execute()
+            corpus_service.bump_via_supabase(supabase_admin, subject)
+            prompt_context_service.request_refresh(subject)
             
         finally:
             os.unlink(temp_path)
@@ -221,6 +239,91 @@ async def get_admin_stats(
     )
 
 
+@router.get("/index-health", response_model=IndexHealthReport)
+async def get_index_health(
+    db: AsyncSession = Depends(get_db),
+    admin: UserContext = Depends(verify_admin)
+):
+    """
+    Vector index health and per-subject corpus statistics.
+    
+    Each index carries a `reindex_recommended` flag with its reasons; run
+    scripts/rebuild_vector_index.py when the top-level flag is set.
+    """
+    return await index_health_service.report(db)
+
+
+@router.get("/index-health/metrics", response_class=PlainTextResponse)
+async def get_index_health_metrics(
+    db: AsyncSession = Depends(get_db),
+    admin: UserContext = Depends(verify_admin)
+):
+    """Index health in Prometheus text format (for scraping)."""
+    report = await index_health_service.report(db)
+    return PlainTextResponse(
+        index_health_service.to_prometheus(report),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@router.get("/llm-usage", response_model=LLMUsageReport)
+async def get_llm_usage(admin: UserContext = Depends(verify_admin)):
+    """
+    OpenAI tokens, cost, latency and retries per route/kind/model, totals
+    per user, cache hit rates, circuit breaker states and model routes -
+    since this instance started.
+    """
+    return {
+        **llm_metrics.snapshot(),
+        "circuits": circuit_breakers.stats(),
+        "routes": model_router.stats()
+    }
+
+
+@router.get("/llm-usage/metrics", response_class=PlainTextResponse)
+async def get_llm_usage_metrics(admin: UserContext = Depends(verify_admin)):
+    """OpenAI usage in Prometheus text format (for scraping)."""
+    return PlainTextResponse(llm_metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/essay-prompts", response_model=EssayPromptInfo)
+async def create_essay_prompt(
+    prompt_data: EssayPromptCreate,
+    db: AsyncSession = Depends(get_db),
+    admin: UserContext = Depends(verify_admin)
+):
+    """
+    Create an essay prompt and precompute its retrieval context (prompt and
+    rubric items), so grading submissions against it only searches for the
+    essay. If that fails the prompt is still created; its context is then
+    computed on the first submission (`context_version` is null until then).
+    """
+    essay_prompt = EssayPrompt(**prompt_data.model_dump())
+    db.add(essay_prompt)
+    await db.commit()
+    await db.refresh(essay_prompt)
+    
+    try:
+        await prompt_context_service.refresh(db, essay_prompt)
+        await db.commit()
+    except Exception as e:
+        logger.warning("Precomputing context for essay prompt %s failed: %s", essay_prompt.id, e)
+        await db.rollback()
+        await db.refresh(essay_prompt)
+    return essay_prompt
+
+
+@router.post("/essay-prompts/refresh-context")
+async def refresh_essay_prompt_context(
+    subject: Optional[SubjectEnum] = None,
+    db: AsyncSession = Depends(get_db),
+    admin: UserContext = Depends(verify_admin)
+):
+    """Recompute stale essay prompt contexts (e.g. right after ingesting materials)."""
+    refreshed = await prompt_context_service.refresh_stale(db, subject)
+    return {"refreshed": refreshed}
+
+
 @router.get("/users", response_model=List[UserInfo])
 async def list_users(
     limit: int = 50,
@@ -311,6 +414,9 @@ async def reset_subject_data(
         "subject", subject.value
     ).execute()
     
+    corpus_service.bump_via_supabase(supabase_admin, subject)
+    prompt_context_service.request_refresh(subject)
+    
     return {
         "message": f"All data for {subject.value} has been deleted",
         "subject": subject.value
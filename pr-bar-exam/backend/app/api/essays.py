@@ -1,103 +1,150 @@
 """
 API endpoints for essay submission and grading.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
-from app.core.database import get_db
+from typing import Any, List, Optional, Tuple, AsyncGenerator
+from app.core.database import get_db, AsyncSessionLocal
 from app.schemas import schemas
-from app.models.models import EssaySubmission, EssayPrompt, User, UserProgress
+from app.models.models import EssaySubmission, EssayPrompt, User
+from app.services.rag_service import async_rag_service
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.deferred_grading_service import (
+    deferred_grading_service, grade_feedback, update_essay_progress
+)
+from app.services.prompt_context_service import prompt_context_service, rubric_items
 from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/essays", tags=["essays"])
 
 
-async def simple_grade_essay(essay_text: str, subject: str, prompt: str) -> dict:
-    """Placeholder grading function."""
-    word_count = len(essay_text.split())
-    score = min(100, (word_count / 500) * 100)
+async def save_graded_essay(
+    db: AsyncSession,
+    user_id: int,
+    essay_data: schemas.EssaySubmit,
+    grade_data: dict
+) -> EssaySubmission:
+    """Store a graded essay and update the user's progress for the subject."""
+    essay_submission = EssaySubmission(
+        user_id=user_id,
+        prompt_id=essay_data.prompt_id,
+        essay_text=essay_data.content,
+        score=grade_data.get("overall_score"),
+        feedback=grade_feedback(grade_data),
+        word_count=len(essay_data.content.split()),
+        submitted_at=datetime.utcnow(),
+        graded_at=datetime.utcnow()
+    )
+    db.add(essay_submission)
+    await db.flush()
     
-    return {
-        "overall_score": round(score, 2),
-        "legal_analysis_score": round(score * 0.9, 2),
-        "writing_quality_score": round(score * 1.0, 2),
-        "citation_accuracy_score": round(score * 0.8, 2),
-        "feedback": f"Essay received. Word count: {word_count}. Full AI grading coming soon!",
-        "point_breakdown": {"introduction": "Good", "analysis": "Needs work", "conclusion": "Adequate"},
-        "citations": []
-    }
+    await update_essay_progress(db, user_id, essay_data.subject, grade_data["overall_score"])
+    
+    await db.commit()
+    await db.refresh(essay_submission)
+    return essay_submission
+
+
+async def resolve_prompt(db: AsyncSession, essay_data: schemas.EssaySubmit) -> schemas.EssaySubmit:
+    """Fill in the prompt text and subject of a submission answering a stored EssayPrompt."""
+    if essay_data.prompt_id is None:
+        if not essay_data.prompt.strip():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="prompt or prompt_id is required")
+        return essay_data
+    essay_prompt = await db.get(EssayPrompt, essay_data.prompt_id)
+    if not essay_prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Essay prompt not found")
+    return essay_data.model_copy(update={"prompt": essay_prompt.prompt_text, "subject": essay_prompt.subject})
+
+
+async def prompt_context(db: AsyncSession, essay_data: schemas.EssaySubmit) -> Tuple[Optional[List[str]], Optional[List[Any]]]:
+    """
+    Rubric items and precomputed retrieval rows of a stored prompt (None,
+    None otherwise); only the essay itself is then searched.
+    """
+    if essay_data.prompt_id is None:
+        return None, None
+    essay_prompt = await db.get(EssayPrompt, essay_data.prompt_id)
+    return rubric_items(essay_prompt), await prompt_context_service.get(db, essay_prompt)
+
+
+async def defer_essay(db: AsyncSession, user_id: int, essay_data: schemas.EssaySubmit) -> EssaySubmission:
+    """Queue a submission for grading once the grading model's circuit closes."""
+    await db.rollback()
+    return await deferred_grading_service.defer(
+        db, user_id, essay_data.subject, essay_data.prompt, essay_data.content,
+        prompt_id=essay_data.prompt_id
+    )
+
+
+@router.get("/prompts", response_model=List[schemas.EssayPromptInfo])
+async def list_prompts(subject: schemas.SubjectEnum = None, db: AsyncSession = Depends(get_db)):
+    """Stored essay prompts (answer one by submitting with its prompt_id)."""
+    query = select(EssayPrompt).order_by(EssayPrompt.id)
+    if subject:
+        query = query.where(EssayPrompt.subject == subject)
+    result = await db.execute(query)
+    return result.scalars().all()
 
 
 @router.post("/submit/{user_id}", response_model=schemas.Essay)
 async def submit_essay(
     user_id: int,
     essay_data: schemas.EssaySubmit,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
-    """Submit an essay for AI grading."""
+    """
+    Submit an essay for AI grading.
+    
+    While grading is unavailable (circuit open) and no cached grade exists,
+    the essay is queued instead: the response is 202 with `grade` null;
+    fetch it later from /essays/{essay_id}.
+    """
     result = await db.execute(select(User).filter(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    essay_data = await resolve_prompt(db, essay_data)
     
     try:
-        grade_data = await simple_grade_essay(
-            essay_text=essay_data.content,
-            subject=essay_data.subject.value,
-            prompt=essay_data.prompt
+        rubric, prompt_rows = await prompt_context(db, essay_data)
+        grade_data = await async_rag_service.grade_essay(
+            db=db,
+            essay_content=essay_data.content,
+            subject=essay_data.subject,
+            prompt=essay_data.prompt,
+            rubric_items=rubric,
+            prompt_rows=prompt_rows
         )
-        
-        essay_submission = EssaySubmission(
-            user_id=user_id,
-            prompt_id=None,
-            essay_text=essay_data.content,
-            score=grade_data.get("overall_score"),
-            feedback={
-                "legal_analysis_score": grade_data.get("legal_analysis_score"),
-                "writing_quality_score": grade_data.get("writing_quality_score"),
-                "citation_accuracy_score": grade_data.get("citation_accuracy_score"),
-                "feedback": grade_data.get("feedback", ""),
-                "point_breakdown": grade_data.get("point_breakdown", {}),
-                "citations": grade_data.get("citations", [])
-            },
-            word_count=len(essay_data.content.split()),
-            submitted_at=datetime.utcnow(),
-            graded_at=datetime.utcnow()
+    except CircuitOpenError:
+        essay_submission = await defer_essay(db, user_id, essay_data)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return schemas.Essay(
+            id=essay_submission.id,
+            user_id=essay_submission.user_id,
+            subject=essay_data.subject,
+            prompt=essay_data.prompt,
+            content=essay_submission.essay_text,
+            submitted_at=essay_submission.submitted_at,
+            grade=None
         )
-        db.add(essay_submission)
-        await db.flush()
-        
-        result = await db.execute(
-            select(UserProgress).filter(
-                UserProgress.user_id == user_id,
-                UserProgress.subject == essay_data.subject
-            )
+    except Exception as e:
+        logger.exception("Essay grading failed")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to grade essay: {str(e)}"
         )
-        progress = result.scalar_one_or_none()
-        
-        if progress:
-            progress.total_essays += 1
-            if progress.avg_essay_score:
-                total_score = progress.avg_essay_score * (progress.total_essays - 1)
-                progress.avg_essay_score = (total_score + grade_data["overall_score"]) / progress.total_essays
-            else:
-                progress.avg_essay_score = grade_data["overall_score"]
-            progress.last_activity = datetime.utcnow()
-        else:
-            progress = UserProgress(
-                user_id=user_id,
-                subject=essay_data.subject,
-                total_questions_attempted=0,
-                correct_answers=0,
-                total_essays=1,
-                avg_essay_score=grade_data["overall_score"],
-                last_activity=datetime.utcnow()
-            )
-            db.add(progress)
-        
-        await db.commit()
-        await db.refresh(essay_submission)
+    
+    try:
+        essay_submission = await save_graded_essay(db, user_id, essay_data, grade_data)
         
         return schemas.Essay(
             id=essay_submission.id,
@@ -113,7 +160,8 @@ async def submit_essay(
                 citation_accuracy_score=essay_submission.feedback.get("citation_accuracy_score"),
                 feedback=essay_submission.feedback.get("feedback", ""),
                 point_breakdown=essay_submission.feedback.get("point_breakdown", {}),
-                citations=essay_submission.feedback.get("citations", [])
+                citations=essay_submission.feedback.get("citations", []),
+                model=essay_submission.feedback.get("model")
             )
         )
     except Exception as e:
@@ -124,6 +172,71 @@ async def submit_essay(
         )
 
 
+def _sse(event: str, data) -> str:
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/submit/{user_id}/stream")
+async def submit_essay_stream(
+    user_id: int,
+    essay_data: schemas.EssaySubmit,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Submit an essay for AI grading, streaming the grade as server-sent events.
+    
+    Events: `token` (raw completion text), `field` ({path, value} as soon as
+    a score, feedback section or citation is complete), `grade` (the stored
+    essay, once the completion finishes) and `error`. While grading is
+    unavailable (circuit open) the essay is queued and a single `deferred`
+    event ({essay_id, detail}) is sent; fetch it later from /essays/{essay_id}.
+    """
+    result = await db.execute(select(User).filter(User.id == user_id))
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    essay_data = await resolve_prompt(db, essay_data)
+    
+    async def stream() -> AsyncGenerator[str, None]:
+        # The request's session is closed once the response starts streaming
+        async with AsyncSessionLocal() as session:
+            try:
+                rubric, prompt_rows = await prompt_context(session, essay_data)
+                
+                grade_data = None
+                async for update in async_rag_service.grade_essay_stream(
+                    db=session,
+                    essay_content=essay_data.content,
+                    subject=essay_data.subject,
+                    prompt=essay_data.prompt,
+                    rubric_items=rubric,
+                    prompt_rows=prompt_rows
+                ):
+                    if update["event"] == "grade":
+                        grade_data = update["data"]
+                    else:
+                        yield _sse(update["event"], update["data"])
+                
+                essay_submission = await save_graded_essay(session, user_id, essay_data, grade_data)
+                yield _sse("grade", {"essay_id": essay_submission.id, **grade_data})
+            except CircuitOpenError as e:
+                essay_submission = await defer_essay(session, user_id, essay_data)
+                yield _sse("deferred", {
+                    "essay_id": essay_submission.id,
+                    "detail": f"Grading is temporarily unavailable; your essay is queued ({e})"
+                })
+            except Exception as e:
+                logger.exception("Streaming essay grading failed")
+                await session.rollback()
+                yield _sse("error", {"detail": f"Failed to grade essay: {str(e)}"})
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/user/{user_id}", response_model=List[schemas.Essay])
 async def get_user_essays(user_id: int, subject: str = None, db: AsyncSession = Depends(get_db)):
     """Get all essays submitted by a user."""
@@ -147,8 +260,9 @@ async def get_user_essays(user_id: int, subject: str = None, db: AsyncSession =
                 citation_accuracy_score=essay.feedback.get("citation_accuracy_score") if essay.feedback else None,
                 feedback=essay.feedback.get("feedback", "") if essay.feedback else "",
                 point_breakdown=essay.feedback.get("point_breakdown", {}) if essay.feedback else {},
-                citations=essay.feedback.get("citations", []) if essay.feedback else []
-            ) if essay.feedback else None
+                citations=essay.feedback.get("citations", []) if essay.feedback else [],
+                model=essay.feedback.get("model") if essay.feedback else None
+            ) if essay.feedback and essay.score is not None else None
         ))
     return response
 
@@ -176,6 +290,7 @@ async def get_essay(essay_id: int, db: AsyncSession = Depends(get_db)):
             citation_accuracy_score=essay.feedback.get("citation_accuracy_score") if essay.feedback else None,
             feedback=essay.feedback.get("feedback", "") if essay.feedback else "",
             point_breakdown=essay.feedback.get("point_breakdown", {}) if essay.feedback else {},
-            citations=essay.feedback.get("citations", []) if essay.feedback else []
-        ) if essay.feedback else None
+            citations=essay.feedback.get("citations", []) if essay.feedback else [],
+            model=essay.feedback.get("model") if essay.feedback else None
+        ) if essay.feedback and essay.score is not None else None
     )
\ No newline at end of file
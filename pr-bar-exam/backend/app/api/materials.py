@@ -10,6 +10,8 @@ from app.schemas import schemas
 from app.models.models import StudyMaterial, User, SubjectEnum
 from app.services.pdf_service import pdf_service
 from app.services.blob_service import blob_service
+from app.services.corpus_service import corpus_service
+from app.services.prompt_context_service import prompt_context_service
 import os
 import shutil
 from pathlib import Path
@@ -117,6 +119,7 @@ async def upload_study_material(
                     file_path=processing_path
                 )
                 print(f"Created {chunks_created} chunks for material {material.id}")
+                prompt_context_service.request_refresh(material.subject)
 
                 # Clean up temp file if using blob storage
                 if use_blob:
@@ -196,6 +199,8 @@ async def delete_material(
     
     # Delete from database (chunks will be deleted via cascade)
     db.delete(material)
+    corpus_service.bump(db, material.subject)
     db.commit()
+    prompt_context_service.request_refresh(material.subject)
     
     return {"message": "Material deleted successfully"}
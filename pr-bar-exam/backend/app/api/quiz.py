@@ -1,9 +1,14 @@
 """
 Quiz/MCQ API endpoints for practice questions.
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from app.core.database import get_db
+from app.models.models import SubjectEnum, DifficultyEnum
+from app.schemas import schemas
+from app.services.question_bank_service import question_bank_service
 
 # Define router - MUST be at module level
 router = APIRouter(prefix="/quiz", tags=["quiz"])
@@ -12,7 +17,7 @@ router = APIRouter(prefix="/quiz", tags=["quiz"])
 # Request/Response Models
 class QuizGenerateRequest(BaseModel):
     subject: str
-    num_questions: int = 20
+    num_questions: int = Field(default=20, ge=1, le=50)
     difficulty: str = "medium"
 
 
@@ -36,18 +41,41 @@ class AnswerResult(BaseModel):
 
 # Endpoints
 @router.post("/generate")
-async def generate_quiz(request: QuizGenerateRequest):
+async def generate_quiz(request: QuizGenerateRequest, db: AsyncSession = Depends(get_db)):
     """
-    Generate a new quiz session with MCQ questions.
+    Generate a new quiz with MCQ questions.
     
-    This is a placeholder - implement with your RAG service.
+    Questions are drawn from the precomputed question bank (kept stocked by
+    a background task), so this never waits on the LLM. If the bank is
+    short, fewer questions than requested are returned.
     """
+    try:
+        subject = SubjectEnum(request.subject)
+        difficulty = DifficultyEnum(request.difficulty)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    questions = await question_bank_service.draw(db, subject, difficulty, request.num_questions)
+    
     return {
-        "message": "Quiz generation endpoint",
-        "subject": request.subject,
-        "num_questions": request.num_questions,
-        "difficulty": request.difficulty,
-        "session_id": "placeholder-session-id"
+        "subject": subject.value,
+        "difficulty": difficulty.value,
+        "num_questions": len(questions),
+        "questions": [
+            schemas.MCQWithoutAnswer(
+                id=question.id,
+                subject=question.subject,
+                question_text=question.question_text,
+                options=[
+                    schemas.MCQOption(label=label, text=text)
+                    for label, text in zip("ABCD", (
+                        question.option_a, question.option_b, question.option_c, question.option_d
+                    ))
+                ],
+                difficulty=question.difficulty.value
+            )
+            for question in questions
+        ]
     }
 
 
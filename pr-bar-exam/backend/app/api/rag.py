@@ -0,0 +1,65 @@
+"""
+Semantic search over study materials (retrieval only, no LLM call).
+"""
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from typing import AsyncGenerator, Dict, Any
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.schemas import schemas
+from app.services.rag_service import async_rag_service
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/rag", tags=["rag"])
+
+
+def _ndjson(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, default=str) + "\n"
+
+
+@router.post("/search")
+async def search_materials(request: schemas.RAGSearchRequest):
+    """
+    Search study materials for one or more queries.
+
+    Streams NDJSON: one `result` line per ranked chunk, then a `done` line
+    per query, in the order queries finish (each line carries its
+    `query_index`); queries that fail get an `error` line. Cached results
+    come first; the rest are retrieved concurrently.
+    """
+    async def stream() -> AsyncGenerator[str, None]:
+        finished = set()
+        # Version lookups share this session; each retrieval runs on its own
+        async with AsyncSessionLocal() as db:
+            try:
+                async for index, chunks in async_rag_service.retrieve_each(
+                    db,
+                    [(query.query, query.subject, query.top_k) for query in request.queries],
+                    similarity_threshold=settings.SIMILARITY_THRESHOLD
+                ):
+                    for rank, chunk in enumerate(chunks, start=1):
+                        result = schemas.RAGResult(
+                            text=chunk["text"],
+                            source=chunk["source"],
+                            page_number=chunk.get("page_number"),
+                            similarity_score=chunk["similarity_score"]
+                        )
+                        yield _ndjson({
+                            "type": "result",
+                            "query_index": index,
+                            "rank": rank,
+                            "result": result.model_dump()
+                        })
+                    finished.add(index)
+                    yield _ndjson({"type": "done", "query_index": index, "count": len(chunks)})
+            except Exception:
+                # Don't leak SQL/driver details to the client
+                logger.exception("Semantic search failed")
+                for index in range(len(request.queries)):
+                    if index not in finished:
+                        yield _ndjson({"type": "error", "query_index": index, "detail": "Search failed"})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -2,7 +2,7 @@
 Core configuration module for the PR Bar Exam backend.
 """
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import os
 
 
@@ -18,7 +18,66 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-3.5-turbo"
-    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"  # Default for subjects never upgraded
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. scripts/mock_openai_server.py for offline load tests
+    OPENAI_TIMEOUT: float = 600.0  # Seconds per request
+    
+    # OpenAI rate limiting (services/openai_limiter.py); set to your account limits
+    OPENAI_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "gpt-3.5-turbo": {"rpm": 3500, "tpm": 160000},
+        "text-embedding-3-small": {"rpm": 3000, "tpm": 1000000},
+    }
+    OPENAI_DEFAULT_RPM: int = 500  # Models not listed above
+    OPENAI_DEFAULT_TPM: int = 60000
+    OPENAI_BACKGROUND_RESERVE: float = 0.2  # Budget share background calls can't use
+    OPENAI_INITIAL_CONCURRENCY: int = 8
+    OPENAI_MAX_CONCURRENCY: int = 64
+    OPENAI_LATENCY_SPIKE_FACTOR: float = 3.0  # Latency vs running average that counts as congestion
+    OPENAI_MAX_RETRIES: int = 5
+    OPENAI_RETRY_BASE_DELAY: float = 0.5  # Seconds; exponential backoff with full jitter
+    EMBEDDING_DIMENSIONS: int = 1536  # Must match the vector(1536) columns
+    
+    # OpenAI usage accounting (services/llm_metrics.py); USD per million tokens
+    OPENAI_PRICING: Dict[str, Dict[str, float]] = {
+        "gpt-3.5-turbo": {"prompt": 0.5, "completion": 1.5},
+        "text-embedding-3-small": {"prompt": 0.02},
+        "text-embedding-3-large": {"prompt": 0.13},
+    }
+    LLM_USAGE_LOG_ENABLED: bool = True  # One JSON log line per OpenAI call
+    
+    # Single-flight coalescing of identical requests (services/single_flight.py)
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 120.0  # Followers then make the call themselves
+    
+    # Request hedging for interactive embedding calls (services/hedging.py)
+    HEDGE_ENABLED: bool = False
+    HEDGE_PERCENTILE: float = 0.95  # Hedge once a call is slower than this share of recent calls
+    HEDGE_MIN_DELAY: float = 0.05  # Seconds
+    HEDGE_BUDGET: float = 0.05  # Max extra requests, as a fraction of calls
+    HEDGE_MIN_SAMPLES: int = 20  # Latencies observed before hedging starts
+    
+    # Circuit breakers per OpenAI model (services/circuit_breaker.py)
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    CIRCUIT_MIN_CALLS: int = 10  # Attempts in the window before the circuit can open
+    CIRCUIT_ERROR_RATE: float = 0.5  # Share of failed attempts that opens the circuit
+    CIRCUIT_SLOW_CALL_SECONDS: float = 30.0
+    CIRCUIT_SLOW_RATE: float = 0.5  # Share of slow attempts that opens the circuit
+    CIRCUIT_OPEN_SECONDS: float = 30.0  # Before a probe call is let through
+    
+    # Deferred grading while the grading model is unavailable
+    DEFERRED_GRADING_ENABLED: bool = True  # Run the grading task in the API process
+    DEFERRED_GRADING_INTERVAL: int = 60  # Seconds between passes
+    DEFERRED_GRADING_BATCH_SIZE: int = 10
+    DEFERRED_GRADING_MAX_ATTEMPTS: int = 3  # Failed attempts before an essay is marked failed
+    
+    # Model routing per task (services/model_router.py); no routes = OPENAI_MODEL
+    MODEL_ROUTES: Dict[str, List[Dict[str, Any]]] = {}
+    MODEL_TARGET_LATENCY: Dict[str, float] = {"grading": 30.0, "mcq": 20.0}  # p95 seconds
+    MODEL_ROUTING_MIN_SAMPLES: int = 20  # Recent calls before a model's stats count
+    MODEL_ROUTING_MAX_ERROR_RATE: float = 0.2
+    
+    # Embedding model upgrades (scripts/backfill_embeddings.py)
+    EMBEDDING_BACKFILL_BATCH_SIZE: int = 100
+    EMBEDDING_BACKFILL_RATE: float = 50.0  # Chunks embedded per second
     
     # Supabase Configuration (Optional - only needed for frontend chat)
     SUPABASE_URL: Optional[str] = None
@@ -44,9 +103,51 @@ class Settings(BaseSettings):
     # RAG Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    INGEST_EMBEDDING_BATCH_SIZE: int = 100  # Chunks per embeddings API call during ingestion
     TOP_K_RESULTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
     
+    # Vector Index Configuration
+    VECTOR_INDEX_TYPE: str = "hnsw"  # "hnsw" or "ivfflat"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40  # Per-query search effort (higher = better recall, slower)
+    IVFFLAT_LISTS: int = 100
+    IVFFLAT_PROBES: int = 10  # Lists scanned per query (higher = better recall, slower)
+    
+    # Reindex thresholds for /api/admin/index-health
+    INDEX_DEAD_TUPLE_RATIO_MAX: float = 0.2
+    IVFFLAT_LIST_IMBALANCE_MAX: float = 2.0  # lists vs recommended, either direction
+    INDEX_MIN_ROWS: int = 10000  # Below this, ivfflat sizing isn't worth a rebuild
+    
+    # Retrieval cache (entries are invalidated by per-subject corpus version)
+    RETRIEVAL_CACHE_SIZE: int = 1024  # 0 disables the cache
+    
+    # Persistent grade cache (services/grade_cache_service.py), keyed by corpus version
+    GRADE_CACHE_ENABLED: bool = True
+    GRADE_CACHE_HIT_FLUSH_INTERVAL: int = 60  # Seconds between batched hit-count writes
+    
+    # MMR diversification (1.0 = pure relevance, 0.0 = pure diversity)
+    MMR_LAMBDA: Optional[float] = 0.7  # Used by grade_essay; unset disables
+    MMR_FETCH_MULTIPLIER: int = 4  # Candidates over-fetched per result
+    
+    # Prompt context token budgets
+    GRADING_CONTEXT_TOKENS: int = 3000
+    MCQ_CONTEXT_TOKENS: int = 2500  # Per MCQ generation request
+    
+    # MCQ generation fan-out
+    MCQ_QUESTIONS_PER_REQUEST: int = 5
+    MCQ_MAX_CONCURRENCY: int = 5  # In-flight generation requests per call
+    MCQ_CHUNKS_PER_REQUEST: int = 8
+    MCQ_TOKENS_PER_QUESTION: int = 300  # max_tokens = questions * this
+    
+    # Precomputed MCQ bank (services/question_bank_service.py)
+    QUESTION_BANK_REFILL_ENABLED: bool = True  # Run the refill task in the API process
+    QUESTION_BANK_TARGET_DEPTH: int = 100  # Questions per subject and difficulty
+    QUESTION_BANK_BATCH_SIZE: int = 10  # Questions per generation call
+    QUESTION_BANK_REFILL_INTERVAL: int = 300  # Seconds between refill passes
+    QUESTION_BANK_MAX_SERVES: int = 50  # Draws before a question is retired and replaced
+    
     # File Upload
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     ALLOWED_EXTENSIONS: str = ".pdf,.docx"
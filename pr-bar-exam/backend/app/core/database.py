@@ -3,12 +3,29 @@ Database connection - MINIMAL VERSION.
 """
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy import event
 from typing import AsyncGenerator
+import logging
 import os
 
+# pgvector's asyncpg codec sends/receives vectors in binary
+try:
+    from pgvector.asyncpg import register_vector
+except ImportError:
+    register_vector = None
+
+logger = logging.getLogger(__name__)
+
 # Create base for models
 Base = declarative_base()
 
+def sync_database_url(url: str) -> str:
+    """The DATABASE_URL for a plain (psycopg2) engine, as used by scripts."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
 # Get database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
@@ -18,13 +35,41 @@ if DATABASE_URL.startswith("postgres://"):
 elif DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
+USE_ASYNCPG = "+asyncpg" in DATABASE_URL
+
+# asyncpg prepares every statement; keep enough of them cached per connection
+# that each retrieval query shape is planned once, not on every call
+PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("PREPARED_STATEMENT_CACHE_SIZE", "256"))
+PGVECTOR_BINARY_CODEC = os.getenv("PGVECTOR_BINARY_CODEC", "true").lower() == "true"
+
 # Create async engine
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,
     pool_pre_ping=True,
+    connect_args={"prepared_statement_cache_size": PREPARED_STATEMENT_CACHE_SIZE} if USE_ASYNCPG else {},
 )
 
+_vector_codec = {"registered": False, "failed": False}
+
+
+def vector_codec_registered() -> bool:
+    """True if every pooled connection has pgvector's binary codec."""
+    return _vector_codec["registered"] and not _vector_codec["failed"]
+
+
+if USE_ASYNCPG and PGVECTOR_BINARY_CODEC and register_vector is not None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _register_vector_codec(dbapi_connection, connection_record):
+        """Register the pgvector binary codec on each new asyncpg connection."""
+        try:
+            dbapi_connection.run_async(register_vector)
+            _vector_codec["registered"] = True
+        except Exception as e:
+            # e.g. vector extension not installed yet; fall back to text vectors
+            _vector_codec["failed"] = True
+            logger.warning(f"Could not register pgvector codec: {e}")
+
 # Create session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
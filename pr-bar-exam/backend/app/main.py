@@ -2,13 +2,19 @@
 Main FastAPI application for PR Bar Exam API.
 Hosted on Railway or Vercel.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from contextlib import asynccontextmanager
 import logging
 
 from app.core.config import settings
-from app.api import public, quiz, progress, essays, admin, chat
+from app.api import public, quiz, progress, essays, admin, chat, rag
+from app.services.question_bank_service import question_bank_service
+from app.services.deferred_grading_service import deferred_grading_service
+from app.services.prompt_context_service import prompt_context_service
+from app.services.grade_cache_service import grade_cache_service
+from app.services.llm_metrics import set_request_tags, reset_request_tags
 
 # Configure logging
 logging.basicConfig(
@@ -23,8 +29,18 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
+    if settings.QUESTION_BANK_REFILL_ENABLED:
+        question_bank_service.start()
+    if settings.DEFERRED_GRADING_ENABLED:
+        deferred_grading_service.start()
+    if settings.GRADE_CACHE_ENABLED:
+        grade_cache_service.start()
     yield
     logger.info("Shutting down...")
+    await question_bank_service.stop()
+    await deferred_grading_service.stop()
+    await prompt_context_service.stop()
+    await grade_cache_service.stop()
 
 
 # Initialize FastAPI app
@@ -60,6 +76,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def tag_llm_usage(request: Request, call_next):
+    """Tag OpenAI usage recorded during a request with its route template and user."""
+    route, user = "unmatched", None
+    for candidate in app.router.routes:
+        match, child_scope = candidate.matches(request.scope)
+        if match == Match.FULL:
+            route = getattr(candidate, "path", route)
+            user = child_scope.get("path_params", {}).get("user_id")
+            break
+    token = set_request_tags(f"{request.method} {route}", str(user) if user is not None else None)
+    try:
+        return await call_next(request)
+    finally:
+        reset_request_tags(token)
+
+
 # Include routers
 # Public routes (no auth)
 app.include_router(public.router)
@@ -69,6 +103,7 @@ app.include_router(quiz.router, prefix="/api")
 app.include_router(progress.router, prefix="/api")
 app.include_router(essays.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+app.include_router(rag.router, prefix="/api")
 
 # Admin routes (API key + admin UUID required)
 app.include_router(admin.router)
@@ -1,9 +1,10 @@
 """
 Database models for the PR Bar Exam application.
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Float, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Float, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from typing import Any
 from datetime import datetime
 from app.core.database import Base
 import enum
@@ -34,6 +35,11 @@ class SubjectEnum(str, enum.Enum):
     PROC_CIVIL = "proc_civil"
 
 
+def subject_value(subject: Any) -> str:
+    """A subject's string value, from a SubjectEnum or a plain string."""
+    return subject.value if isinstance(subject, SubjectEnum) else str(subject)
+
+
 class DifficultyEnum(str, enum.Enum):
     """Question difficulty levels."""
     EASY = "easy"
@@ -85,6 +91,8 @@ class DocumentChunk(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     material_id = Column(Integer, ForeignKey("study_materials.id"), nullable=False)
+    # Denormalized from the material; document_chunks is list-partitioned on it
+    subject = Column(String(50), nullable=False, index=True)
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     
@@ -93,6 +101,12 @@ class DocumentChunk(Base):
     
     # Embedding vector for semantic search
     embedding = Column(Vector(1536) if Vector else JSON)
+    embedding_model = Column(String(100))
+    
+    # Second slot, backfilled with a new model during an embedding upgrade
+    # (see services/embedding_version_service.py)
+    embedding_alt = Column(Vector(1536) if Vector else JSON)
+    embedding_alt_model = Column(String(100))
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -100,9 +114,48 @@ class DocumentChunk(Base):
     material = relationship("StudyMaterial", back_populates="chunks")
 
 
+class CorpusVersion(Base):
+    """Per-subject corpus version, bumped whenever chunks are added or removed."""
+    __tablename__ = "corpus_versions"
+    
+    subject = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class EmbeddingVersion(Base):
+    """Per-subject active embedding slot/model and any in-progress upgrade target."""
+    __tablename__ = "embedding_versions"
+    
+    subject = Column(String(50), primary_key=True)
+    active_column = Column(String(50), nullable=False, default="embedding")
+    active_model = Column(String(100), nullable=False)
+    target_model = Column(String(100))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class GradeCacheEntry(Base):
+    """Cached essay grade, keyed by essay/prompt/subject/corpus version/model hash."""
+    __tablename__ = "grade_cache"
+    
+    cache_key = Column(String(64), primary_key=True)
+    fallback_key = Column(String(64), index=True)  # Same grade without the model
+    subject = Column(String(50), nullable=False)
+    corpus_version = Column(Integer, nullable=False)
+    model = Column(String(100), nullable=False)
+    grade = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_hit_at = Column(DateTime(timezone=True))
+
+
 class Question(Base):
-    """Multiple choice question model."""
+    """Multiple choice question model (also the precomputed quiz bank)."""
     __tablename__ = "questions"
+    __table_args__ = (
+        # Quiz draws and bank stock levels filter on both
+        Index("ix_questions_subject_difficulty", "subject", "difficulty"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(SQLEnum(SubjectEnum), nullable=False, index=True)
@@ -115,7 +168,11 @@ class Question(Base):
     explanation = Column(Text)
     difficulty = Column(SQLEnum(DifficultyEnum), default=DifficultyEnum.MEDIUM)
     source_material_id = Column(Integer, ForeignKey("study_materials.id"))
+    model = Column(String(100))  # Model that generated the question
     is_verified = Column(Boolean, default=False)
+    # Quiz bank rotation: times drawn, and when it reached QUESTION_BANK_MAX_SERVES
+    served_count = Column(Integer, nullable=False, default=0, server_default="0")
+    retired_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -167,6 +224,11 @@ class EssayPrompt(Base):
     max_score = Column(Integer, default=100)
     time_limit = Column(Integer)  # minutes
     is_official = Column(Boolean, default=False)
+    # Precomputed retrieval rows for the prompt and rubric (services/prompt_context_service.py),
+    # valid for this corpus version and embedding model
+    context_rows = Column(JSON)
+    context_version = Column(Integer)
+    context_model = Column(String(100))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -110,8 +110,32 @@ class MCQGenerateRequest(BaseModel):
 # Essay Schemas
 class EssaySubmit(BaseModel):
     subject: SubjectEnum
-    prompt: str
+    prompt: str = ""
     content: str
+    prompt_id: Optional[int] = None  # EssayPrompt to answer; its text and rubric replace `prompt`
+
+
+class EssayPromptCreate(BaseModel):
+    subject: SubjectEnum
+    prompt_text: str
+    grading_rubric: Optional[Any] = None  # List of rubric items (or a dict keyed by them)
+    max_score: int = 100
+    time_limit: Optional[int] = None  # minutes
+    is_official: bool = False
+
+
+class EssayPromptInfo(BaseModel):
+    id: int
+    subject: SubjectEnum
+    prompt_text: str
+    grading_rubric: Optional[Any] = None
+    max_score: Optional[int] = None
+    time_limit: Optional[int] = None
+    is_official: Optional[bool] = None
+    context_version: Optional[int] = None  # Corpus version of the precomputed retrieval context
+    
+    class Config:
+        from_attributes = True
 
 
 class EssayGradeResponse(BaseModel):
@@ -122,6 +146,7 @@ class EssayGradeResponse(BaseModel):
     feedback: str
     point_breakdown: Dict[str, Any]
     citations: List[Dict[str, str]]
+    model: Optional[str] = None  # Model that graded the essay
 
 
 class Essay(BaseModel):
@@ -196,6 +221,11 @@ class RAGResult(BaseModel):
     similarity_score: float
 
 
+class RAGSearchRequest(BaseModel):
+    """Several retrieval queries answered in one streamed response."""
+    queries: List[RAGQuery] = Field(..., min_length=1, max_length=10)
+
+
 # Admin & BLL Rule Schemas (ADDED - These were missing!)
 class BLLRule(BaseModel):
     """Business Logic Layer rule representation."""
@@ -235,6 +265,74 @@ class UserInfo(BaseModel):
         from_attributes = True
 
 
+class SubjectCorpusStats(BaseModel):
+    """Per-subject corpus statistics."""
+    subject: str
+    chunks: int
+    embedding_nulls: int
+    retrievals: int = 0
+    avg_retrieval_distance: Optional[float] = None
+    avg_top1_distance: Optional[float] = None
+
+
+class VectorIndexHealth(BaseModel):
+    """Health of one (per-partition) vector index."""
+    table: str
+    index_name: str
+    index_type: str
+    size_bytes: int
+    is_valid: bool
+    live_tuples: int
+    dead_tuples: int
+    dead_tuple_ratio: float
+    last_vacuum: Optional[datetime] = None
+    lists: Optional[int] = None
+    recommended_lists: Optional[int] = None
+    list_imbalance: Optional[float] = None
+    reindex_recommended: bool
+    reasons: List[str] = []
+
+
+class IndexHealthReport(BaseModel):
+    """Vector index health and corpus statistics."""
+    subjects: List[SubjectCorpusStats]
+    indexes: List[VectorIndexHealth]
+    reindex_recommended: bool
+
+
+class LLMCallStats(BaseModel):
+    """OpenAI usage for one route, call kind and model."""
+    route: str
+    kind: str
+    model: str
+    calls: int
+    errors: int
+    retries: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+
+
+class LLMCacheStats(BaseModel):
+    """Hits and misses of a cache in front of OpenAI calls, per route."""
+    route: str
+    cache: str
+    hits: int
+    misses: int
+
+
+class LLMUsageReport(BaseModel):
+    """OpenAI usage accounting since this instance started."""
+    calls: List[LLMCallStats]
+    users: Dict[str, Dict[str, float]]
+    caches: List[LLMCacheStats]
+    hedges: Dict[str, Dict[str, int]] = {}
+    circuits: Dict[str, Dict[str, Any]] = {}
+    routes: Dict[str, List[Dict[str, Any]]] = {}
+
+
 class AdminStats(BaseModel):
     """Admin dashboard statistics."""
     total_users: int
@@ -0,0 +1,131 @@
+"""
+Coverage-aware chunk sampling for MCQ generation.
+
+Keeps a per-subject in-memory index of chunk ids ordered by material and
+page, so a sample of k chunks can be drawn in O(k) without ORDER BY random()
+scanning the subject. Samples are stratified: when k is smaller than the
+number of pages, k pages are picked at evenly spaced positions (from a random
+offset) across every material and one chunk is drawn from each; otherwise
+chunks themselves are picked that way. Every call covers the whole corpus
+evenly, and the random offset moves the sample between calls.
+
+The index is rebuilt when the subject's corpus version changes, i.e. after
+every ingestion or deletion, in this process or another.
+"""
+from typing import Dict, List, Tuple
+import random
+import threading
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import SubjectEnum
+from app.services.corpus_service import corpus_service
+
+
+CHUNK_LAYOUT = text("""
+    SELECT id, material_id, page_number
+    FROM document_chunks
+    WHERE subject = :subject
+    ORDER BY material_id, page_number, chunk_index
+""")
+
+CHUNK_TEXTS = text("""
+    SELECT id, chunk_text
+    FROM document_chunks
+    WHERE subject = :subject AND id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+class SubjectChunkIndex:
+    """Chunk ids of one subject in corpus order, with the offset where each page starts."""
+
+    def __init__(self, version: int, rows: List[Tuple[int, int, int]]):
+        self.version = version
+        self.ids: List[int] = []
+        self.page_starts: List[int] = []
+        previous = None
+        for chunk_id, material_id, page_number in rows:
+            if (material_id, page_number) != previous:
+                self.page_starts.append(len(self.ids))
+                previous = (material_id, page_number)
+            self.ids.append(chunk_id)
+        self.page_starts.append(len(self.ids))
+
+    @property
+    def pages(self) -> int:
+        return len(self.page_starts) - 1
+
+    def sample(self, k: int, rng: random.Random) -> List[int]:
+        """k chunk ids spread evenly over pages (or chunks), in corpus order."""
+        if k >= len(self.ids):
+            return list(self.ids)
+        if k <= self.pages:
+            step = self.pages / k
+            offset = rng.random() * step
+            picks = []
+            for i in range(k):
+                page = int(offset + i * step)
+                picks.append(self.ids[rng.randrange(self.page_starts[page], self.page_starts[page + 1])])
+            return picks
+        step = len(self.ids) / k
+        offset = rng.random() * step
+        return [self.ids[int(offset + i * step)] for i in range(k)]
+
+
+class ChunkSampler:
+    """Per-subject chunk indexes, refreshed by corpus version."""
+
+    def __init__(self):
+        self._indexes: Dict[str, SubjectChunkIndex] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def _current(self, subject: SubjectEnum, version: int) -> SubjectChunkIndex:
+        index = self._indexes.get(subject.value)
+        return index if index is not None and index.version == version else None
+
+    def _sample_ids(self, index: SubjectChunkIndex, k: int) -> List[int]:
+        with self._lock:
+            return index.sample(k, self._rng)
+
+    def _ordered_texts(self, ids: List[int], rows) -> List[str]:
+        texts = {row.id: row.chunk_text for row in rows}
+        return [texts[chunk_id] for chunk_id in ids if chunk_id in texts]
+
+    def sample(self, db: Session, subject: SubjectEnum, k: int) -> List[str]:
+        """Texts of k chunks sampled evenly across the subject's materials and pages."""
+        version = corpus_service.get_version(db, subject)
+        index = self._current(subject, version)
+        if index is None:
+            rows = db.execute(CHUNK_LAYOUT, {"subject": subject.value}).fetchall()
+            index = self._indexes[subject.value] = SubjectChunkIndex(version, rows)
+
+        ids = self._sample_ids(index, k)
+        if not ids:
+            return []
+        rows = db.execute(CHUNK_TEXTS, {"subject": subject.value, "ids": ids}).fetchall()
+        return self._ordered_texts(ids, rows)
+
+    async def sample_async(self, db: AsyncSession, subject: SubjectEnum, k: int) -> List[str]:
+        """Texts of k chunks sampled evenly across the subject's materials and pages."""
+        version = await corpus_service.get_version_async(db, subject)
+        index = self._current(subject, version)
+        if index is None:
+            result = await db.execute(CHUNK_LAYOUT, {"subject": subject.value})
+            index = self._indexes[subject.value] = SubjectChunkIndex(version, result.fetchall())
+
+        ids = self._sample_ids(index, k)
+        if not ids:
+            return []
+        result = await db.execute(CHUNK_TEXTS, {"subject": subject.value, "ids": ids})
+        return self._ordered_texts(ids, result.fetchall())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            subject: {"version": index.version, "chunks": len(index.ids), "pages": index.pages}
+            for subject, index in list(self._indexes.items())
+        }
+
+
+# Global chunk sampler instance
+chunk_sampler = ChunkSampler()
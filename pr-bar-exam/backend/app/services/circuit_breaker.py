@@ -0,0 +1,162 @@
+"""
+Circuit breakers for OpenAI models.
+
+openai_limiter reports every attempt's outcome to the model's breaker.
+Within a rolling CIRCUIT_WINDOW_SECONDS window, once at least
+CIRCUIT_MIN_CALLS attempts were made, the circuit opens if the share of
+failures (timeouts, connection errors, 5xx - not 429s, which the limiter
+handles) reaches CIRCUIT_ERROR_RATE or the share of calls slower than
+CIRCUIT_SLOW_CALL_SECONDS reaches CIRCUIT_SLOW_RATE.
+
+While open, calls fail immediately with CircuitOpenError instead of
+queueing behind a degraded backend, and callers switch to degraded paths
+(question bank top-ups, cached grades, deferred grading). After
+CIRCUIT_OPEN_SECONDS one probe call is let through (half-open): success
+closes the circuit; failure, or a probe slower than
+CIRCUIT_SLOW_CALL_SECONDS, opens it again.
+"""
+from typing import Any, Dict, Optional
+from collections import deque
+from app.core.config import settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a model whose circuit is open."""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"{model} is unavailable (circuit open); retry in {retry_in:.0f}s")
+        self.model = model
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Rolling error/latency window and open/half-open/closed state for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.trips = 0
+        self._window = deque()  # (timestamp, failed, slow)
+        self._lock = threading.Lock()
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + settings.CIRCUIT_OPEN_SECONDS - now)
+
+    def before_call(self) -> None:
+        """Admit a call, or raise CircuitOpenError. Every admitted call must be record()ed."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self._retry_in(now) > 0:
+                    raise CircuitOpenError(self.model, self._retry_in(now))
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self.probe_in_flight:
+                    raise CircuitOpenError(self.model, settings.CIRCUIT_OPEN_SECONDS)
+                self.probe_in_flight = True
+
+    def ensure_closed(self) -> None:
+        """Raise CircuitOpenError if the circuit is open, without taking a probe slot."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and self._retry_in(now) > 0:
+                raise CircuitOpenError(self.model, self._retry_in(now))
+
+    def is_open(self) -> bool:
+        try:
+            self.ensure_closed()
+        except CircuitOpenError:
+            return True
+        return False
+
+    def record(self, failed: Optional[bool], latency: Optional[float] = None) -> None:
+        """
+        Outcome of an admitted call: failed True/False, or None for outcomes
+        that say nothing about the backend's health (429s, bad requests,
+        cancellations).
+        """
+        with self._lock:
+            now = time.monotonic()
+            slow = latency is not None and latency > settings.CIRCUIT_SLOW_CALL_SECONDS
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                if failed is None:
+                    return
+                if failed:
+                    self._open(now, "probe failed")
+                elif slow:
+                    self._open(now, f"probe took {latency:.1f}s")
+                else:
+                    self.state = CLOSED
+                    self._window.clear()
+                    logger.info("%s circuit closed", self.model)
+                return
+            if failed is None or self.state != CLOSED:
+                return
+
+            self._window.append((now, failed, slow))
+            while self._window and self._window[0][0] < now - settings.CIRCUIT_WINDOW_SECONDS:
+                self._window.popleft()
+
+            calls = len(self._window)
+            if calls < settings.CIRCUIT_MIN_CALLS:
+                return
+            failures = sum(1 for _, f, _ in self._window if f)
+            slow_calls = sum(1 for _, _, s in self._window if s)
+            if failures / calls >= settings.CIRCUIT_ERROR_RATE:
+                self._open(now, f"{failures}/{calls} calls failed")
+            elif slow_calls / calls >= settings.CIRCUIT_SLOW_RATE:
+                self._open(now, f"{slow_calls}/{calls} calls slower than {settings.CIRCUIT_SLOW_CALL_SECONDS}s")
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._window.clear()
+        logger.warning("%s circuit opened for %.0fs: %s", self.model, settings.CIRCUIT_OPEN_SECONDS, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "retry_in": self._retry_in(time.monotonic()) if self.state == OPEN else 0.0,
+                "window_calls": len(self._window)
+            }
+
+
+class CircuitBreakers:
+    """One breaker per model."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(model)
+            return self._breakers[model]
+
+    def is_open(self, model: str) -> bool:
+        return self.get(model).is_open()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.model: breaker.stats() for breaker in breakers}
+
+
+# Global circuit breakers instance
+circuit_breakers = CircuitBreakers()
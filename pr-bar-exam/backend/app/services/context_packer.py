@@ -0,0 +1,120 @@
+"""
+Token-budgeted packing of retrieved chunks into prompt context.
+"""
+from typing import List, Dict, Any, Callable, Optional
+import re
+
+
+# Sentence end followed by whitespace (or end of text)
+SENTENCE_END = re.compile(r'[.?!](?=\s|$)')
+
+
+class ContextPacker:
+    """Fills a token budget from ranked chunks, trimming the last one at a sentence boundary."""
+
+    def __init__(self, encoding, min_chunk_tokens: int = 50):
+        self.encoding = encoding
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def trim_to_sentences(self, text: str, max_tokens: int) -> Optional[str]:
+        """
+        Cut text to at most max_tokens, ending on a full sentence.
+        Returns None if not even one sentence fits.
+        """
+        if max_tokens <= 0:
+            return None
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+
+        head = self.encoding.decode(tokens[:max_tokens])
+        boundaries = [m.end() for m in SENTENCE_END.finditer(head)]
+        if not boundaries:
+            return None
+        return head[:boundaries[-1]].strip()
+
+    def _trim_rendered(
+        self,
+        chunk: Dict[str, Any],
+        body_budget: int,
+        remaining: int,
+        format_chunk: Callable[[Dict[str, Any], str], str]
+    ) -> Optional[str]:
+        """
+        Render the chunk with its body trimmed to fit `remaining` tokens, or
+        None if less than min_chunk_tokens of body would fit (e.g. the
+        header alone nearly fills the budget).
+        """
+        while body_budget >= self.min_chunk_tokens:
+            text = self.trim_to_sentences(chunk["text"], body_budget)
+            if not text:
+                return None
+            rendered = format_chunk(chunk, text)
+            excess = self.count_tokens(rendered) - remaining
+            if excess <= 0:
+                return rendered
+            # Tokens can merge differently around the cut; tighten and retry
+            body_budget -= excess
+        return None
+
+    def pack(
+        self,
+        chunks: List[Dict[str, Any]],
+        budget: int,
+        format_chunk: Callable[[Dict[str, Any], str], str] = lambda chunk, text: text,
+        separator: str = "\n\n"
+    ) -> Dict[str, Any]:
+        """
+        Pack chunks (best first) into at most `budget` tokens.
+
+        Args:
+            chunks: Ranked chunk dicts with a "text" key
+            budget: Maximum tokens for the packed context
+            format_chunk: Renders a chunk (and its possibly trimmed text) for the prompt
+            separator: Placed between rendered chunks
+
+        Returns:
+            Dict with the packed text, the chunks used, token counts and
+            whether any chunk was trimmed or dropped
+        """
+        separator_tokens = self.count_tokens(separator)
+        parts: List[str] = []
+        used: List[Dict[str, Any]] = []
+        token_count = 0
+        trimmed = False
+
+        for chunk in chunks:
+            remaining = budget - token_count - (separator_tokens if parts else 0)
+            if remaining < self.min_chunk_tokens:
+                trimmed = True
+                break
+
+            rendered = format_chunk(chunk, chunk["text"])
+            rendered_tokens = self.count_tokens(rendered)
+
+            if rendered_tokens > remaining:
+                # Trim the chunk body so the rendered chunk (header included) fits
+                overhead = rendered_tokens - self.count_tokens(chunk["text"])
+                trimmed = True
+                rendered = self._trim_rendered(chunk, remaining - overhead, remaining, format_chunk)
+                if rendered is None:
+                    continue
+                rendered_tokens = self.count_tokens(rendered)
+
+            if parts:
+                token_count += separator_tokens
+            parts.append(rendered)
+            used.append(chunk)
+            token_count += rendered_tokens
+
+        return {
+            "text": separator.join(parts),
+            "chunks": used,
+            "token_count": token_count,
+            "budget": budget,
+            "candidate_chunks": len(chunks),
+            "trimmed": trimmed
+        }
@@ -0,0 +1,60 @@
+"""
+Per-subject corpus versioning.
+
+Every path that adds or removes document chunks bumps the subject's version,
+so anything derived from the corpus (cached retrievals, cached grades) can
+be keyed by it and never served stale.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import SubjectEnum, subject_value
+
+
+GET_CORPUS_VERSION = text("""
+    SELECT version FROM corpus_versions WHERE subject = :subject
+""")
+
+BUMP_CORPUS_VERSION = text("""
+    INSERT INTO corpus_versions (subject, version)
+    VALUES (:subject, 1)
+    ON CONFLICT (subject) DO UPDATE
+    SET version = corpus_versions.version + 1, updated_at = NOW()
+    RETURNING version
+""")
+
+
+class CorpusService:
+    """Reads and bumps per-subject corpus versions."""
+
+    def get_version(self, db: Session, subject: SubjectEnum) -> int:
+        """Current corpus version for a subject (0 if never ingested)."""
+        version = db.execute(GET_CORPUS_VERSION, {"subject": subject_value(subject)}).scalar()
+        return version or 0
+
+    async def get_version_async(self, db: AsyncSession, subject: SubjectEnum) -> int:
+        """Current corpus version for a subject (0 if never ingested)."""
+        result = await db.execute(GET_CORPUS_VERSION, {"subject": subject_value(subject)})
+        return result.scalar() or 0
+
+    def bump(self, db: Session, subject: SubjectEnum) -> int:
+        """
+        Bump a subject's corpus version.
+
+        Runs in the caller's transaction so the bump commits together with
+        the chunk inserts/deletes it describes.
+        """
+        return db.execute(BUMP_CORPUS_VERSION, {"subject": subject_value(subject)}).scalar()
+
+    async def bump_async(self, db: AsyncSession, subject: SubjectEnum) -> int:
+        """Bump a subject's corpus version in the caller's transaction."""
+        result = await db.execute(BUMP_CORPUS_VERSION, {"subject": subject_value(subject)})
+        return result.scalar()
+
+    def bump_via_supabase(self, client, subject: SubjectEnum) -> None:
+        """Bump a subject's corpus version through the Supabase RPC (admin routes)."""
+        client.rpc("bump_corpus_version", {"subject_input": subject_value(subject)}).execute()
+
+
+# Global corpus service instance
+corpus_service = CorpusService()
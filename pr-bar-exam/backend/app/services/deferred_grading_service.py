@@ -0,0 +1,223 @@
+"""
+Deferred essay grading.
+
+When the grading model's circuit is open (see circuit_breaker), a submitted
+essay is stored ungraded, with feedback {"status": "deferred", "subject",
+"prompt"}, and the student gets a "grading deferred" response right away
+instead of a request that hangs until timeout. A background task grades
+deferred essays, oldest first, once a grading model's circuit has closed
+again.
+
+Each essay is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+API instances can run the task without grading an essay twice. An essay
+whose grading fails is retried on later passes and marked failed after
+DEFERRED_GRADING_MAX_ATTEMPTS attempts (at once if it can't be graded at
+all, e.g. no reference materials).
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import EssaySubmission, EssayPrompt, UserProgress, SubjectEnum
+from app.services.rag_service import async_rag_service
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.model_router import model_router, GRADING
+from app.services.prompt_context_service import prompt_context_service, rubric_items
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFERRED = "deferred"
+FAILED = "failed"
+
+
+def grade_feedback(grade_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The EssaySubmission.feedback payload for a grade."""
+    return {
+        "legal_analysis_score": grade_data.get("legal_analysis_score"),
+        "writing_quality_score": grade_data.get("writing_quality_score"),
+        "citation_accuracy_score": grade_data.get("citation_accuracy_score"),
+        "feedback": grade_data.get("feedback", ""),
+        "point_breakdown": grade_data.get("point_breakdown", {}),
+        "citations": grade_data.get("citations", []),
+        "model": grade_data.get("model")
+    }
+
+
+async def update_essay_progress(db: AsyncSession, user_id: int, subject: SubjectEnum, score: float) -> None:
+    """Count a graded essay in the user's progress for the subject (caller commits)."""
+    result = await db.execute(
+        select(UserProgress).filter(
+            UserProgress.user_id == user_id,
+            UserProgress.subject == subject
+        )
+    )
+    progress = result.scalar_one_or_none()
+
+    if progress:
+        progress.total_essays += 1
+        if progress.avg_essay_score:
+            total_score = progress.avg_essay_score * (progress.total_essays - 1)
+            progress.avg_essay_score = (total_score + score) / progress.total_essays
+        else:
+            progress.avg_essay_score = score
+        progress.last_activity = datetime.utcnow()
+    else:
+        progress = UserProgress(
+            user_id=user_id,
+            subject=subject,
+            total_questions_attempted=0,
+            correct_answers=0,
+            total_essays=1,
+            avg_essay_score=score,
+            last_activity=datetime.utcnow()
+        )
+        db.add(progress)
+
+
+class DeferredGradingService:
+    """Queues essays while grading is unavailable and grades them in the background."""
+
+    def __init__(self):
+        self.batch_size = settings.DEFERRED_GRADING_BATCH_SIZE
+        self.max_attempts = settings.DEFERRED_GRADING_MAX_ATTEMPTS
+        self._task: Optional[asyncio.Task] = None
+
+    async def defer(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        subject: SubjectEnum,
+        prompt: str,
+        essay_text: str,
+        prompt_id: Optional[int] = None
+    ) -> EssaySubmission:
+        """Store an essay for grading later."""
+        essay_submission = EssaySubmission(
+            user_id=user_id,
+            prompt_id=prompt_id,
+            essay_text=essay_text,
+            score=None,
+            feedback={"status": DEFERRED, "subject": subject.value, "prompt": prompt},
+            word_count=len(essay_text.split()),
+            submitted_at=datetime.utcnow(),
+            graded_at=None
+        )
+        db.add(essay_submission)
+        await db.commit()
+        await db.refresh(essay_submission)
+        return essay_submission
+
+    async def _claim(self, db: AsyncSession, skip: List[int]) -> Optional[EssaySubmission]:
+        """Lock the oldest deferred essay no other worker holds (until commit/rollback)."""
+        query = (
+            select(EssaySubmission)
+            .where(
+                EssaySubmission.graded_at.is_(None),
+                EssaySubmission.score.is_(None),
+                EssaySubmission.feedback["status"].as_string() == DEFERRED
+            )
+            .order_by(EssaySubmission.submitted_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if skip:
+            query = query.where(EssaySubmission.id.notin_(skip))
+        return (await db.execute(query)).scalar_one_or_none()
+
+    async def _grade(self, db: AsyncSession, essay: EssaySubmission, subject: SubjectEnum) -> Dict[str, Any]:
+        rubric, prompt_rows = None, None
+        essay_prompt = await db.get(EssayPrompt, essay.prompt_id) if essay.prompt_id else None
+        if essay_prompt is not None:
+            rubric = rubric_items(essay_prompt)
+            prompt_rows = await prompt_context_service.get(db, essay_prompt)
+        return await async_rag_service.grade_essay(
+            db, essay.essay_text, subject, essay.feedback["prompt"],
+            rubric_items=rubric, prompt_rows=prompt_rows
+        )
+
+    def _fail(self, essay: EssaySubmission, error: str, permanent: bool) -> None:
+        """Count a failed attempt; mark the essay failed if permanent or out of attempts."""
+        attempts = essay.feedback.get("attempts", 0) + 1
+        failed = permanent or attempts >= self.max_attempts
+        essay.feedback = {**essay.feedback, "status": FAILED if failed else DEFERRED, "attempts": attempts, "error": error}
+        if failed:
+            essay.graded_at = datetime.utcnow()
+
+    async def grade_pending(self) -> int:
+        """Grade up to batch_size deferred essays; returns how many were graded."""
+        if not model_router.available(GRADING):
+            return 0
+
+        graded = 0
+        tried: List[int] = []
+        async with AsyncSessionLocal() as db:
+            while len(tried) < self.batch_size:
+                essay = await self._claim(db, tried)
+                if essay is None:
+                    break
+                tried.append(essay.id)
+                try:
+                    subject = SubjectEnum(essay.feedback["subject"])
+                    # A failed attempt rolls back to here, keeping the row lock
+                    async with db.begin_nested():
+                        grade_data = await self._grade(db, essay, subject)
+                except CircuitOpenError:
+                    # Still degraded; try again next pass
+                    await db.rollback()
+                    break
+                except ValueError as e:
+                    # No reference materials or unparseable output; don't retry forever
+                    logger.warning("Deferred grading of essay %s failed: %s", essay.id, e)
+                    self._fail(essay, str(e), permanent=True)
+                    await db.commit()
+                    continue
+                except Exception as e:
+                    logger.exception("Deferred grading of essay %s failed", essay.id)
+                    self._fail(essay, type(e).__name__, permanent=False)
+                    await db.commit()
+                    continue
+
+                essay.score = grade_data.get("overall_score")
+                essay.feedback = grade_feedback(grade_data)
+                essay.graded_at = datetime.utcnow()
+                await update_essay_progress(db, essay.user_id, subject, grade_data["overall_score"])
+                await db.commit()
+                graded += 1
+        return graded
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                graded = await self.grade_pending()
+                if graded:
+                    logger.info("Graded %d deferred essays", graded)
+                    # More may be waiting; don't sleep between full batches
+                    if graded == self.batch_size:
+                        continue
+            except Exception:
+                logger.exception("Deferred grading pass failed")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Start the background grading task (call from the app lifespan)."""
+        if self._task is None:
+            self._task = asyncio.create_task(
+                self._run(interval or settings.DEFERRED_GRADING_INTERVAL)
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global deferred grading service instance
+deferred_grading_service = DeferredGradingService()
@@ -0,0 +1,240 @@
+"""
+Side-by-side embedding model versions.
+
+document_chunks has two embedding slots, `embedding` and `embedding_alt`,
+each tagged with the model that produced it (`<slot>_model`). Per subject,
+embedding_versions records which slot retrieval reads (and with which model
+query embeddings must be created) plus an optional target model being
+backfilled into the other slot.
+
+Upgrade flow (see scripts/backfill_embeddings.py):
+    1. start()          set the target model; new chunks are now dual-written
+    2. backfill_batch() fill the inactive slot a batch at a time, rate-limited
+    3. switch()         once coverage is complete, flip the active slot in one
+                        transaction and bump the corpus version
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.models import SubjectEnum, subject_value
+from app.services.corpus_service import corpus_service
+
+
+EMBEDDING_COLUMNS = ("embedding", "embedding_alt")
+
+GET_EMBEDDING_VERSION = text("""
+    SELECT active_column, active_model, target_model
+    FROM embedding_versions
+    WHERE subject = :subject
+""")
+
+# Ingestion holds this until commit so a concurrent switch() waits for it
+GET_EMBEDDING_VERSION_FOR_SHARE = text("""
+    SELECT active_column, active_model, target_model
+    FROM embedding_versions
+    WHERE subject = :subject
+    FOR SHARE
+""")
+
+GET_EMBEDDING_VERSION_FOR_UPDATE = text("""
+    SELECT active_column, active_model, target_model
+    FROM embedding_versions
+    WHERE subject = :subject
+    FOR UPDATE
+""")
+
+START_EMBEDDING_VERSION = text("""
+    INSERT INTO embedding_versions (subject, active_column, active_model, target_model)
+    VALUES (:subject, 'embedding', :default_model, :target_model)
+    ON CONFLICT (subject) DO UPDATE
+    SET target_model = EXCLUDED.target_model, updated_at = NOW()
+""")
+
+SWITCH_EMBEDDING_VERSION = text("""
+    UPDATE embedding_versions
+    SET active_column = :active_column,
+        active_model = :active_model,
+        target_model = NULL,
+        updated_at = NOW()
+    WHERE subject = :subject
+""")
+
+
+def _state(row) -> Dict[str, Optional[str]]:
+    """Embedding state for a subject; subjects never upgraded use the default model."""
+    if row is None:
+        return {
+            "column": "embedding",
+            "model": settings.OPENAI_EMBEDDING_MODEL,
+            "target_model": None,
+            "target_column": None
+        }
+    return {
+        "column": row.active_column,
+        "model": row.active_model,
+        "target_model": row.target_model,
+        "target_column": inactive_column(row.active_column) if row.target_model else None
+    }
+
+
+def inactive_column(column: str) -> str:
+    """The slot a backfill writes into while `column` is serving reads."""
+    if column not in EMBEDDING_COLUMNS:
+        raise ValueError(f"Unknown embedding column: {column}")
+    return EMBEDDING_COLUMNS[1 - EMBEDDING_COLUMNS.index(column)]
+
+
+def _pending_filter(column: str) -> str:
+    """Chunks whose `column` slot has not been embedded with :model yet."""
+    return f"subject = :subject AND ({column} IS NULL OR {column}_model IS DISTINCT FROM :model)"
+
+
+class EmbeddingVersionService:
+    """Tracks and migrates the embedding model used per subject."""
+
+    def get_state(self, db: Session, subject: SubjectEnum, for_share: bool = False) -> Dict[str, Optional[str]]:
+        """
+        Active slot/model (and any in-progress target) for a subject.
+
+        Writers pass for_share=True so the row stays locked against a
+        switch() until their chunks are committed.
+        """
+        query = GET_EMBEDDING_VERSION_FOR_SHARE if for_share else GET_EMBEDDING_VERSION
+        return _state(db.execute(query, {"subject": subject_value(subject)}).first())
+
+    async def get_state_async(self, db: AsyncSession, subject: SubjectEnum) -> Dict[str, Optional[str]]:
+        """Active slot/model (and any in-progress target) for a subject."""
+        result = await db.execute(GET_EMBEDDING_VERSION, {"subject": subject_value(subject)})
+        return _state(result.first())
+
+    def start(self, db: Session, subject: SubjectEnum, target_model: str) -> Dict[str, Optional[str]]:
+        """Begin migrating a subject to target_model (new chunks are dual-written from now on)."""
+        state = self.get_state(db, subject)
+        if target_model == state["model"]:
+            raise ValueError(f"{subject_value(subject)} already uses {target_model}")
+        db.execute(START_EMBEDDING_VERSION, {
+            "subject": subject_value(subject),
+            "default_model": settings.OPENAI_EMBEDDING_MODEL,
+            "target_model": target_model
+        })
+        db.commit()
+        return self.get_state(db, subject)
+
+    def coverage(self, db: Session, subject: SubjectEnum) -> Dict[str, Any]:
+        """How many chunks of a subject already have a target-model embedding."""
+        state = self.get_state(db, subject)
+        if not state["target_model"]:
+            return {"subject": subject_value(subject), "target_model": None, "total": 0, "pending": 0}
+
+        column = state["target_column"]
+        row = db.execute(
+            text(f"""
+                SELECT
+                    count(*) AS total,
+                    count(*) FILTER (WHERE {column} IS NULL OR {column}_model IS DISTINCT FROM :model) AS pending
+                FROM document_chunks
+                WHERE subject = :subject
+            """),
+            {"subject": subject_value(subject), "model": state["target_model"]}
+        ).first()
+        return {
+            "subject": subject_value(subject),
+            "target_model": state["target_model"],
+            "total": row.total,
+            "pending": row.pending
+        }
+
+    def backfill_batch(self, db: Session, subject: SubjectEnum, embed, batch_size: int = 100) -> int:
+        """
+        Embed one batch of pending chunks into the inactive slot.
+
+        `embed(texts, model)` returns one embedding per text. Returns the
+        number of chunks written (0 once coverage is complete).
+        """
+        state = self.get_state(db, subject)
+        if not state["target_model"]:
+            raise ValueError(f"No embedding migration in progress for {subject_value(subject)}")
+
+        column = state["target_column"]
+        params = {"subject": subject_value(subject), "model": state["target_model"]}
+        rows = db.execute(
+            text(f"""
+                SELECT id, chunk_text FROM document_chunks
+                WHERE {_pending_filter(column)}
+                ORDER BY id
+                LIMIT :batch_size
+            """),
+            {**params, "batch_size": batch_size}
+        ).fetchall()
+        if not rows:
+            return 0
+
+        embeddings = embed([row.chunk_text for row in rows], state["target_model"])
+        update = text(f"""
+            UPDATE document_chunks
+            SET {column} = CAST(:embedding AS vector), {column}_model = :model
+            WHERE id = :id AND subject = :subject
+        """)
+        for row, embedding in zip(rows, embeddings):
+            db.execute(update, {**params, "id": row.id, "embedding": str(embedding)})
+        db.commit()
+        return len(rows)
+
+    def switch(self, db: Session, subject: SubjectEnum) -> Dict[str, Optional[str]]:
+        """
+        Atomically point retrieval at the backfilled slot.
+
+        The embedding_versions row is locked first, so in-flight ingestions
+        (which hold it FOR SHARE) finish before coverage is re-checked.
+        Bumping the corpus version in the same transaction drops cached
+        retrievals made with the old model.
+        """
+        row = db.execute(GET_EMBEDDING_VERSION_FOR_UPDATE, {"subject": subject_value(subject)}).first()
+        state = _state(row)
+        if not state["target_model"]:
+            db.rollback()
+            raise ValueError(f"No embedding migration in progress for {subject_value(subject)}")
+
+        column = state["target_column"]
+        pending = db.execute(
+            text(f"SELECT count(*) FROM document_chunks WHERE {_pending_filter(column)}"),
+            {"subject": subject_value(subject), "model": state["target_model"]}
+        ).scalar()
+        if pending:
+            db.rollback()
+            raise ValueError(f"{pending} chunks still need {state['target_model']} embeddings")
+
+        db.execute(SWITCH_EMBEDDING_VERSION, {
+            "subject": subject_value(subject),
+            "active_column": column,
+            "active_model": state["target_model"]
+        })
+        corpus_service.bump(db, subject)
+        db.commit()
+        return self.get_state(db, subject)
+
+    def chunk_embedding_fields(
+        self,
+        state: Dict[str, Optional[str]],
+        embeddings: Dict[str, List[float]]
+    ) -> Dict[str, Any]:
+        """
+        DocumentChunk column values for a new chunk.
+
+        `embeddings` maps model name to embedding; the active slot is always
+        written, and the target slot too while a migration is in progress.
+        """
+        fields = {
+            state["column"]: embeddings[state["model"]],
+            f"{state['column']}_model": state["model"]
+        }
+        if state["target_model"]:
+            fields[state["target_column"]] = embeddings[state["target_model"]]
+            fields[f"{state['target_column']}_model"] = state["target_model"]
+        return fields
+
+
+# Global embedding version service instance
+embedding_version_service = EmbeddingVersionService()
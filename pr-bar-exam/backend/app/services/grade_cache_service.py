@@ -0,0 +1,273 @@
+"""
+Persistent cache of essay grades.
+
+A grade depends on the essay, the prompt (and rubric items), the subject
+and the reference materials retrieved for it. Entries are keyed by a hash
+of all of these, including the subject's corpus version, so ingesting or
+removing materials makes every older grade unreachable; they are deleted
+later by purge_stale(). The key also includes the grading model, so a new
+GRADING_MODEL or a different routed model grades afresh. Each entry also
+stores a fallback key without the model; it is looked up only while the
+routed model's circuit is open, to serve a grade another model produced.
+
+Stored in Postgres (grade_cache) so hits survive restarts and are shared by
+every API instance. Reads are plain SELECTs; hit counts are kept in memory
+and written in one batched UPDATE per flush interval (run_flusher), so a
+popular entry isn't a row lock every resubmission waits on.
+"""
+from typing import Any, Dict, List, Optional
+from collections import Counter
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import SubjectEnum
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when the grading prompt or grade format changes to orphan old entries
+GRADE_CACHE_FORMAT = 3
+
+GET_GRADE = text("""
+    SELECT grade FROM grade_cache WHERE cache_key = :cache_key
+""")
+
+# Keys are sorted so concurrent flushes from several instances lock rows in
+# the same order
+RECORD_HITS = text("""
+    UPDATE grade_cache g
+    SET hits = g.hits + h.hits, last_hit_at = NOW()
+    FROM unnest(CAST(:cache_keys AS TEXT[]), CAST(:hits AS INTEGER[])) AS h(cache_key, hits)
+    WHERE g.cache_key = h.cache_key
+""")
+
+# Degraded path only: the newest grade for the submission from any model
+GET_FALLBACK_GRADE = text("""
+    SELECT grade
+    FROM grade_cache
+    WHERE fallback_key = :fallback_key
+    ORDER BY created_at DESC
+    LIMIT 1
+""")
+
+SET_GRADE = text("""
+    INSERT INTO grade_cache (cache_key, fallback_key, subject, corpus_version, model, grade)
+    VALUES (:cache_key, :fallback_key, :subject, :corpus_version, :model, CAST(:grade AS JSONB))
+    ON CONFLICT (cache_key) DO NOTHING
+""")
+
+# Entries for older corpus versions can never be hit again
+PURGE_STALE_GRADES = text("""
+    DELETE FROM grade_cache g
+    USING corpus_versions c
+    WHERE g.subject = c.subject AND g.corpus_version < c.version
+""")
+
+
+def normalize_text(value: str) -> str:
+    """Unicode- and whitespace-normalized text, so trivial resubmission edits still hit."""
+    return " ".join(unicodedata.normalize("NFC", value).split())
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _grade_json(grade: Dict[str, Any]) -> str:
+    return json.dumps(grade, default=str)
+
+
+def _grade_value(value: Any) -> Optional[Dict[str, Any]]:
+    # asyncpg/psycopg2 decode JSONB to dicts; fall back if a driver returns text
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class GradeCacheService:
+    """Reads and writes cached grades."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def make_key(
+        self,
+        essay_content: str,
+        prompt: str,
+        subject: SubjectEnum,
+        corpus_version: int,
+        model: str,
+        rubric_items: Optional[List[str]] = None
+    ) -> str:
+        """Key of a grade by a specific grading model."""
+        return self._key(essay_content, prompt, subject, corpus_version, rubric_items, model=model)
+
+    def make_fallback_key(
+        self,
+        essay_content: str,
+        prompt: str,
+        subject: SubjectEnum,
+        corpus_version: int,
+        rubric_items: Optional[List[str]] = None
+    ) -> str:
+        """Key shared by every model's grade of the same submission (see get_fallback)."""
+        return self._key(essay_content, prompt, subject, corpus_version, rubric_items)
+
+    def _key(
+        self,
+        essay_content: str,
+        prompt: str,
+        subject: SubjectEnum,
+        corpus_version: int,
+        rubric_items: Optional[List[str]],
+        **extra: Any
+    ) -> str:
+        parts = {
+            "format": GRADE_CACHE_FORMAT,
+            "essay": _digest(normalize_text(essay_content)),
+            "prompt": _digest(normalize_text(prompt)),
+            "rubric": [_digest(normalize_text(item)) for item in rubric_items or []],
+            "subject": subject.value,
+            "corpus_version": corpus_version,
+            **extra
+        }
+        return _digest(json.dumps(parts, sort_keys=True))
+
+    def get(self, db: Session, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Cached grade for a key, or None."""
+        return self._hit(cache_key, db.execute(GET_GRADE, {"cache_key": cache_key}).scalar())
+
+    async def get_async(self, db: AsyncSession, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Cached grade for a key, or None."""
+        result = await db.execute(GET_GRADE, {"cache_key": cache_key})
+        return self._hit(cache_key, result.scalar())
+
+    def _hit(self, cache_key: str, value: Any) -> Optional[Dict[str, Any]]:
+        if value is not None:
+            with self._lock:
+                self._hits[cache_key] += 1
+        return _grade_value(value)
+
+    def get_fallback(self, db: Session, fallback_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Newest cached grade of the submission from any model, or None.
+
+        Only for when the routed grading model is unavailable (circuit open).
+        """
+        return _grade_value(db.execute(GET_FALLBACK_GRADE, {"fallback_key": fallback_key}).scalar())
+
+    async def get_fallback_async(self, db: AsyncSession, fallback_key: str) -> Optional[Dict[str, Any]]:
+        """Newest cached grade of the submission from any model, or None."""
+        result = await db.execute(GET_FALLBACK_GRADE, {"fallback_key": fallback_key})
+        return _grade_value(result.scalar())
+
+    def set(
+        self,
+        db: Session,
+        cache_key: str,
+        fallback_key: str,
+        subject: SubjectEnum,
+        model: str,
+        corpus_version: int,
+        grade: Dict[str, Any]
+    ) -> None:
+        """
+        Store a grade.
+
+        Runs in the caller's transaction, so it is kept only if the caller
+        commits (e.g. together with the graded submission).
+        """
+        db.execute(SET_GRADE, {
+            "cache_key": cache_key,
+            "fallback_key": fallback_key,
+            "subject": subject.value,
+            "corpus_version": corpus_version,
+            "model": model,
+            "grade": _grade_json(grade)
+        })
+
+    async def set_async(
+        self,
+        db: AsyncSession,
+        cache_key: str,
+        fallback_key: str,
+        subject: SubjectEnum,
+        model: str,
+        corpus_version: int,
+        grade: Dict[str, Any]
+    ) -> None:
+        """Store a grade in the caller's transaction."""
+        await db.execute(SET_GRADE, {
+            "cache_key": cache_key,
+            "fallback_key": fallback_key,
+            "subject": subject.value,
+            "corpus_version": corpus_version,
+            "model": model,
+            "grade": _grade_json(grade)
+        })
+
+    async def flush_hits(self, db: AsyncSession) -> int:
+        """Write the hit counts recorded since the last flush; returns entries updated."""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+        if not hits:
+            return 0
+        cache_keys = sorted(hits)
+        try:
+            await db.execute(RECORD_HITS, {"cache_keys": cache_keys, "hits": [hits[key] for key in cache_keys]})
+            await db.commit()
+        except Exception:
+            # Keep the counts for the next flush
+            with self._lock:
+                self._hits.update(hits)
+            raise
+        return len(cache_keys)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.flush_hits(db)
+            except Exception:
+                logger.exception("Grade cache hit flush failed")
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Start the background hit-count flush (call from the app lifespan)."""
+        if self._task is None:
+            self._task = asyncio.create_task(
+                self._run(interval or settings.GRADE_CACHE_HIT_FLUSH_INTERVAL)
+            )
+
+    async def stop(self) -> None:
+        """Stop the flush task, writing any remaining hit counts."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.flush_hits(db)
+            except Exception:
+                logger.exception("Grade cache hit flush failed")
+
+    def purge_stale(self, db: Session) -> int:
+        """Delete grades computed against an older corpus version; returns rows deleted."""
+        deleted = db.execute(PURGE_STALE_GRADES).rowcount
+        db.commit()
+        return deleted
+
+
+# Global grade cache service instance
+grade_cache_service = GradeCacheService()
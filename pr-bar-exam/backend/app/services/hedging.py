@@ -0,0 +1,137 @@
+"""
+Request hedging for idempotent OpenAI calls.
+
+If a call hasn't returned after the HEDGE_PERCENTILE latency of recent
+calls, a second identical call is issued and whichever finishes first wins;
+the other is cancelled (async) or its result discarded (sync - a blocking
+call can't be interrupted). Both attempts go through openai_limiter, so
+hedges count against the model's rate budget like any other call.
+
+Hedges are capped by HEDGE_BUDGET: every call earns that fraction of a
+hedge, so at most ~HEDGE_BUDGET extra load is added. No hedging happens
+until HEDGE_MIN_SAMPLES latencies have been observed. Opt-in with
+HEDGE_ENABLED; outcomes are recorded in llm_metrics.
+"""
+from typing import Any, Awaitable, Callable, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from app.core.config import settings
+from app.services.llm_metrics import llm_metrics
+import asyncio
+import contextvars
+import threading
+import time
+
+# Hedges saved up at most, so an idle period can't fund a burst
+MAX_HEDGE_CREDIT = 10.0
+
+
+class Hedger:
+    """Latency tracking, hedge budget and hedged execution for one kind of call."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._credit = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < settings.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        position = int(settings.HEDGE_PERCENTILE * (len(ordered) - 1))
+        return max(settings.HEDGE_MIN_DELAY, ordered[position])
+
+    def _earn(self) -> None:
+        with self._lock:
+            self._credit = min(MAX_HEDGE_CREDIT, self._credit + settings.HEDGE_BUDGET)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            return True
+
+    def _observe(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _timed(self, fn: Callable[[], Any]) -> Any:
+        start = time.monotonic()
+        result = fn()
+        self._observe(time.monotonic() - start)
+        return result
+
+    async def _timed_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        result = await fn()
+        self._observe(time.monotonic() - start)
+        return result
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix=f"hedge-{self.kind}")
+            return self._executor
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run a blocking idempotent call, hedging it if it's slow."""
+        if not settings.HEDGE_ENABLED:
+            return fn()
+        self._earn()
+        delay = self.delay()
+
+        # Attempts run on the pool (in a copy of this context, keeping usage tags)
+        submit = lambda: self._pool().submit(contextvars.copy_context().run, self._timed, fn)
+        attempts = [submit()]
+        done, _ = wait(attempts, timeout=delay)
+        if not done and self._take_budget():
+            attempts.append(submit())
+        hedged = len(attempts) > 1
+
+        pending, error = set(attempts), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    llm_metrics.record_hedge(self.kind, hedged, hedged and attempt is attempts[1])
+                    return attempt.result()
+                error = attempt.exception()
+        llm_metrics.record_hedge(self.kind, hedged, False)
+        raise error
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an idempotent coroutine call, hedging it if it's slow; the loser is cancelled."""
+        if not settings.HEDGE_ENABLED:
+            return await fn()
+        self._earn()
+        delay = self.delay()
+
+        attempts: List[asyncio.Future] = [asyncio.ensure_future(self._timed_async(fn))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self._take_budget():
+                attempts.append(asyncio.ensure_future(self._timed_async(fn)))
+            hedged = len(attempts) > 1
+
+            pending, error = set(attempts), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        llm_metrics.record_hedge(self.kind, hedged, hedged and attempt is attempts[1])
+                        return attempt.result()
+                    error = attempt.exception()
+            llm_metrics.record_hedge(self.kind, hedged, False)
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+
+# Global hedger instances
+embedding_hedger = Hedger("embedding")
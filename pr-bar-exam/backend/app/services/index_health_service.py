@@ -0,0 +1,207 @@
+"""
+Vector index health and corpus statistics.
+
+Collects per-subject chunk counts, per-partition vector index size and
+bloat, ivfflat sizing, and the average distance of live retrievals, and
+turns them into an explicit "reindex recommended" signal so index
+maintenance (scripts/rebuild_vector_index.py) is driven by data.
+"""
+from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+import math
+import threading
+
+
+CORPUS_STATS = text("""
+    SELECT
+        dc.subject,
+        count(*) AS chunks,
+        count(*) FILTER (
+            WHERE CASE WHEN ev.active_column = 'embedding_alt'
+                       THEN dc.embedding_alt IS NULL
+                       ELSE dc.embedding IS NULL END
+        ) AS embedding_nulls
+    FROM document_chunks dc
+    LEFT JOIN embedding_versions ev ON ev.subject = dc.subject
+    GROUP BY dc.subject
+    ORDER BY dc.subject
+""")
+
+# Leaf vector indexes on document_chunks or its partitions (partitioned
+# parent indexes have no storage of their own and are skipped)
+VECTOR_INDEX_STATS = text("""
+    WITH tables AS (
+        SELECT c.oid, c.relname FROM pg_class c WHERE c.relname = 'document_chunks'
+        UNION ALL
+        SELECT child.oid, child.relname
+        FROM pg_inherits inh
+        JOIN pg_class parent ON parent.oid = inh.inhparent
+        JOIN pg_class child ON child.oid = inh.inhrelid
+        WHERE parent.relname = 'document_chunks'
+    )
+    SELECT
+        t.relname AS table_name,
+        i.relname AS index_name,
+        am.amname AS index_type,
+        pg_relation_size(i.oid) AS index_bytes,
+        ix.indisvalid AS is_valid,
+        array_to_string(i.reloptions, ',') AS options,
+        coalesce(s.n_live_tup, 0) AS live_tuples,
+        coalesce(s.n_dead_tup, 0) AS dead_tuples,
+        greatest(s.last_vacuum, s.last_autovacuum) AS last_vacuum
+    FROM tables t
+    JOIN pg_index ix ON ix.indrelid = t.oid
+    JOIN pg_class i ON i.oid = ix.indexrelid AND i.relkind = 'i'
+    JOIN pg_am am ON am.oid = i.relam
+    LEFT JOIN pg_stat_user_tables s ON s.relid = t.oid
+    WHERE am.amname IN ('hnsw', 'ivfflat')
+    ORDER BY t.relname, i.relname
+""")
+
+
+class RetrievalStats:
+    """Running per-subject average of retrieval distances (this process only)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"retrievals": 0, "distance_sum": 0.0, "top1_distance_sum": 0.0})
+
+    def record(self, subject: str, distances: List[float]) -> None:
+        """Record one retrieval's result distances (closest first)."""
+        if not distances:
+            return
+        with self._lock:
+            stats = self._stats[subject]
+            stats["retrievals"] += 1
+            stats["distance_sum"] += sum(distances) / len(distances)
+            stats["top1_distance_sum"] += distances[0]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                subject: {
+                    "retrievals": stats["retrievals"],
+                    "avg_distance": stats["distance_sum"] / stats["retrievals"],
+                    "avg_top1_distance": stats["top1_distance_sum"] / stats["retrievals"]
+                }
+                for subject, stats in self._stats.items()
+            }
+
+
+def _parse_options(options: Optional[str]) -> Dict[str, str]:
+    """'lists=100,foo=bar' -> {'lists': '100', 'foo': 'bar'}"""
+    if not options:
+        return {}
+    return dict(option.split("=", 1) for option in options.split(","))
+
+
+def recommended_ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+class IndexHealthService:
+    """Builds the vector index health report and its metrics export."""
+
+    def _index_health(self, row) -> Dict[str, Any]:
+        total_tuples = row.live_tuples + row.dead_tuples
+        dead_ratio = row.dead_tuples / total_tuples if total_tuples else 0.0
+        options = _parse_options(row.options)
+        reasons = []
+
+        if not row.is_valid:
+            reasons.append("index is invalid (interrupted concurrent build)")
+        if dead_ratio > settings.INDEX_DEAD_TUPLE_RATIO_MAX:
+            reasons.append(f"dead tuple ratio {dead_ratio:.2f} > {settings.INDEX_DEAD_TUPLE_RATIO_MAX}")
+
+        lists = recommended = imbalance = None
+        if row.index_type == "ivfflat":
+            # pgvector doesn't expose per-list sizes, so imbalance is measured
+            # as how far `lists` is from what the current row count calls for
+            # (an index built on an empty or much smaller table is far off)
+            lists = int(options.get("lists", 100))
+            recommended = recommended_ivfflat_lists(row.live_tuples)
+            imbalance = max(lists, recommended) / min(lists, recommended)
+            if row.live_tuples >= settings.INDEX_MIN_ROWS and imbalance > settings.IVFFLAT_LIST_IMBALANCE_MAX:
+                reasons.append(f"lists={lists} but {row.live_tuples} rows call for ~{recommended}")
+
+        return {
+            "table": row.table_name,
+            "index_name": row.index_name,
+            "index_type": row.index_type,
+            "size_bytes": row.index_bytes,
+            "is_valid": row.is_valid,
+            "live_tuples": row.live_tuples,
+            "dead_tuples": row.dead_tuples,
+            "dead_tuple_ratio": dead_ratio,
+            "last_vacuum": row.last_vacuum,
+            "lists": lists,
+            "recommended_lists": recommended,
+            "list_imbalance": imbalance,
+            "reindex_recommended": bool(reasons),
+            "reasons": reasons
+        }
+
+    async def report(self, db: AsyncSession) -> Dict[str, Any]:
+        """Per-subject corpus stats and per-index health."""
+        retrievals = retrieval_stats.snapshot()
+
+        subjects = []
+        for row in (await db.execute(CORPUS_STATS)).fetchall():
+            live = retrievals.get(row.subject, {})
+            subjects.append({
+                "subject": row.subject,
+                "chunks": row.chunks,
+                "embedding_nulls": row.embedding_nulls,
+                "retrievals": live.get("retrievals", 0),
+                "avg_retrieval_distance": live.get("avg_distance"),
+                "avg_top1_distance": live.get("avg_top1_distance")
+            })
+
+        indexes = [self._index_health(row) for row in (await db.execute(VECTOR_INDEX_STATS)).fetchall()]
+
+        return {
+            "subjects": subjects,
+            "indexes": indexes,
+            "reindex_recommended": any(index["reindex_recommended"] for index in indexes)
+        }
+
+    def to_prometheus(self, report: Dict[str, Any]) -> str:
+        """Render a report in the Prometheus text exposition format."""
+        metrics = [
+            ("barprep_document_chunks", "gauge", "Chunks per subject",
+             [({"subject": s["subject"]}, s["chunks"]) for s in report["subjects"]]),
+            ("barprep_document_chunks_embedding_nulls", "gauge", "Chunks without an active embedding",
+             [({"subject": s["subject"]}, s["embedding_nulls"]) for s in report["subjects"]]),
+            ("barprep_retrieval_avg_distance", "gauge", "Mean cosine distance of retrieved chunks",
+             [({"subject": s["subject"]}, s["avg_retrieval_distance"]) for s in report["subjects"]]),
+            ("barprep_vector_index_size_bytes", "gauge", "Vector index size",
+             [({"index": i["index_name"]}, i["size_bytes"]) for i in report["indexes"]]),
+            ("barprep_vector_index_dead_tuple_ratio", "gauge", "Dead tuples / all tuples of the indexed table",
+             [({"index": i["index_name"]}, i["dead_tuple_ratio"]) for i in report["indexes"]]),
+            ("barprep_vector_index_list_imbalance", "gauge", "ivfflat lists vs recommended (1 = ideal)",
+             [({"index": i["index_name"]}, i["list_imbalance"]) for i in report["indexes"]]),
+            ("barprep_vector_index_reindex_recommended", "gauge", "1 if the index should be rebuilt",
+             [({"index": i["index_name"]}, int(i["reindex_recommended"])) for i in report["indexes"]]),
+        ]
+
+        lines = []
+        for name, metric_type, help_text, samples in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Global retrieval stats and index health service instances
+retrieval_stats = RetrievalStats()
+index_health_service = IndexHealthService()
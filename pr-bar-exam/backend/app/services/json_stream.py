@@ -0,0 +1,127 @@
+"""
+Incremental parsing of a JSON object streamed token by token.
+
+Used to surface parts of a streamed completion (e.g. individual grade
+fields) the moment they are complete, instead of after the whole response.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import json
+
+
+Path = Tuple[Any, ...]
+
+
+class JSONObjectStream:
+    """
+    Feed text chunks of a single JSON object; get back each value as soon as
+    it is complete.
+
+    feed() returns (path, value) pairs for every value at depth <= max_depth,
+    e.g. ("overall_score",) -> 85.5, ("point_breakdown", "strengths") -> [...],
+    ("citations", 0) -> {...}. Containers are reported after their members.
+    Text before the opening brace (such as a ```json fence) is ignored.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.pos = 0
+        self.stack: List[Dict[str, Any]] = []
+        self.in_string = False
+        self.escape = False
+        self.start: Optional[int] = None
+        self.result: Optional[Any] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        self.buffer += text
+        events: List[Tuple[Path, Any]] = []
+
+        while self.pos < len(self.buffer) and not self.done:
+            ch = self.buffer[self.pos]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self._string_end(self.pos + 1, events)
+            elif not self.stack:
+                if ch == "{":
+                    self.start = self.pos
+                    self.stack.append(self._frame("object", ()))
+            elif ch == '"':
+                self.in_string = True
+                frame = self.stack[-1]
+                if frame["expect"] == "key":
+                    frame["key_start"] = self.pos
+                else:
+                    frame["value_start"] = self.pos
+            elif ch in "{[":
+                frame = self.stack[-1]
+                frame["value_start"] = self.pos
+                self.stack.append(self._frame("object" if ch == "{" else "array", self._value_path(frame)))
+            elif ch in "}]":
+                self._finish_scalar(self.pos, events)
+                self.stack.pop()
+                if self.stack:
+                    self._value_end(self.stack[-1], self.pos + 1, events)
+                else:
+                    self.result = json.loads(self.buffer[self.start:self.pos + 1])
+            elif ch == ":":
+                self.stack[-1]["expect"] = "value"
+            elif ch == ",":
+                self._finish_scalar(self.pos, events)
+                frame = self.stack[-1]
+                if frame["kind"] == "object":
+                    frame["expect"] = "key"
+                else:
+                    frame["index"] += 1
+            elif not ch.isspace():
+                frame = self.stack[-1]
+                if frame["value_start"] is None:
+                    frame["value_start"] = self.pos
+                    frame["scalar"] = True
+
+            self.pos += 1
+
+        return events
+
+    def _frame(self, kind: str, path: Path) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "path": path,
+            "expect": "key" if kind == "object" else "value",
+            "key": None,
+            "key_start": None,
+            "index": 0,
+            "value_start": None,
+            "scalar": False
+        }
+
+    def _value_path(self, frame: Dict[str, Any]) -> Path:
+        return frame["path"] + ((frame["key"],) if frame["kind"] == "object" else (frame["index"],))
+
+    def _string_end(self, end: int, events: List[Tuple[Path, Any]]) -> None:
+        frame = self.stack[-1]
+        if frame["kind"] == "object" and frame["expect"] == "key":
+            frame["key"] = json.loads(self.buffer[frame["key_start"]:end])
+        else:
+            self._value_end(frame, end, events)
+
+    def _finish_scalar(self, end: int, events: List[Tuple[Path, Any]]) -> None:
+        frame = self.stack[-1]
+        if frame["scalar"] and frame["value_start"] is not None:
+            self._value_end(frame, end, events)
+
+    def _value_end(self, frame: Dict[str, Any], end: int, events: List[Tuple[Path, Any]]) -> None:
+        path = self._value_path(frame)
+        if len(path) <= self.max_depth:
+            events.append((path, json.loads(self.buffer[frame["value_start"]:end])))
+        frame["value_start"] = None
+        frame["scalar"] = False
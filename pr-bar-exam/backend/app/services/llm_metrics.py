@@ -0,0 +1,272 @@
+"""
+Per-request accounting of OpenAI usage.
+
+openai_limiter records every embedding and chat call here: model, prompt
+and completion tokens, cost, latency (including rate-limit waits and
+retries) and retries. Calls are tagged with the API route and user of the
+request that made them (set by the middleware in app/main.py; calls made
+outside a request are tagged "background"). Cache lookups in front of the
+API (retrieval, grades) and request hedging outcomes are recorded too.
+
+Everything is aggregated in process (this instance only), exposed under
+/admin/llm-usage (JSON and Prometheus text) and logged as one JSON line per
+call.
+"""
+from typing import Any, Dict, Optional, Tuple
+from collections import defaultdict, deque
+from contextvars import ContextVar, Token
+from app.core.config import settings
+import json
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_tags: ContextVar[Optional[Dict[str, Optional[str]]]] = ContextVar("llm_request_tags", default=None)
+
+
+def set_request_tags(route: str, user: Optional[str]) -> Token:
+    """Tag calls made by the current request (and tasks it starts)."""
+    return _request_tags.set({"route": route, "user": user})
+
+
+def reset_request_tags(token: Token) -> None:
+    _request_tags.reset(token)
+
+
+def current_tags() -> Dict[str, Optional[str]]:
+    return _request_tags.get() or {"route": "background", "user": None}
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD cost of a call from OPENAI_PRICING (per million tokens; unknown models cost 0)."""
+    pricing = settings.OPENAI_PRICING.get(model, {})
+    return (
+        prompt_tokens * pricing.get("prompt", 0.0)
+        + completion_tokens * pricing.get("completion", 0.0)
+    ) / 1_000_000
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class _Series:
+    """Counters and latency histogram for one (route, kind, model)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_sum = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = deque(maxlen=1000)
+
+    def observe(self, latency: float) -> None:
+        self.latency_sum += latency
+        self.recent.append(latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+
+
+class LLMMetrics:
+    """In-process aggregation of OpenAI calls and cache lookups."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str, str], _Series] = defaultdict(_Series)
+        self._users: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "tokens": 0, "cost": 0.0})
+        self._cache: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._hedges: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "hedged": 0, "hedge_wins": 0})
+        # Recent (latency, failed) per model across routes, for model routing
+        self._models: Dict[str, deque] = defaultdict(lambda: deque(maxlen=200))
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        latency: float,
+        retries: int,
+        usage: Any = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Record one API call (after its last attempt).
+
+        usage is the response's usage object; streamed completions have
+        none, and report their tokens afterwards through record_tokens().
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        self._add(kind, model, prompt_tokens, completion_tokens, latency=latency, retries=retries, error=error)
+
+    def record_tokens(self, kind: str, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        """Add token usage counted by the caller (streamed completions)."""
+        self._add(kind, model, prompt_tokens, completion_tokens)
+
+    def _add(
+        self,
+        kind: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: Optional[float] = None,
+        retries: int = 0,
+        error: Optional[str] = None
+    ) -> None:
+        tags = current_tags()
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            series = self._series[(tags["route"], kind, model)]
+            series.prompt_tokens += prompt_tokens
+            series.completion_tokens += completion_tokens
+            series.cost += cost
+            user = self._users[tags["user"]] if tags["user"] is not None else None
+            if user is not None:
+                user["tokens"] += prompt_tokens + completion_tokens
+                user["cost"] += cost
+            if latency is not None:
+                series.calls += 1
+                series.retries += retries
+                series.errors += error is not None
+                series.observe(latency)
+                self._models[model].append((latency, error is not None))
+                if user is not None:
+                    user["calls"] += 1
+
+        if settings.LLM_USAGE_LOG_ENABLED:
+            logger.info(json.dumps({
+                "event": "llm_call" if latency is not None else "llm_tokens",
+                "kind": kind,
+                "model": model,
+                "route": tags["route"],
+                "user": tags["user"],
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost, 6),
+                "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+                "retries": retries,
+                "error": error
+            }))
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        """Record a cache lookup made in place of API calls."""
+        route = current_tags()["route"]
+        with self._lock:
+            self._cache[(route, cache)]["hits" if hit else "misses"] += 1
+
+    def record_hedge(self, kind: str, hedged: bool, hedge_won: bool) -> None:
+        """Record a hedged call: whether a second attempt was sent and whether it won."""
+        with self._lock:
+            hedges = self._hedges[kind]
+            hedges["calls"] += 1
+            hedges["hedged"] += hedged
+            hedges["hedge_wins"] += hedge_won
+
+    def model_stats(self, model: str) -> Dict[str, Any]:
+        """Calls, p95 latency and error rate over a model's recent calls."""
+        with self._lock:
+            recent = list(self._models.get(model, ()))
+        return {
+            "calls": len(recent),
+            "latency_p95": _percentile([latency for latency, failed in recent if not failed], 0.95),
+            "error_rate": sum(failed for _, failed in recent) / len(recent) if recent else 0.0
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregates so far, with p50/p95 over each series' recent calls."""
+        with self._lock:
+            calls = [
+                {
+                    "route": route,
+                    "kind": kind,
+                    "model": model,
+                    "calls": series.calls,
+                    "errors": series.errors,
+                    "retries": series.retries,
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "cost_usd": round(series.cost, 6),
+                    "latency_p50": _percentile(series.recent, 0.5),
+                    "latency_p95": _percentile(series.recent, 0.95)
+                }
+                for (route, kind, model), series in sorted(self._series.items())
+            ]
+            users = {user: dict(totals) for user, totals in self._users.items()}
+            caches = [
+                {"route": route, "cache": cache, **counts}
+                for (route, cache), counts in sorted(self._cache.items())
+            ]
+            hedges = {kind: dict(counts) for kind, counts in self._hedges.items()}
+        return {"calls": calls, "users": users, "caches": caches, "hedges": hedges}
+
+    def to_prometheus(self) -> str:
+        """Render the aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            series = sorted(self._series.items())
+            caches = sorted(self._cache.items())
+            hedges = sorted((kind, dict(counts)) for kind, counts in self._hedges.items())
+
+        lines = []
+
+        def header(name: str, metric_type: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        def labels(**values: str) -> str:
+            return ",".join(f'{key}="{value}"' for key, value in values.items())
+
+        counters = [
+            ("barprep_llm_calls_total", "OpenAI API calls", lambda s: s.calls),
+            ("barprep_llm_errors_total", "OpenAI API calls that failed after retries", lambda s: s.errors),
+            ("barprep_llm_retries_total", "Retried OpenAI API attempts", lambda s: s.retries),
+            ("barprep_llm_prompt_tokens_total", "Prompt tokens", lambda s: s.prompt_tokens),
+            ("barprep_llm_completion_tokens_total", "Completion tokens", lambda s: s.completion_tokens),
+            ("barprep_llm_cost_usd_total", "Estimated cost (OPENAI_PRICING)", lambda s: round(s.cost, 6)),
+        ]
+        for name, help_text, value in counters:
+            header(name, "counter", help_text)
+            for (route, kind, model), s in series:
+                lines.append(f"{name}{{{labels(route=route, kind=kind, model=model)}}} {value(s)}")
+
+        name = "barprep_llm_latency_seconds"
+        header(name, "histogram", "OpenAI call latency including rate-limit waits and retries")
+        for (route, kind, model), s in series:
+            base = labels(route=route, kind=kind, model=model)
+            for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{base},le="+Inf"}} {s.calls}')
+            lines.append(f"{name}_sum{{{base}}} {s.latency_sum}")
+            lines.append(f"{name}_count{{{base}}} {s.calls}")
+
+        for result in ("hits", "misses"):
+            name = f"barprep_llm_cache_{result}_total"
+            header(name, "counter", f"Cache {result} in front of OpenAI calls")
+            for (route, cache), counts in caches:
+                lines.append(f"{name}{{{labels(route=route, cache=cache)}}} {counts[result]}")
+
+        for result, help_text in (
+            ("calls", "Calls eligible for hedging"),
+            ("hedged", "Calls that sent a hedge request"),
+            ("hedge_wins", "Calls won by the hedge request"),
+        ):
+            name = f"barprep_llm_hedge_{result}_total"
+            header(name, "counter", help_text)
+            for kind, counts in hedges:
+                lines.append(f"{name}{{{labels(kind=kind)}}} {counts[result]}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Global LLM metrics instance
+llm_metrics = LLMMetrics()
@@ -0,0 +1,66 @@
+"""
+Maximal marginal relevance (MMR) selection for retrieved chunks.
+
+Neighbouring chunks overlap by CHUNK_OVERLAP characters, so plain top-k
+often returns near-duplicates. MMR greedily picks the candidate that is most
+relevant to the query while least similar to what has already been picked.
+"""
+from typing import List, Sequence, Any
+import json
+import numpy as np
+
+
+def as_matrix(embeddings: Sequence[Any]) -> np.ndarray:
+    """
+    Stack embeddings into an (n, d) float array.
+
+    Accepts lists, numpy arrays, or pgvector's text form ("[0.1,0.2,...]")
+    as returned by raw SQL without a registered vector codec.
+    """
+    rows = [json.loads(e) if isinstance(e, str) else e for e in embeddings]
+    return np.asarray(rows, dtype=np.float32)
+
+
+def mmr_select(
+    relevance: Sequence[float],
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Pick k candidate indices by maximal marginal relevance.
+
+    Args:
+        relevance: Similarity of each candidate to the query (higher is better)
+        embeddings: (n, d) candidate embeddings
+        k: Number of candidates to select
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        Selected indices, in selection order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.where(norms == 0, 1, norms)
+    pairwise = normalized @ normalized.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything already selected
+    max_sim_to_selected = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim_to_selected
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim_to_selected, pairwise[best], out=max_sim_to_selected)
+
+    return selected
@@ -0,0 +1,95 @@
+"""
+Latency-aware model routing for grading and MCQ generation.
+
+MODEL_ROUTES lists, per task, candidate models in order of preference
+(typically cheapest/fastest first), each optionally limited to inputs of at
+most `max_input_tokens` and, for MCQs, to some `difficulties`:
+
+    {"grading": [{"model": "gpt-4o-mini", "max_input_tokens": 1500},
+                 {"model": "gpt-4o"}],
+     "mcq": [{"model": "gpt-4o-mini", "difficulties": ["easy", "medium"]},
+             {"model": "gpt-4o"}]}
+
+A task is routed to the first candidate that admits the input and is
+healthy: circuit closed and, once MODEL_ROUTING_MIN_SAMPLES recent calls
+are known (llm_metrics), p95 latency within the task's
+MODEL_TARGET_LATENCY and error rate below MODEL_ROUTING_MAX_ERROR_RATE.
+If none is, the candidate with the lowest p95 among those whose circuit is
+closed is used, regardless of its input limits. Tasks without routes use
+OPENAI_MODEL.
+"""
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.llm_metrics import llm_metrics
+from app.services.circuit_breaker import circuit_breakers
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRADING = "grading"
+MCQ = "mcq"
+
+
+class ModelRouter:
+    """Chooses the model for a task from MODEL_ROUTES and live model stats."""
+
+    def candidates(self, task: str) -> List[Dict[str, Any]]:
+        return settings.MODEL_ROUTES.get(task) or [{"model": settings.OPENAI_MODEL}]
+
+    def _admits(self, route: Dict[str, Any], input_tokens: int, difficulty: Optional[str]) -> bool:
+        max_tokens = route.get("max_input_tokens")
+        if max_tokens is not None and input_tokens > max_tokens:
+            return False
+        difficulties = route.get("difficulties")
+        return not (difficulties and difficulty is not None and difficulty not in difficulties)
+
+    def _healthy(self, model: str, target_latency: Optional[float]) -> bool:
+        if circuit_breakers.is_open(model):
+            return False
+        stats = llm_metrics.model_stats(model)
+        if stats["calls"] < settings.MODEL_ROUTING_MIN_SAMPLES:
+            return True
+        if stats["error_rate"] >= settings.MODEL_ROUTING_MAX_ERROR_RATE:
+            return False
+        p95 = stats["latency_p95"]
+        return target_latency is None or p95 is None or p95 <= target_latency
+
+    def route(self, task: str, input_tokens: int = 0, difficulty: Optional[str] = None) -> str:
+        """Model to use for a task with this input size (and MCQ difficulty)."""
+        routes = self.candidates(task)
+        if len(routes) == 1:
+            return routes[0]["model"]
+
+        target_latency = settings.MODEL_TARGET_LATENCY.get(task)
+        eligible = [route for route in routes if self._admits(route, input_tokens, difficulty)]
+        for route in eligible:
+            if self._healthy(route["model"], target_latency):
+                return route["model"]
+
+        # Nothing admissible is healthy: take the fastest model still accepting calls
+        available = [route["model"] for route in routes if not circuit_breakers.is_open(route["model"])]
+        if available:
+            model = min(available, key=lambda m: llm_metrics.model_stats(m)["latency_p95"] or 0.0)
+        else:
+            model = (eligible or routes)[0]["model"]
+        logger.info("Routing %s (%d tokens) to %s: preferred models unhealthy", task, input_tokens, model)
+        return model
+
+    def available(self, task: str) -> bool:
+        """False only when every model for the task has an open circuit."""
+        return any(not circuit_breakers.is_open(route["model"]) for route in self.candidates(task))
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Routes per task with their models' current stats."""
+        return {
+            task: [
+                {**route, **llm_metrics.model_stats(route["model"]),
+                 "circuit": circuit_breakers.get(route["model"]).stats()["state"]}
+                for route in self.candidates(task)
+            ]
+            for task in (GRADING, MCQ)
+        }
+
+
+# Global model router instance
+model_router = ModelRouter()
@@ -0,0 +1,359 @@
+"""
+Process-wide rate limiting for OpenAI calls.
+
+Every embedding and chat call from the sync and async RAG services goes
+through one OpenAILimiter, which keeps a budget per model:
+
+- token buckets for requests/minute and tokens/minute (OPENAI_RATE_LIMITS),
+  with a share reserved for interactive calls so background work (ingestion,
+  backfills, question bank refills) can't starve live grading;
+- AIMD concurrency: the in-flight limit grows by one per window of healthy
+  calls and halves on a 429, a timeout, a 5xx or a latency spike;
+- retries with full jitter that honor Retry-After, pausing the whole model
+  budget (not just the failing caller) so a 429 doesn't become a storm.
+
+The OpenAI clients are created with max_retries=0; this is the only retry layer.
+A streamed call keeps its slot until the stream ends, and its latency is
+measured to the end of the stream, not to the first chunk.
+Each call's outcome (tokens, latency, retries) is recorded in llm_metrics,
+and each attempt's outcome feeds the model's circuit breaker, which stops
+calls (and retries) while the model is failing or too slow.
+"""
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+from app.services.llm_metrics import llm_metrics
+from app.services.circuit_breaker import circuit_breakers, CircuitOpenError
+import asyncio
+import logging
+import random
+import threading
+import time
+import openai
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Errors that mean the model is overloaded: back off concurrency like a 429
+OVERLOAD_ERRORS = (
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously. Not thread-safe; ModelBudget locks it."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float, now: float) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` of capacity."""
+        self._refill(now)
+        amount = min(amount, self.capacity * (1 - reserve))
+        needed = amount + self.capacity * reserve - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Refund (positive) or charge (negative) once actual usage is known."""
+        self.level = min(self.capacity, self.level + delta)
+
+
+class ModelBudget:
+    """Rate buckets, AIMD concurrency and latency baseline for one model."""
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(settings.OPENAI_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: int, priority: str) -> float:
+        """Take a slot and budget; returns 0 on success or seconds to wait."""
+        reserve = settings.OPENAI_BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.limit):
+                return 0.05
+            wait = max(
+                self.requests.wait_time(1, reserve, now),
+                self.tokens.wait_time(tokens, reserve, now)
+            )
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def release(self, latency: Optional[float], throttled: bool = False, overloaded: bool = False) -> None:
+        """
+        Free a slot. latency is given for successful calls only; throttled
+        (429) and overloaded (timeout, 5xx) failures shrink the limit, other
+        failures leave it unchanged.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            spike = (
+                latency is not None
+                and self.samples >= 10
+                and latency > self.latency_ewma * settings.OPENAI_LATENCY_SPIKE_FACTOR
+            )
+            if throttled or overloaded or spike:
+                # Multiplicative decrease, at most once per second of signals
+                if now - self.last_decrease > 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+                    reason = "429" if throttled else "timeout/5xx" if overloaded else f"latency {latency:.1f}s"
+                    logger.info("%s concurrency -> %d (%s)", self.model, int(self.limit), reason)
+            elif latency is not None:
+                # Additive increase: +1 per `limit` healthy calls
+                self.limit = min(float(settings.OPENAI_MAX_CONCURRENCY), self.limit + 1 / self.limit)
+            if latency is not None:
+                self.samples += 1
+                self.latency_ewma = latency if self.latency_ewma is None else 0.9 * self.latency_ewma + 0.1 * latency
+
+    def pause(self, seconds: float) -> None:
+        """Stop all callers for this model (after a 429 with Retry-After)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def reconcile(self, estimated: int, actual: Optional[int]) -> None:
+        if actual is not None:
+            with self.lock:
+                self.tokens.adjust(estimated - actual)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After / retry-after-ms header, if the error has one."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _release_failed(budget: ModelBudget, breaker: Any, error: BaseException) -> None:
+    """Report a failed attempt to the model's concurrency limit and circuit breaker."""
+    throttled = isinstance(error, openai.RateLimitError)
+    budget.release(None, throttled=throttled, overloaded=isinstance(error, OVERLOAD_ERRORS))
+    # 429s, bad requests and cancellations say nothing about the backend's health
+    breaker.record(True if isinstance(error, RETRYABLE_ERRORS) and not throttled else None)
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class OpenAILimiter:
+    """Shared limiter for every OpenAI call in the process."""
+
+    def __init__(self):
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, model: str) -> ModelBudget:
+        with self._lock:
+            if model not in self._budgets:
+                limits = settings.OPENAI_RATE_LIMITS.get(model, {})
+                self._budgets[model] = ModelBudget(
+                    model,
+                    rpm=limits.get("rpm", settings.OPENAI_DEFAULT_RPM),
+                    tpm=limits.get("tpm", settings.OPENAI_DEFAULT_TPM)
+                )
+            return self._budgets[model]
+
+    def _backoff(self, budget: ModelBudget, error: Exception, attempt: int) -> float:
+        """Delay before retry `attempt`: Retry-After if given, else exponential with full jitter."""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            if isinstance(error, openai.RateLimitError):
+                budget.pause(retry_after)
+            return retry_after + random.uniform(0, settings.OPENAI_RETRY_BASE_DELAY)
+        return random.uniform(0, settings.OPENAI_RETRY_BASE_DELAY * 2 ** attempt)
+
+    def call(
+        self,
+        model: str,
+        tokens: int,
+        fn: Callable[[], Any],
+        priority: str = INTERACTIVE,
+        kind: str = "chat"
+    ) -> Any:
+        """Run a blocking OpenAI call under the model's budget, retrying transient errors."""
+        budget = self.budget(model)
+        breaker = circuit_breakers.get(model)
+        started = time.monotonic()
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                if attempt:
+                    llm_metrics.record(kind, model, time.monotonic() - started, attempt, error="CircuitOpenError")
+                raise
+            while (wait := budget.try_acquire(tokens, priority)) > 0:
+                time.sleep(wait)
+            start = time.monotonic()
+            try:
+                response = fn()
+            except RETRYABLE_ERRORS as e:
+                _release_failed(budget, breaker, e)
+                if attempt == settings.OPENAI_MAX_RETRIES:
+                    llm_metrics.record(kind, model, time.monotonic() - started, attempt, error=type(e).__name__)
+                    raise
+                delay = self._backoff(budget, e, attempt)
+                logger.warning("%s call failed (%s); retry %d in %.1fs", model, type(e).__name__, attempt + 1, delay)
+                time.sleep(delay)
+                continue
+            except Exception as e:
+                _release_failed(budget, breaker, e)
+                llm_metrics.record(kind, model, time.monotonic() - started, attempt, error=type(e).__name__)
+                raise
+            latency = time.monotonic() - start
+            budget.release(latency)
+            breaker.record(False, latency)
+            budget.reconcile(tokens, _usage_tokens(response))
+            llm_metrics.record(kind, model, time.monotonic() - started, attempt, usage=getattr(response, "usage", None))
+            return response
+
+    async def call_async(
+        self,
+        model: str,
+        tokens: int,
+        fn: Callable[[], Awaitable[Any]],
+        priority: str = INTERACTIVE,
+        kind: str = "chat",
+        stream: bool = False
+    ) -> Any:
+        """
+        Async version of call(); waits with asyncio.sleep so the event loop keeps running.
+
+        With stream=True, fn returns a streamed response; it is returned
+        wrapped so the call is released and recorded when the stream ends.
+        Only opening the stream is retried.
+        """
+        budget = self.budget(model)
+        breaker = circuit_breakers.get(model)
+        started = time.monotonic()
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                if attempt:
+                    llm_metrics.record(kind, model, time.monotonic() - started, attempt, error="CircuitOpenError")
+                raise
+            try:
+                while (wait := budget.try_acquire(tokens, priority)) > 0:
+                    await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                breaker.record(None)
+                raise
+            start = time.monotonic()
+            try:
+                response = await fn()
+            except RETRYABLE_ERRORS as e:
+                _release_failed(budget, breaker, e)
+                if attempt == settings.OPENAI_MAX_RETRIES:
+                    llm_metrics.record(kind, model, time.monotonic() - started, attempt, error=type(e).__name__)
+                    raise
+                delay = self._backoff(budget, e, attempt)
+                logger.warning("%s call failed (%s); retry %d in %.1fs", model, type(e).__name__, attempt + 1, delay)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                _release_failed(budget, breaker, e)
+                # A cancelled call (e.g. a hedge's loser) isn't a failure
+                if not isinstance(e, asyncio.CancelledError):
+                    llm_metrics.record(kind, model, time.monotonic() - started, attempt, error=type(e).__name__)
+                raise
+            if stream:
+                return self._stream(response, model, kind, budget, breaker, started, start, attempt)
+            latency = time.monotonic() - start
+            budget.release(latency)
+            breaker.record(False, latency)
+            budget.reconcile(tokens, _usage_tokens(response))
+            llm_metrics.record(kind, model, time.monotonic() - started, attempt, usage=getattr(response, "usage", None))
+            return response
+
+    async def _stream(
+        self,
+        response: Any,
+        model: str,
+        kind: str,
+        budget: ModelBudget,
+        breaker: Any,
+        started: float,
+        start: float,
+        attempt: int
+    ) -> AsyncIterator[Any]:
+        """Pass a streamed response through, holding its slot until the stream ends."""
+        try:
+            async for chunk in response:
+                yield chunk
+        except BaseException as e:
+            _release_failed(budget, breaker, e)
+            # The consumer stopping early (or being cancelled) isn't a failure
+            if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                llm_metrics.record(kind, model, time.monotonic() - started, attempt, error=type(e).__name__)
+            if hasattr(response, "close"):
+                await response.close()
+            raise
+        latency = time.monotonic() - start
+        budget.release(latency)
+        breaker.record(False, latency)
+        # Streamed responses carry no usage; the caller records tokens
+        llm_metrics.record(kind, model, time.monotonic() - started, attempt)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Current limits and usage per model."""
+        with self._lock:
+            budgets = list(self._budgets.values())
+        return {
+            budget.model: {
+                "concurrency_limit": int(budget.limit),
+                "in_flight": budget.in_flight,
+                "requests_available": int(budget.requests.level),
+                "tokens_available": int(budget.tokens.level),
+                "latency_ewma": budget.latency_ewma
+            }
+            for budget in budgets
+        }
+
+
+# Global OpenAI limiter instance
+openai_limiter = OpenAILimiter()
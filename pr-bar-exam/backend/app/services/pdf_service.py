@@ -1,13 +1,16 @@
 """
 Service for processing PDF documents and creating embeddings.
 """
-from typing import List, Dict
+from typing import List, Dict, Optional
 import PyPDF2
 import pdfplumber
 from sqlalchemy.orm import Session
 from app.models.models import StudyMaterial, DocumentChunk
 from app.core.config import settings
 from app.services.rag_service import rag_service
+from app.services.corpus_service import corpus_service
+from app.services.embedding_version_service import embedding_version_service
+from app.services.openai_limiter import BACKGROUND
 import re
 
 
@@ -90,6 +93,27 @@ class PDFProcessingService:
         
         return chunks
     
+    def _models(self, embedding_state: Dict[str, Optional[str]]) -> List[str]:
+        """Models new chunks are embedded with: the active one, plus any migration target."""
+        models = [embedding_state["model"]]
+        if embedding_state["target_model"]:
+            models.append(embedding_state["target_model"])
+        return models
+    
+    def _embed(self, texts: List[str], models: List[str]) -> Dict[str, List[List[float]]]:
+        """Embeddings of texts per model, INGEST_EMBEDDING_BATCH_SIZE texts per API call."""
+        batch_size = max(1, settings.INGEST_EMBEDDING_BATCH_SIZE)
+        return {
+            model: [
+                embedding
+                for start in range(0, len(texts), batch_size)
+                for embedding in rag_service.create_embeddings(
+                    texts[start:start + batch_size], model=model, priority=BACKGROUND
+                )
+            ]
+            for model in models
+        }
+    
     def process_pdf_and_create_embeddings(
         self,
         db: Session,
@@ -100,41 +124,52 @@ class PDFProcessingService:
         Process a PDF file and create embeddings for all chunks.
         Returns the number of chunks created.
         """
-        # Extract text from PDF
-        pages_data = self.extract_text_from_pdf(file_path)
+        material = db.query(StudyMaterial).filter(StudyMaterial.id == material_id).first()
+        if not material:
+            raise ValueError(f"Study material not found: {material_id}")
+        
+        # Extract and chunk the whole PDF
+        chunks = [
+            chunk_data
+            for page_data in self.extract_text_from_pdf(file_path)
+            for chunk_data in self.chunk_text(page_data["text"], page_data["page_number"])
+        ]
+        texts = [chunk_data["text"] for chunk_data in chunks]
         
-        total_chunks = 0
+        # Embed with the active model (plus the target one during a model
+        # migration), a batch of chunks per API call, without holding locks
+        embedding_state = embedding_version_service.get_state(db, material.subject)
+        embeddings = self._embed(texts, self._models(embedding_state))
         
-        for page_data in pages_data:
-            # Chunk the page text
-            chunks = self.chunk_text(
-                page_data["text"],
-                page_data["page_number"]
+        # Locked until commit so a slot switch can't land mid-insert; if one
+        # started or finished while embedding, embed for any new model first
+        embedding_state = embedding_version_service.get_state(db, material.subject, for_share=True)
+        missing = [model for model in self._models(embedding_state) if model not in embeddings]
+        embeddings.update(self._embed(texts, missing))
+        
+        for position, chunk_data in enumerate(chunks):
+            chunk = DocumentChunk(
+                material_id=material_id,
+                subject=material.subject.value,
+                chunk_text=chunk_data["text"],
+                chunk_index=chunk_data["chunk_index"],
+                page_number=chunk_data["page_number"],
+                **embedding_version_service.chunk_embedding_fields(
+                    embedding_state,
+                    {model: vectors[position] for model, vectors in embeddings.items()}
+                ),
+                metadata={
+                    "page": chunk_data["page_number"],
+                    "length": len(chunk_data["text"])
+                }
             )
-            
-            for chunk_data in chunks:
-                # Create embedding
-                embedding = rag_service.create_embedding(chunk_data["text"])
-                
-                # Save to database
-                chunk = DocumentChunk(
-                    material_id=material_id,
-                    chunk_text=chunk_data["text"],
-                    chunk_index=chunk_data["chunk_index"],
-                    page_number=chunk_data["page_number"],
-                    embedding=embedding,
-                    metadata={
-                        "page": chunk_data["page_number"],
-                        "length": len(chunk_data["text"])
-                    }
-                )
-                db.add(chunk)
-                total_chunks += 1
+            db.add(chunk)
+        total_chunks = len(chunks)
         
         # Mark material as processed
-        material = db.query(StudyMaterial).filter(StudyMaterial.id == material_id).first()
-        if material:
-            material.processed = True
+        material.processed = True
+        # Invalidate cached retrievals for this subject with the new chunks
+        corpus_service.bump(db, material.subject)
         
         db.commit()
         
@@ -0,0 +1,161 @@
+"""
+Precomputed retrieval context for essay prompts.
+
+An EssayPrompt is a fixed question, so the reference chunks retrieved for
+its text and rubric items are the same for every submission. They are
+retrieved once, when the prompt is created, and stored on the prompt as raw
+retrieval rows (with chunk embeddings, so grading can still apply MMR to
+the merged pool), tagged with the subject's corpus version and embedding
+model. Grading a submission then only embeds and searches the essay's
+paragraphs and merges in the stored rows (see
+BaseRAGService._grading_retrieval).
+
+Stored context goes stale when the subject's corpus version or embedding
+model changes. Routes that ingest or delete materials call
+request_refresh() after bumping the version, which recomputes the subject's
+stale contexts in a background task on its own session, so students don't
+pay for it. Bumps made elsewhere (scripts, other instances) are picked up
+lazily: stale context is recomputed on the next submission against the
+prompt, or ahead of time with scripts/refresh_prompt_context.py.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from types import SimpleNamespace
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal
+from app.models.models import EssayPrompt, SubjectEnum
+from app.services.rag_service import async_rag_service, GRADING_TOP_K
+from app.services.corpus_service import corpus_service
+from app.services.embedding_version_service import embedding_version_service
+from app.services.mmr import as_matrix
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Retrieval row columns kept (plus the chunk embedding)
+ROW_FIELDS = ("query_index", "id", "chunk_text", "page_number", "source_title", "file_type", "distance")
+
+
+def rubric_items(prompt: EssayPrompt) -> List[str]:
+    """An EssayPrompt's grading_rubric as retrieval queries (list items, or a dict's keys)."""
+    rubric = prompt.grading_rubric
+    if isinstance(rubric, dict):
+        return [str(item) for item in rubric]
+    if isinstance(rubric, list):
+        return [str(item) for item in rubric if item]
+    return []
+
+
+def _row_dict(row) -> Dict[str, Any]:
+    fields = {name: getattr(row, name) for name in ROW_FIELDS}
+    fields["embedding"] = as_matrix([row.embedding])[0].tolist()
+    return fields
+
+
+class PromptContextService:
+    """Computes, stores and refreshes essay prompts' retrieval context."""
+
+    def __init__(self):
+        self._pending: Set[Optional[SubjectEnum]] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _current(self, db: AsyncSession, subject: SubjectEnum) -> Tuple[int, str]:
+        """The (corpus version, embedding model) that stored context must match."""
+        corpus_version = await corpus_service.get_version_async(db, subject)
+        embedding = await embedding_version_service.get_state_async(db, subject)
+        return corpus_version, embedding["model"]
+
+    def _is_fresh(self, prompt: EssayPrompt, corpus_version: int, embedding_model: str) -> bool:
+        return (
+            prompt.context_rows is not None
+            and prompt.context_version == corpus_version
+            and prompt.context_model == embedding_model
+        )
+
+    async def refresh(self, db: AsyncSession, prompt: EssayPrompt) -> List[Any]:
+        """
+        Retrieve and store a prompt's context; returns the rows.
+
+        Runs in the caller's transaction. The version is read before
+        retrieving, so context computed during an ingestion is stamped with
+        the older version and refreshed again on next use.
+        """
+        corpus_version, embedding_model = await self._current(db, prompt.subject)
+        rows = await async_rag_service.retrieve_rows(
+            db,
+            async_rag_service.prompt_queries(prompt.prompt_text, rubric_items(prompt)),
+            prompt.subject,
+            top_k=GRADING_TOP_K,
+            include_embedding=True
+        )
+        prompt.context_rows = [_row_dict(row) for row in rows]
+        prompt.context_version = corpus_version
+        prompt.context_model = embedding_model
+        return rows
+
+    async def get(self, db: AsyncSession, prompt: EssayPrompt) -> List[Any]:
+        """A prompt's retrieval rows for grading, refreshed first if stale (caller commits)."""
+        corpus_version, embedding_model = await self._current(db, prompt.subject)
+        if self._is_fresh(prompt, corpus_version, embedding_model):
+            return [SimpleNamespace(**row) for row in prompt.context_rows]
+        logger.info("Refreshing stale retrieval context for essay prompt %s", prompt.id)
+        return await self.refresh(db, prompt)
+
+    async def refresh_stale(self, db: AsyncSession, subject: Optional[SubjectEnum] = None) -> int:
+        """Refresh every prompt (of a subject) whose context is stale; returns how many were."""
+        query = select(EssayPrompt).order_by(EssayPrompt.id)
+        if subject is not None:
+            query = query.where(EssayPrompt.subject == subject)
+        prompts = (await db.execute(query)).scalars().all()
+
+        current: Dict[SubjectEnum, Tuple[int, str]] = {}
+        refreshed = 0
+        for prompt in prompts:
+            if prompt.subject not in current:
+                current[prompt.subject] = await self._current(db, prompt.subject)
+            if self._is_fresh(prompt, *current[prompt.subject]):
+                continue
+            await self.refresh(db, prompt)
+            await db.commit()
+            refreshed += 1
+        return refreshed
+
+    def request_refresh(self, subject: Optional[SubjectEnum] = None) -> None:
+        """
+        Refresh a subject's (or every) stale prompt context in the background;
+        call after bumping its corpus version. Requests made while a refresh
+        is running are handled by the same task.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not in the API process; left to the lazy refresh
+            return
+        self._pending.add(subject)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._refresh_pending())
+
+    async def _refresh_pending(self) -> None:
+        while self._pending:
+            subject = self._pending.pop()
+            async with AsyncSessionLocal() as db:
+                try:
+                    refreshed = await self.refresh_stale(db, subject)
+                except Exception:
+                    logger.exception("Background prompt context refresh failed for %s", subject)
+                    continue
+            logger.info("Refreshed retrieval context for %d essay prompts (%s)", refreshed, subject or "all subjects")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global prompt context service instance
+prompt_context_service = PromptContextService()
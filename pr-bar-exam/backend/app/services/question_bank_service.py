@@ -0,0 +1,205 @@
+"""
+Precomputed MCQ question bank.
+
+A background task keeps the `questions` table stocked to
+QUESTION_BANK_TARGET_DEPTH questions per subject and difficulty, so quiz
+requests draw from the pool with one indexed query and never wait on the
+LLM. Draws prefer the least-served questions and count each serve; a
+question served QUESTION_BANK_MAX_SERVES times is retired (kept for its
+attempts, never drawn again) and no longer counts toward the pool, so the
+refill task replaces it with a fresh one. Draws that find a pool short of
+the target wake the refill task early.
+While the MCQ model's circuit is open, refills are skipped and short draws
+are topped up with the subject's questions of other difficulties.
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.models import Question, SubjectEnum, DifficultyEnum
+from app.services.rag_service import async_rag_service
+from app.services.openai_limiter import BACKGROUND
+from app.services.model_router import model_router, MCQ
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionBankService:
+    """Draws quiz questions from the bank and refills it in the background."""
+
+    def __init__(self):
+        self.target_depth = settings.QUESTION_BANK_TARGET_DEPTH
+        self.batch_size = settings.QUESTION_BANK_BATCH_SIZE
+        self.max_serves = settings.QUESTION_BANK_MAX_SERVES
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    async def _pick(self, db: AsyncSession, condition, limit: int) -> List[Question]:
+        """Up to `limit` active questions matching condition, least-served first."""
+        result = await db.execute(
+            select(Question)
+            .where(condition, Question.retired_at.is_(None))
+            .order_by(Question.served_count, func.random())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def draw(
+        self,
+        db: AsyncSession,
+        subject: SubjectEnum,
+        difficulty: DifficultyEnum,
+        num_questions: int
+    ) -> List[Question]:
+        """Questions from the bank, recorded as served (fewer than asked if it's running low)."""
+        questions = await self._pick(
+            db, (Question.subject == subject) & (Question.difficulty == difficulty), num_questions
+        )
+        if len(questions) < num_questions:
+            logger.warning(
+                "Question bank short for %s/%s: wanted %d, have %d",
+                subject.value, difficulty.value, num_questions, len(questions)
+            )
+            if not model_router.available(MCQ):
+                # Degraded: no refill is coming soon, so serve other difficulties
+                questions.extend(await self._pick(
+                    db,
+                    (Question.subject == subject) & (Question.difficulty != difficulty),
+                    num_questions - len(questions)
+                ))
+            else:
+                self.request_refill()
+        await self.mark_served(db, [question.id for question in questions])
+        return questions
+
+    async def mark_served(self, db: AsyncSession, question_ids: List[int]) -> None:
+        """Count a serve for each question, retiring those that reach max_serves."""
+        if not question_ids:
+            return
+        retiring = await db.execute(
+            update(Question)
+            .where(Question.id.in_(question_ids))
+            .values(
+                served_count=Question.served_count + 1,
+                retired_at=case(
+                    (Question.served_count + 1 >= self.max_serves, func.now()),
+                    else_=Question.retired_at
+                )
+            )
+            .returning(Question.retired_at)
+        )
+        await db.commit()
+        if any(retired_at is not None for retired_at in retiring.scalars().all()):
+            # Replace retired questions before the next scheduled pass
+            self.request_refill()
+
+    async def stock_levels(self, db: AsyncSession) -> Dict[Tuple[SubjectEnum, DifficultyEnum], int]:
+        """Active (unretired) questions in the bank per (subject, difficulty)."""
+        result = await db.execute(
+            select(Question.subject, Question.difficulty, func.count())
+            .where(Question.retired_at.is_(None))
+            .group_by(Question.subject, Question.difficulty)
+        )
+        return {(subject, difficulty): count for subject, difficulty, count in result.all()}
+
+    async def refill(self, db: AsyncSession, subject: SubjectEnum, difficulty: DifficultyEnum, missing: int) -> int:
+        """Generate up to `missing` questions for one pool; returns how many were added."""
+        # Retired texts included, so a retired question isn't regenerated
+        existing = set((await db.execute(
+            select(Question.question_text)
+            .where(Question.subject == subject, Question.difficulty == difficulty)
+        )).scalars().all())
+
+        added = 0
+        while added < missing:
+            mcqs = await async_rag_service.generate_mcqs(
+                db,
+                subject,
+                num_questions=min(self.batch_size, missing - added),
+                difficulty=difficulty.value,
+                priority=BACKGROUND
+            )
+            batch_added = 0
+            for item in mcqs:
+                fields = async_rag_service.validate_mcq(item)
+                if fields is None or fields["question_text"] in existing:
+                    continue
+                existing.add(fields["question_text"])
+                db.add(Question(subject=subject, difficulty=difficulty, **fields))
+                batch_added += 1
+            await db.commit()
+            added += batch_added
+            if batch_added == 0:
+                # Only duplicates/malformed output; try again next pass
+                break
+        return added
+
+    async def refill_all(self) -> int:
+        """Top up every (subject, difficulty) pool that is below the target depth."""
+        if not model_router.available(MCQ):
+            logger.info("Skipping question bank refill: every MCQ model's circuit is open")
+            return 0
+
+        async with AsyncSessionLocal() as db:
+            levels = await self.stock_levels(db)
+
+        total = 0
+        for subject in SubjectEnum:
+            for difficulty in DifficultyEnum:
+                missing = self.target_depth - levels.get((subject, difficulty), 0)
+                if missing <= 0:
+                    continue
+                async with AsyncSessionLocal() as db:
+                    try:
+                        added = await self.refill(db, subject, difficulty, missing)
+                    except ValueError as e:
+                        # No study materials for the subject yet, or unparseable output
+                        logger.info("Skipping %s/%s refill: %s", subject.value, difficulty.value, e)
+                        continue
+                    except Exception:
+                        logger.exception("Question bank refill failed for %s/%s", subject.value, difficulty.value)
+                        continue
+                logger.info("Question bank %s/%s: +%d questions", subject.value, difficulty.value, added)
+                total += added
+        return total
+
+    def request_refill(self) -> None:
+        """Wake the background task before its next scheduled pass."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.refill_all()
+            except Exception:
+                logger.exception("Question bank refill pass failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Start the background refill task (call from the app lifespan)."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(
+                self._run(interval or settings.QUESTION_BANK_REFILL_INTERVAL)
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global question bank service instance
+question_bank_service = QuestionBankService()
@@ -1,109 +1,405 @@
 """
 RAG (Retrieval-Augmented Generation) service using OpenAI and pgvector.
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Sequence, Tuple
 import openai
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal, vector_codec_registered
 from app.models.models import DocumentChunk, StudyMaterial, SubjectEnum
+from app.services.vector_index_service import search_settings, SET_SEARCH_SETTINGS
+from app.services.corpus_service import corpus_service
+from app.services.embedding_version_service import embedding_version_service, EMBEDDING_COLUMNS
+from app.services.retrieval_cache import retrieval_cache
+from app.services.index_health_service import retrieval_stats
+from app.services.mmr import mmr_select, as_matrix
+from app.services.context_packer import ContextPacker
+from app.services.json_stream import JSONObjectStream
+from app.services.openai_limiter import openai_limiter, INTERACTIVE
+from app.services.single_flight import single_flight, request_key
+from app.services.grade_cache_service import grade_cache_service
+from app.services.chunk_sampler import chunk_sampler
+from app.services.llm_metrics import llm_metrics
+from app.services.hedging import embedding_hedger
+from app.services.circuit_breaker import circuit_breakers, CircuitOpenError
+from app.services.model_router import model_router, GRADING, MCQ
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import aclosing
+from functools import lru_cache
+from types import SimpleNamespace
+import asyncio
+import contextvars
+import numpy as np
 import tiktoken
 import json
+import logging
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def retrieval_query(include_embedding: bool = False, column: str = "embedding"):
+    """
+    Top-k chunks for one query embedding, searched in the given embedding slot.
+
+    Chunk embeddings are only selected when a caller needs them (MMR), since
+    each one is ~1536 floats on the wire.
+    """
+    if column not in EMBEDDING_COLUMNS:
+        raise ValueError(f"Unknown embedding column: {column}")
+    # Use pgvector for similarity search
+    # Note: This requires pgvector extension to be installed in PostgreSQL
+    # Filtering on dc.subject (the partition key) prunes the scan to one
+    # subject's partition and its vector index
+    # The similarity threshold is applied in SQL (distance <= 1 - threshold)
+    # so rows below it never leave the database
+    embedding_column = f"dc.{column} as embedding," if include_embedding else ""
+    return text(f"""
+    SELECT
+        dc.id,
+        dc.chunk_text,
+        dc.page_number,
+        sm.title as source_title,
+        sm.file_type,
+        {embedding_column}
+        (dc.{column} <=> CAST(:query_embedding AS vector)) as distance
+    FROM document_chunks dc
+    JOIN study_materials sm ON dc.material_id = sm.id
+    WHERE dc.subject = :subject
+      AND (dc.{column} <=> CAST(:query_embedding AS vector)) <= :max_distance
+    ORDER BY dc.{column} <=> CAST(:query_embedding AS vector)
+    LIMIT :top_k
+""")
+
+
+@lru_cache(maxsize=128)
+def multi_retrieval_query(num_queries: int, include_embedding: bool = False, column: str = "embedding"):
+    """
+    Top-k for several query embeddings in a single statement.
+
+    Each embedding is a row of a VALUES list; a LATERAL subquery runs the
+    same index-ordered scan as retrieval_query once per row.
+    """
+    if column not in EMBEDDING_COLUMNS:
+        raise ValueError(f"Unknown embedding column: {column}")
+    embedding_column = "hit.embedding," if include_embedding else ""
+    values = ", ".join(
+        f"({i}, CAST(:query_embedding_{i} AS vector))" for i in range(num_queries)
+    )
+    return text(f"""
+    WITH q(query_index, embedding) AS (VALUES {values})
+    SELECT
+        q.query_index,
+        hit.id,
+        hit.chunk_text,
+        hit.page_number,
+        hit.source_title,
+        hit.file_type,
+        {embedding_column}
+        hit.distance
+    FROM q
+    CROSS JOIN LATERAL (
+        SELECT
+            dc.id,
+            dc.chunk_text,
+            dc.page_number,
+            sm.title as source_title,
+            sm.file_type,
+            dc.{column} as embedding,
+            (dc.{column} <=> q.embedding) as distance
+        FROM document_chunks dc
+        JOIN study_materials sm ON dc.material_id = sm.id
+        WHERE dc.subject = :subject
+          AND (dc.{column} <=> q.embedding) <= :max_distance
+        ORDER BY dc.{column} <=> q.embedding
+        LIMIT :top_k
+    ) hit
+""")
+
+
+# Cap on retrieval queries per essay (prompt + paragraphs + rubric items)
+MAX_GRADING_QUERIES = 12
+# Chunks retrieved per grading query, and kept after merging
+GRADING_TOP_K = 3
+GRADING_MAX_CHUNKS = 12
+
+MCQ_SYSTEM_PROMPT = "You are a Puerto Rico law professor creating bar exam practice questions."
+
+GRADING_SYSTEM_PROMPT = "You are a strict Puerto Rico bar exam grader. You ONLY use provided reference materials for grading. Never use external knowledge."
+
+
+class BaseRAGService:
+    """Prompt building and response parsing shared by the sync and async services."""
 
-class RAGService:
-    """Service for RAG operations including embeddings and retrieval."""
-    
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL
         self.embedding_model = settings.OPENAI_EMBEDDING_MODEL
         self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    
-    def create_embedding(self, text: str) -> List[float]:
-        """Create embedding for a piece of text."""
-        response = self.client.embeddings.create(
-            model=self.embedding_model,
-            input=text
+        self.context_packer = ContextPacker(self.encoding)
+
+    def _pack_grading_context(self, relevant_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pack ranked reference chunks into GRADING_CONTEXT_TOKENS."""
+        packed = self.context_packer.pack(
+            relevant_chunks,
+            settings.GRADING_CONTEXT_TOKENS,
+            format_chunk=lambda chunk, text: (
+                f"SOURCE: {chunk['source']} (Page {chunk.get('page_number', 'N/A')})\n{text}"
+            ),
+            separator="\n\n---\n\n"
         )
-        return response.data[0].embedding
-    
-    def retrieve_relevant_chunks(
+        logger.info(
+            "Grading context: %d/%d chunks, %d/%d tokens",
+            len(packed["chunks"]), packed["candidate_chunks"], packed["token_count"], packed["budget"]
+        )
+        return packed
+
+    def _pack_mcq_context(self, chunk_texts: List[str]) -> Dict[str, Any]:
+        """Pack study material chunks into MCQ_CONTEXT_TOKENS."""
+        packed = self.context_packer.pack(
+            [{"text": chunk_text} for chunk_text in chunk_texts],
+            settings.MCQ_CONTEXT_TOKENS
+        )
+        logger.info(
+            "MCQ context: %d/%d chunks, %d/%d tokens",
+            len(packed["chunks"]), packed["candidate_chunks"], packed["token_count"], packed["budget"]
+        )
+        return packed
+
+    def _estimate_chat_tokens(self, request: Dict[str, Any]) -> int:
+        """Prompt tokens plus the completion allowance, charged to the model's TPM budget."""
+        prompt_tokens = sum(len(self.encoding.encode(m["content"])) for m in request["messages"])
+        return prompt_tokens + request.get("max_tokens", 0)
+
+    def _estimate_embedding_tokens(self, request: Dict[str, Any]) -> int:
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        return sum(len(self.encoding.encode(text)) for text in texts)
+
+    def _embedding_kwargs(self, model: str) -> Dict[str, Any]:
+        """Pin text-embedding-3 output to the stored vector size (other models are fixed-size)."""
+        if model.startswith("text-embedding-3"):
+            return {"dimensions": settings.EMBEDDING_DIMENSIONS}
+        return {}
+
+    def _vector_param(self, embedding: List[float]) -> Any:
+        """Bind value for a vector parameter (pgvector text form)."""
+        return str(embedding)
+
+    def _retrieval_params(
         self,
-        db: Session,
+        query_embedding: List[float],
+        subject: SubjectEnum,
+        top_k: int,
+        similarity_threshold: float
+    ) -> Dict[str, Any]:
+        """Bind parameters for retrieval_query."""
+        return {
+            "query_embedding": self._vector_param(query_embedding),
+            "subject": subject.value,
+            "max_distance": 1 - similarity_threshold,
+            "top_k": top_k
+        }
+
+    def _cache_key(
+        self,
+        corpus_version: int,
         query: str,
         subject: SubjectEnum,
-        top_k: int = 5,
-        similarity_threshold: float = 0.7
-    ) -> List[Dict[str, Any]]:
+        top_k: int,
+        similarity_threshold: float,
+        ef_search: Optional[int],
+        probes: Optional[int],
+        mmr_lambda: Optional[float] = None,
+        fetch_k: Optional[int] = None,
+        embedding_model: Optional[str] = None
+    ):
+        """Retrieval cache key; includes everything that changes the result."""
+        return retrieval_cache.make_key(
+            subject.value,
+            corpus_version,
+            query,
+            embedding_model=embedding_model or self.embedding_model,
+            top_k=top_k,
+            similarity_threshold=similarity_threshold,
+            ef_search=ef_search,
+            probes=probes,
+            mmr_lambda=mmr_lambda,
+            fetch_k=fetch_k
+        )
+
+    def _multi_retrieval_params(
+        self,
+        query_embeddings: List[List[float]],
+        subject: SubjectEnum,
+        top_k: int,
+        similarity_threshold: float
+    ) -> Dict[str, Any]:
+        """Bind parameters for multi_retrieval_query."""
+        params = {
+            "subject": subject.value,
+            "max_distance": 1 - similarity_threshold,
+            "top_k": top_k
+        }
+        for i, embedding in enumerate(query_embeddings):
+            params[f"query_embedding_{i}"] = self._vector_param(embedding)
+        return params
+
+    def _record_distances(self, subject: SubjectEnum, rows) -> None:
+        """Feed retrieval distances to the index health stats, one entry per query."""
+        per_query = defaultdict(list)
+        for row in rows:
+            per_query[getattr(row, "query_index", 0)].append(row.distance)
+        for distances in per_query.values():
+            retrieval_stats.record(subject.value, distances)
+
+    def _merge_chunk_rows(self, rows) -> List[Dict[str, Any]]:
         """
-        Retrieve most relevant document chunks for a query using vector similarity.
+        Merge per-query retrieval rows, keeping one entry per chunk.
+
+        A chunk hit by several queries keeps its best similarity and records
+        every query index that matched it.
         """
-        # Create query embedding
-        query_embedding = self.create_embedding(query)
-        
-        # Use pgvector for similarity search
-        # Note: This requires pgvector extension to be installed in PostgreSQL
-        query_text = text("""
-            SELECT 
-                dc.id,
-                dc.chunk_text,
-                dc.page_number,
-                sm.title as source_title,
-                sm.file_type,
-                (dc.embedding <=> :query_embedding::vector) as distance
-            FROM document_chunks dc
-            JOIN study_materials sm ON dc.material_id = sm.id
-            WHERE sm.subject = :subject
-            ORDER BY dc.embedding <=> :query_embedding::vector
-            LIMIT :top_k
-        """)
-        
-        results = db.execute(
-            query_text,
-            {
-                "query_embedding": str(query_embedding),
-                "subject": subject.value,
-                "top_k": top_k
-            }
-        ).fetchall()
-        
-        # Filter by similarity threshold (distance < threshold means high similarity)
-        filtered_results = []
-        for row in results:
-            similarity = 1 - row.distance  # Convert distance to similarity
-            if similarity >= similarity_threshold:
-                filtered_results.append({
+        merged: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            similarity = 1 - row.distance
+            chunk = merged.get(row.id)
+            if chunk is None:
+                merged[row.id] = {
+                    "chunk_id": row.id,
                     "text": row.chunk_text,
                     "source": row.source_title,
                     "page_number": row.page_number,
-                    "similarity_score": similarity
-                })
-        
-        return filtered_results
-    
-    def generate_mcqs(
+                    "similarity_score": similarity,
+                    "query_indices": [row.query_index]
+                }
+            else:
+                chunk["similarity_score"] = max(chunk["similarity_score"], similarity)
+                chunk["query_indices"].append(row.query_index)
+        return sorted(merged.values(), key=lambda c: c["similarity_score"], reverse=True)
+
+    def _with_extra_rows(self, rows, extra_rows, num_queries: int) -> List[Any]:
+        """
+        extra_rows followed by rows, the extra rows' query_index shifted past
+        the num_queries just searched: they were retrieved for other queries
+        (e.g. an essay prompt's, numbered from 0 when precomputed).
+        """
+        shifted = [
+            SimpleNamespace(**{
+                **(row._asdict() if hasattr(row, "_asdict") else vars(row)),
+                "query_index": row.query_index + num_queries
+            })
+            for row in extra_rows
+        ]
+        return shifted + list(rows)
+
+    def _select_merged(
         self,
-        db: Session,
-        subject: SubjectEnum,
-        num_questions: int = 10,
-        difficulty: str = "medium"
+        rows,
+        mmr_lambda: Optional[float],
+        max_results: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Merge multi-query rows, then cut to max_results (by MMR if requested)."""
+        chunks = self._merge_chunk_rows(rows)
+        k = max_results or len(chunks)
+        if mmr_lambda is None:
+            return chunks[:k]
+        embeddings_by_id = {row.id: row.embedding for row in rows}
+        return self._diversify(
+            chunks, [embeddings_by_id[chunk["chunk_id"]] for chunk in chunks], k, mmr_lambda
+        )
+
+    def _diversify(
+        self,
+        chunks: List[Dict[str, Any]],
+        embeddings: List[Any],
+        k: int,
+        mmr_lambda: float
     ) -> List[Dict[str, Any]]:
+        """Reduce candidate chunks to k by maximal marginal relevance."""
+        if len(chunks) <= k:
+            return chunks
+        selected = mmr_select(
+            [chunk["similarity_score"] for chunk in chunks],
+            as_matrix(embeddings),
+            k,
+            mmr_lambda
+        )
+        return [chunks[i] for i in selected]
+
+    def _fetch_k(self, top_k: int, mmr_lambda: Optional[float], fetch_k: Optional[int]) -> int:
+        """Candidates to fetch: over-fetch for MMR, exactly top_k otherwise."""
+        if mmr_lambda is None:
+            return top_k
+        return max(top_k, fetch_k or top_k * settings.MMR_FETCH_MULTIPLIER)
+
+    def _grading_queries(
+        self,
+        essay_content: str,
+        prompt: str,
+        rubric_items: Optional[List[str]] = None
+    ) -> List[str]:
+        """Retrieval queries for grading: the prompt, each essay paragraph and rubric items."""
+        paragraphs = [p.strip() for p in essay_content.split("\n") if p.strip()]
+        queries = [prompt] + paragraphs + list(rubric_items or [])
+        return queries[:MAX_GRADING_QUERIES]
+
+    def prompt_queries(self, prompt: str, rubric_items: Optional[List[str]] = None) -> List[str]:
+        """The grading queries that don't depend on the essay (precomputed per EssayPrompt)."""
+        return ([prompt] + list(rubric_items or []))[:MAX_GRADING_QUERIES]
+
+    def _essay_queries(self, essay_content: str, prompt: str, rubric_items: Optional[List[str]]) -> List[str]:
+        """Grading queries for the essay's paragraphs, when the prompt's are precomputed."""
+        paragraphs = [p.strip() for p in essay_content.split("\n") if p.strip()]
+        return paragraphs[:max(0, MAX_GRADING_QUERIES - len(self.prompt_queries(prompt, rubric_items)))]
+
+    def _grading_retrieval(
+        self,
+        essay_content: str,
+        prompt: str,
+        rubric_items: Optional[List[str]],
+        prompt_rows: Optional[Sequence[Any]]
+    ) -> Dict[str, Any]:
         """
-        Generate MCQs from study materials using OpenAI.
+        retrieve_many arguments for grading. With an essay prompt's
+        precomputed rows (see prompt_context_service), only the essay's
+        paragraphs are embedded and searched; the prompt's rows are merged in.
         """
-        # Get representative chunks from the subject
-        all_chunks = db.query(DocumentChunk).join(StudyMaterial).filter(
-            StudyMaterial.subject == subject
-        ).limit(20).all()
-        
-        if not all_chunks:
-            raise ValueError(f"No study materials found for subject: {subject.value}")
-        
-        # Combine chunks for context
-        context = "\n\n".join([chunk.chunk_text for chunk in all_chunks[:10]])
-        
-        prompt = f"""You are an expert in Puerto Rico law, specifically in {subject.value}.
+        if prompt_rows is None:
+            queries = self._grading_queries(essay_content, prompt, rubric_items)
+        else:
+            queries = self._essay_queries(essay_content, prompt, rubric_items)
+        return {
+            "queries": queries,
+            "top_k": GRADING_TOP_K,
+            "mmr_lambda": settings.MMR_LAMBDA,
+            "max_results": GRADING_MAX_CHUNKS,
+            "extra_rows": prompt_rows or ()
+        }
+
+    def _format_chunk_rows(self, rows) -> List[Dict[str, Any]]:
+        """Convert retrieval rows into chunk dicts."""
+        return [
+            {
+                "chunk_id": row.id,
+                "text": row.chunk_text,
+                "source": row.source_title,
+                "page_number": row.page_number,
+                "similarity_score": 1 - row.distance  # Convert distance to similarity
+            }
+            for row in rows
+        ]
+
+    def _build_mcq_prompt(
+        self,
+        subject: SubjectEnum,
+        num_questions: int,
+        difficulty: str,
+        context: str
+    ) -> str:
+        """Build the user prompt for MCQ generation."""
+        return f"""You are an expert in Puerto Rico law, specifically in {subject.value}.
 
 Based on the following legal content, generate {num_questions} multiple-choice questions at {difficulty} difficulty level.
 
@@ -133,59 +429,15 @@ REQUIRED JSON FORMAT:
 ]
 
 Generate the questions now:"""
-        
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are a Puerto Rico law professor creating bar exam practice questions."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
-        
-        try:
-            questions = json.loads(response.choices[0].message.content)
-            return questions
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from the response
-            content = response.choices[0].message.content
-            # Try to find JSON array in the response
-            start = content.find('[')
-            end = content.rfind(']') + 1
-            if start != -1 and end != 0:
-                questions = json.loads(content[start:end])
-                return questions
-            raise ValueError("Failed to parse MCQ response from OpenAI")
-    
-    def grade_essay(
+
+    def _build_grading_prompt(
         self,
-        db: Session,
         essay_content: str,
-        subject: SubjectEnum,
-        prompt: str
-    ) -> Dict[str, Any]:
-        """
-        Grade an essay using RAG to ensure grading is based on provided legal materials.
-        """
-        # Retrieve relevant legal sources
-        relevant_chunks = self.retrieve_relevant_chunks(
-            db=db,
-            query=prompt + " " + essay_content,
-            subject=subject,
-            top_k=8
-        )
-        
-        if not relevant_chunks:
-            raise ValueError(f"No reference materials found for subject: {subject.value}")
-        
-        # Prepare context from retrieved chunks
-        legal_context = "\n\n---\n\n".join([
-            f"SOURCE: {chunk['source']} (Page {chunk.get('page_number', 'N/A')})\n{chunk['text']}"
-            for chunk in relevant_chunks
-        ])
-        
-        grading_prompt = f"""You are a Puerto Rico bar exam grader. Grade this essay STRICTLY based on the provided legal materials.
+        prompt: str,
+        legal_context: str
+    ) -> str:
+        """Build the user prompt for essay grading."""
+        return f"""You are a Puerto Rico bar exam grader. Grade this essay STRICTLY based on the provided legal materials.
 
 PROMPT:
 {prompt}
@@ -225,33 +477,1055 @@ FORMAT YOUR RESPONSE AS JSON:
 }}
 
 Grade the essay now:"""
-        
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a strict Puerto Rico bar exam grader. You ONLY use provided reference materials for grading. Never use external knowledge."
-                },
-                {"role": "user", "content": grading_prompt}
-            ],
-            temperature=0.3,  # Lower temperature for consistent grading
-            max_tokens=2000
-        )
-        
+
+    def _mcq_batches(self, num_questions: int) -> List[int]:
+        """Split a question count into per-request sizes of at most MCQ_QUESTIONS_PER_REQUEST."""
+        size = settings.MCQ_QUESTIONS_PER_REQUEST
+        return [min(size, num_questions - start) for start in range(0, num_questions, size)]
+
+    def _chunk_subsets(self, chunk_texts: List[str], num_subsets: int) -> List[List[str]]:
+        """
+        One chunk subset per generation request, so each request sees
+        different material. Subsets are disjoint when there are enough chunks
+        and overlap (wrapping around) when there aren't.
+        """
+        per_subset = min(settings.MCQ_CHUNKS_PER_REQUEST, len(chunk_texts))
+        step = max(1, len(chunk_texts) // num_subsets)
+        return [
+            [chunk_texts[(i * step + j) % len(chunk_texts)] for j in range(per_subset)]
+            for i in range(num_subsets)
+        ]
+
+    def _mcq_request(
+        self,
+        subject: SubjectEnum,
+        num_questions: int,
+        difficulty: str,
+        chunk_texts: List[str],
+        model: str
+    ) -> Dict[str, Any]:
+        """Chat completion arguments for one MCQ generation request."""
+        context = self._pack_mcq_context(chunk_texts)
+        return {
+            "model": model,
+            "messages": self._mcq_messages(
+                self._build_mcq_prompt(subject, num_questions, difficulty, context["text"])
+            ),
+            "temperature": 0.7,
+            "max_tokens": num_questions * settings.MCQ_TOKENS_PER_QUESTION
+        }
+
+    def _grading_model(self, essay_content: str, prompt: str) -> str:
+        """Model to grade this essay with, routed on its size (see model_router)."""
+        return model_router.route(GRADING, input_tokens=len(self.encoding.encode(prompt + essay_content)))
+
+    def _merge_mcqs(self, questions: List[Dict[str, Any]], seen: set, batch: List[Any]) -> None:
+        """Append a batch's valid, not-yet-seen questions to `questions`."""
+        for item in batch:
+            fields = self.validate_mcq(item)
+            if fields is None or fields["question_text"] in seen:
+                continue
+            seen.add(fields["question_text"])
+            questions.append(item)
+
+    def _mcq_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": MCQ_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _grading_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": GRADING_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _parse_mcq_response(self, content: str) -> List[Dict[str, Any]]:
+        """Parse the MCQ JSON array out of a completion."""
         try:
-            grade_data = json.loads(response.choices[0].message.content)
-            return grade_data
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # Try to find JSON array in the response
+            start = content.find('[')
+            end = content.rfind(']') + 1
+            if start != -1 and end != 0:
+                return json.loads(content[start:end])
+            raise ValueError("Failed to parse MCQ response from OpenAI")
+
+    def validate_mcq(self, item: Any) -> Optional[Dict[str, Any]]:
+        """
+        Normalize one generated MCQ, or None if it's malformed.
+
+        Returns question_text, option_a..option_d, correct_answer,
+        explanation and model (the Question column names).
+        """
+        if not isinstance(item, dict):
+            return None
+        options = item.get("options")
+        question_text = str(item.get("question") or "").strip()
+        correct_answer = str(item.get("correct_answer") or "").strip().upper()[:1]
+        if not question_text or not isinstance(options, dict) or correct_answer not in ("A", "B", "C", "D"):
+            return None
+        option_texts = {label: str(options.get(label) or "").strip() for label in "ABCD"}
+        if not all(option_texts.values()):
+            return None
+        return {
+            "question_text": question_text,
+            "option_a": option_texts["A"],
+            "option_b": option_texts["B"],
+            "option_c": option_texts["C"],
+            "option_d": option_texts["D"],
+            "correct_answer": correct_answer,
+            "explanation": str(item.get("explanation") or "").strip() or None,
+            "model": item.get("model")
+        }
+
+    def _parse_grading_response(self, content: str) -> Dict[str, Any]:
+        """Parse the grade JSON object out of a completion."""
+        try:
+            return json.loads(content)
         except json.JSONDecodeError:
             # Try to extract JSON
-            content = response.choices[0].message.content
             start = content.find('{')
             end = content.rfind('}') + 1
             if start != -1 and end != 0:
-                grade_data = json.loads(content[start:end])
-                return grade_data
+                return json.loads(content[start:end])
             raise ValueError("Failed to parse grading response from OpenAI")
 
 
-# Global RAG service instance
+class RAGService(BaseRAGService):
+    """Service for RAG operations including embeddings and retrieval."""
+
+    def __init__(self):
+        super().__init__()
+        # Retries are handled by openai_limiter
+        self.client = openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT,
+            max_retries=0
+        )
+
+    def _chat_completion(self, priority: str = INTERACTIVE, **request) -> Any:
+        """chat.completions.create under the shared rate limiter."""
+        return openai_limiter.call(
+            request["model"],
+            self._estimate_chat_tokens(request),
+            lambda: self.client.chat.completions.create(**request),
+            priority
+        )
+
+    def _embeddings(self, priority: str = INTERACTIVE, **request) -> Any:
+        """embeddings.create under the shared rate limiter; interactive calls are hedged."""
+        tokens = self._estimate_embedding_tokens(request)
+        call = lambda: openai_limiter.call(
+            request["model"],
+            tokens,
+            lambda: self.client.embeddings.create(**request),
+            priority,
+            kind="embedding"
+        )
+        return embedding_hedger.call(call) if priority == INTERACTIVE else call()
+
+    def create_embedding(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        priority: str = INTERACTIVE
+    ) -> List[float]:
+        """Create embedding for a piece of text (default model unless given)."""
+        model = model or self.embedding_model
+
+        def create():
+            response = self._embeddings(
+                model=model,
+                input=text,
+                priority=priority,
+                **self._embedding_kwargs(model)
+            )
+            return response.data[0].embedding
+
+        # Identical concurrent requests share one call (priority is not part of the key)
+        return single_flight.do(request_key("embedding", model=model, input=text), create)
+
+    def create_embeddings(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        priority: str = INTERACTIVE
+    ) -> List[List[float]]:
+        """Create embeddings for several texts in one API call."""
+        model = model or self.embedding_model
+
+        def create():
+            response = self._embeddings(
+                model=model,
+                input=texts,
+                priority=priority,
+                **self._embedding_kwargs(model)
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+        # Identical concurrent requests share one call (priority is not part of the key)
+        return single_flight.do(request_key("embeddings", model=model, input=texts), create)
+
+    def retrieve_relevant_chunks(
+        self,
+        db: Session,
+        query: str,
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        use_cache: bool = True,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve most relevant document chunks for a query using vector similarity.
+
+        ef_search (HNSW) and probes (ivfflat) trade latency for recall on a
+        per-request basis; they default to HNSW_EF_SEARCH / IVFFLAT_PROBES.
+        Results are cached until the subject's corpus version changes.
+
+        When mmr_lambda is given, fetch_k candidates (default
+        top_k * MMR_FETCH_MULTIPLIER) are over-fetched and reduced to top_k by
+        maximal marginal relevance, dropping near-duplicate overlapping chunks.
+
+        The query is embedded with the subject's active embedding model and
+        searched in the matching slot (see embedding_version_service).
+        """
+        embedding = embedding_version_service.get_state(db, subject)
+
+        if use_cache:
+            cache_key = self._cache_key(
+                corpus_service.get_version(db, subject), query, subject,
+                top_k, similarity_threshold, ef_search, probes, mmr_lambda, fetch_k,
+                embedding_model=embedding["model"]
+            )
+            cached = retrieval_cache.get(cache_key)
+            llm_metrics.record_cache("retrieval", cached is not None)
+            if cached is not None:
+                return cached
+
+        def retrieve() -> List[Dict[str, Any]]:
+            # Create query embedding
+            query_embedding = self.create_embedding(query, model=embedding["model"])
+
+            # Apply per-request index search effort (transaction-local)
+            db.execute(SET_SEARCH_SETTINGS, search_settings(ef_search, probes))
+
+            results = db.execute(
+                retrieval_query(include_embedding=mmr_lambda is not None, column=embedding["column"]),
+                self._retrieval_params(
+                    query_embedding, subject, self._fetch_k(top_k, mmr_lambda, fetch_k), similarity_threshold
+                )
+            ).fetchall()
+            self._record_distances(subject, results)
+
+            chunks = self._format_chunk_rows(results)
+            if mmr_lambda is not None:
+                chunks = self._diversify(chunks, [row.embedding for row in results], top_k, mmr_lambda)
+            if use_cache:
+                retrieval_cache.set(cache_key, chunks)
+            return chunks
+
+        # Concurrent identical queries (a class on the same prompt) share one embedding + search
+        return single_flight.do(
+            request_key(
+                "retrieval", subject=subject.value, query=query, model=embedding["model"],
+                top_k=top_k, similarity_threshold=similarity_threshold, ef_search=ef_search,
+                probes=probes, mmr_lambda=mmr_lambda, fetch_k=fetch_k, use_cache=use_cache
+            ),
+            retrieve
+        )
+
+    def retrieve_rows(
+        self,
+        db: Session,
+        queries: List[str],
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        include_embedding: bool = False
+    ) -> List[Any]:
+        """
+        Raw top-k rows for several queries (one embedding call, one SQL
+        round trip), each tagged with its query_index.
+        """
+        if not queries:
+            return []
+
+        embedding = embedding_version_service.get_state(db, subject)
+        query_embeddings = self.create_embeddings(queries, model=embedding["model"])
+
+        db.execute(SET_SEARCH_SETTINGS, search_settings(ef_search, probes))
+
+        results = db.execute(
+            multi_retrieval_query(
+                len(queries), include_embedding=include_embedding, column=embedding["column"]
+            ),
+            self._multi_retrieval_params(query_embeddings, subject, top_k, similarity_threshold)
+        ).fetchall()
+        self._record_distances(subject, results)
+        return results
+
+    def retrieve_many(
+        self,
+        db: Session,
+        queries: List[str],
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        max_results: Optional[int] = None,
+        extra_rows: Sequence[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve top-k chunks for several queries in one embedding call and
+        one SQL round trip. Results are merged and deduplicated per chunk,
+        ordered by best similarity.
+
+        With mmr_lambda, the merged pool is reduced to max_results by maximal
+        marginal relevance instead of by similarity alone. extra_rows are
+        previously retrieved rows (with embeddings) merged into the pool,
+        e.g. an essay prompt's precomputed context.
+        """
+        rows = self.retrieve_rows(
+            db, queries, subject, top_k, similarity_threshold, ef_search, probes,
+            include_embedding=mmr_lambda is not None
+        )
+        return self._select_merged(self._with_extra_rows(rows, extra_rows, len(queries)), mmr_lambda, max_results)
+
+    def generate_mcqs(
+        self,
+        db: Session,
+        subject: SubjectEnum,
+        num_questions: int = 10,
+        difficulty: str = "medium",
+        priority: str = INTERACTIVE
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate MCQs from study materials using OpenAI.
+
+        The model is routed on difficulty (see model_router) and recorded
+        on each question. Concurrent identical requests (same model,
+        subject, count and difficulty) share one generation; see
+        _generate_mcqs.
+        """
+        model = model_router.route(MCQ, difficulty=difficulty)
+        return single_flight.do(
+            request_key(
+                "mcqs", model=model, subject=subject.value,
+                num_questions=num_questions, difficulty=difficulty
+            ),
+            lambda: self._generate_mcqs(db, subject, num_questions, difficulty, priority, model)
+        )
+
+    def _generate_mcqs(
+        self,
+        db: Session,
+        subject: SubjectEnum,
+        num_questions: int = 10,
+        difficulty: str = "medium",
+        priority: str = INTERACTIVE,
+        model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate MCQs from study materials using OpenAI.
+
+        The questions are split into requests of MCQ_QUESTIONS_PER_REQUEST,
+        each seeded with a different chunk subset, and run in parallel (at
+        most MCQ_MAX_CONCURRENCY at a time). Results are validated and
+        deduplicated as they arrive.
+        """
+        model = model or self.model
+        batches = self._mcq_batches(num_questions)
+
+        # Sample chunks evenly across the subject's materials and pages,
+        # enough for a distinct subset per request
+        chunk_texts = chunk_sampler.sample(db, subject, len(batches) * settings.MCQ_CHUNKS_PER_REQUEST)
+
+        if not chunk_texts:
+            raise ValueError(f"No study materials found for subject: {subject.value}")
+
+        subsets = self._chunk_subsets(chunk_texts, len(batches))
+
+        def generate_batch(size: int, chunk_texts: List[str]) -> List[Dict[str, Any]]:
+            response = self._chat_completion(
+                priority=priority, **self._mcq_request(subject, size, difficulty, chunk_texts, model)
+            )
+            return self._parse_mcq_response(response.choices[0].message.content)
+
+        questions, seen = [], set()
+        # Not a `with` block: its exit waits for every running request, even
+        # after enough questions have arrived
+        executor = ThreadPoolExecutor(max_workers=settings.MCQ_MAX_CONCURRENCY)
+        try:
+            # Each worker runs in a copy of this context so its calls keep the request's usage tags
+            futures = [
+                executor.submit(contextvars.copy_context().run, generate_batch, size, subset)
+                for size, subset in zip(batches, subsets)
+            ]
+            for future in as_completed(futures):
+                try:
+                    self._merge_mcqs(questions, seen, future.result())
+                except Exception as e:
+                    logger.warning("MCQ generation request failed: %s", e)
+                if len(questions) >= num_questions:
+                    break
+        finally:
+            # Queued batches are dropped; running ones finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if not questions:
+            raise ValueError("Failed to parse MCQ response from OpenAI")
+        return [dict(question, model=model) for question in questions[:num_questions]]
+
+    def grade_essay(
+        self,
+        db: Session,
+        essay_content: str,
+        subject: SubjectEnum,
+        prompt: str,
+        rubric_items: Optional[List[str]] = None,
+        use_cache: bool = True,
+        prompt_rows: Optional[Sequence[Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Grade an essay using RAG to ensure grading is based on provided legal materials.
+
+        Identical resubmissions are served from the grade cache until the
+        subject's corpus version or the routed grading model changes. While
+        that model's circuit is open, a cached grade from another model is
+        served instead, if there is one. The grade records the model that
+        produced it ("model"). prompt_rows is the essay prompt's precomputed
+        retrieval context, if grading against an EssayPrompt.
+        """
+        model = self._grading_model(essay_content, prompt)
+        use_cache = use_cache and settings.GRADE_CACHE_ENABLED
+        if use_cache:
+            corpus_version = corpus_service.get_version(db, subject)
+            cache_key = grade_cache_service.make_key(
+                essay_content, prompt, subject, corpus_version, model, rubric_items
+            )
+            fallback_key = grade_cache_service.make_fallback_key(
+                essay_content, prompt, subject, corpus_version, rubric_items
+            )
+            cached = grade_cache_service.get(db, cache_key)
+            llm_metrics.record_cache("grade", cached is not None)
+            if cached is not None:
+                return cached
+
+        try:
+            # Fail fast (before retrieval) while the grading model's circuit is open
+            circuit_breakers.get(model).ensure_closed()
+
+            # Retrieve relevant legal sources for the prompt, each paragraph and rubric item
+            # (the prompt's and rubric's may be precomputed)
+            relevant_chunks = self.retrieve_many(
+                db=db,
+                subject=subject,
+                **self._grading_retrieval(essay_content, prompt, rubric_items, prompt_rows)
+            )
+
+            if not relevant_chunks:
+                raise ValueError(f"No reference materials found for subject: {subject.value}")
+
+            legal_context = self._pack_grading_context(relevant_chunks)
+
+            response = self._chat_completion(
+                model=model,
+                messages=self._grading_messages(
+                    self._build_grading_prompt(essay_content, prompt, legal_context["text"])
+                ),
+                temperature=0.3,  # Lower temperature for consistent grading
+                max_tokens=2000
+            )
+        except CircuitOpenError:
+            fallback = grade_cache_service.get_fallback(db, fallback_key) if use_cache else None
+            llm_metrics.record_cache("grade_fallback", fallback is not None)
+            if fallback is None:
+                raise
+            return fallback
+
+        grade = self._parse_grading_response(response.choices[0].message.content)
+        grade["model"] = model
+        if use_cache:
+            grade_cache_service.set(db, cache_key, fallback_key, subject, model, corpus_version, grade)
+        return grade
+
+
+class AsyncRAGService(BaseRAGService):
+    """
+    Non-blocking RAG service for use from async endpoints.
+
+    Uses AsyncOpenAI and AsyncSession (see core.database.AsyncSessionLocal)
+    so embedding and completion calls don't stall the event loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Retries are handled by openai_limiter
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT,
+            max_retries=0
+        )
+
+    async def _chat_completion(self, priority: str = INTERACTIVE, **request) -> Any:
+        """chat.completions.create under the shared rate limiter (held to the end of a stream)."""
+        return await openai_limiter.call_async(
+            request["model"],
+            self._estimate_chat_tokens(request),
+            lambda: self.client.chat.completions.create(**request),
+            priority,
+            stream=request.get("stream", False)
+        )
+
+    async def _embeddings(self, priority: str = INTERACTIVE, **request) -> Any:
+        """embeddings.create under the shared rate limiter; interactive calls are hedged."""
+        tokens = self._estimate_embedding_tokens(request)
+        call = lambda: openai_limiter.call_async(
+            request["model"],
+            tokens,
+            lambda: self.client.embeddings.create(**request),
+            priority,
+            kind="embedding"
+        )
+        return await (embedding_hedger.call_async(call) if priority == INTERACTIVE else call())
+
+    def _vector_param(self, embedding: List[float]) -> Any:
+        """
+        Bind value for a vector parameter.
+
+        With pgvector's binary codec registered on the asyncpg connections
+        (core.database), vectors go over the wire as packed float32 instead
+        of a ~20KB decimal string Postgres has to parse on every call.
+        """
+        if vector_codec_registered():
+            return np.asarray(embedding, dtype=np.float32)
+        return super()._vector_param(embedding)
+
+    async def create_embedding(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        priority: str = INTERACTIVE
+    ) -> List[float]:
+        """Create embedding for a piece of text (default model unless given)."""
+        model = model or self.embedding_model
+
+        async def create():
+            response = await self._embeddings(
+                model=model,
+                input=text,
+                priority=priority,
+                **self._embedding_kwargs(model)
+            )
+            return response.data[0].embedding
+
+        # Identical concurrent requests share one call (priority is not part of the key)
+        return await single_flight.do_async(request_key("embedding", model=model, input=text), create)
+
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        priority: str = INTERACTIVE
+    ) -> List[List[float]]:
+        """Create embeddings for several texts in one API call."""
+        model = model or self.embedding_model
+
+        async def create():
+            response = await self._embeddings(
+                model=model,
+                input=texts,
+                priority=priority,
+                **self._embedding_kwargs(model)
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+        # Identical concurrent requests share one call (priority is not part of the key)
+        return await single_flight.do_async(request_key("embeddings", model=model, input=texts), create)
+
+    async def retrieve_relevant_chunks(
+        self,
+        db: AsyncSession,
+        query: str,
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        use_cache: bool = True,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve most relevant document chunks for a query using vector similarity.
+        Results are cached until the subject's corpus version changes.
+        mmr_lambda/fetch_k enable MMR diversification as in RAGService.
+        """
+        embedding = await embedding_version_service.get_state_async(db, subject)
+
+        cache_key = None
+        if use_cache:
+            cache_key = self._cache_key(
+                await corpus_service.get_version_async(db, subject), query, subject,
+                top_k, similarity_threshold, ef_search, probes, mmr_lambda, fetch_k,
+                embedding_model=embedding["model"]
+            )
+            cached = retrieval_cache.get(cache_key)
+            llm_metrics.record_cache("retrieval", cached is not None)
+            if cached is not None:
+                return cached
+
+        return await self._retrieve_shared(
+            query, subject, embedding, cache_key, top_k, similarity_threshold,
+            ef_search, probes, mmr_lambda, fetch_k
+        )
+
+    async def _retrieve_shared(
+        self,
+        query: str,
+        subject: SubjectEnum,
+        embedding: Dict[str, Optional[str]],
+        cache_key: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        fetch_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Embed and search one query after a cache miss, caching the result
+        under cache_key (unless None).
+
+        Concurrent identical queries (a class on the same prompt) share one
+        hedged embedding call and search, run on a session of their own.
+        """
+        async def retrieve(db: AsyncSession) -> List[Dict[str, Any]]:
+            query_embedding = await self.create_embedding(query, model=embedding["model"])
+
+            await db.execute(SET_SEARCH_SETTINGS, search_settings(ef_search, probes))
+
+            result = await db.execute(
+                retrieval_query(include_embedding=mmr_lambda is not None, column=embedding["column"]),
+                self._retrieval_params(
+                    query_embedding, subject, self._fetch_k(top_k, mmr_lambda, fetch_k), similarity_threshold
+                )
+            )
+            results = result.fetchall()
+            self._record_distances(subject, results)
+
+            chunks = self._format_chunk_rows(results)
+            if mmr_lambda is not None:
+                chunks = self._diversify(chunks, [row.embedding for row in results], top_k, mmr_lambda)
+            if cache_key is not None:
+                retrieval_cache.set(cache_key, chunks)
+            return chunks
+
+        return await single_flight.do_async(
+            request_key(
+                "retrieval", subject=subject.value, query=query, model=embedding["model"],
+                top_k=top_k, similarity_threshold=similarity_threshold, ef_search=ef_search,
+                probes=probes, mmr_lambda=mmr_lambda, fetch_k=fetch_k, use_cache=cache_key is not None
+            ),
+            lambda: self._on_own_session(retrieve)
+        )
+
+    async def _on_own_session(self, fn: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        """
+        Run a single-flight call on a session of its own: the shared task can
+        outlive the request that started it, and that request's session.
+        """
+        async with AsyncSessionLocal() as db:
+            return await fn(db)
+
+    async def retrieve_each(
+        self,
+        db: AsyncSession,
+        queries: List[Tuple[str, SubjectEnum, int]],
+        similarity_threshold: float = 0.7
+    ) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Top-k chunks for each (query, subject, top_k), not merged, yielded
+        as (index, chunks) in the order they finish.
+
+        Cached results (same keys as retrieve_relevant_chunks) are yielded
+        first. Misses then run concurrently through the same single-flight,
+        hedged path as retrieve_relevant_chunks, each on its own session;
+        `db` is only used for the version lookups. Remaining queries are
+        cancelled if one fails or the caller stops iterating.
+        """
+        states: Dict[SubjectEnum, Tuple[Dict[str, Optional[str]], int]] = {}
+        pending: Dict[asyncio.Task, int] = {}
+        try:
+            for index, (query, subject, top_k) in enumerate(queries):
+                if subject not in states:
+                    states[subject] = (
+                        await embedding_version_service.get_state_async(db, subject),
+                        await corpus_service.get_version_async(db, subject)
+                    )
+                embedding, corpus_version = states[subject]
+                cache_key = self._cache_key(
+                    corpus_version, query, subject, top_k, similarity_threshold, None, None,
+                    embedding_model=embedding["model"]
+                )
+                cached = retrieval_cache.get(cache_key)
+                llm_metrics.record_cache("retrieval", cached is not None)
+                if cached is not None:
+                    yield index, cached
+                else:
+                    task = asyncio.ensure_future(self._retrieve_shared(
+                        query, subject, embedding, cache_key, top_k, similarity_threshold
+                    ))
+                    pending[task] = index
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield pending.pop(task), task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def retrieve_rows(
+        self,
+        db: AsyncSession,
+        queries: List[str],
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        include_embedding: bool = False
+    ) -> List[Any]:
+        """Raw top-k rows for several queries (see RAGService.retrieve_rows)."""
+        if not queries:
+            return []
+
+        embedding = await embedding_version_service.get_state_async(db, subject)
+        query_embeddings = await self.create_embeddings(queries, model=embedding["model"])
+
+        await db.execute(SET_SEARCH_SETTINGS, search_settings(ef_search, probes))
+
+        result = await db.execute(
+            multi_retrieval_query(
+                len(queries), include_embedding=include_embedding, column=embedding["column"]
+            ),
+            self._multi_retrieval_params(query_embeddings, subject, top_k, similarity_threshold)
+        )
+        results = result.fetchall()
+        self._record_distances(subject, results)
+        return results
+
+    async def retrieve_many(
+        self,
+        db: AsyncSession,
+        queries: List[str],
+        subject: SubjectEnum,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        max_results: Optional[int] = None,
+        extra_rows: Sequence[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve top-k chunks for several queries in one embedding call and
+        one SQL round trip, merged with any extra_rows and deduplicated per
+        chunk (optionally diversified with MMR down to max_results).
+        """
+        rows = await self.retrieve_rows(
+            db, queries, subject, top_k, similarity_threshold, ef_search, probes,
+            include_embedding=mmr_lambda is not None
+        )
+        return self._select_merged(self._with_extra_rows(rows, extra_rows, len(queries)), mmr_lambda, max_results)
+
+    async def generate_mcqs(
+        self,
+        db: AsyncSession,
+        subject: SubjectEnum,
+        num_questions: int = 10,
+        difficulty: str = "medium",
+        priority: str = INTERACTIVE
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate MCQs from study materials using OpenAI.
+
+        The model is routed on difficulty (see model_router) and recorded
+        on each question. Concurrent identical requests (same model,
+        subject, count and difficulty) share one generation, run on its
+        own session; see _generate_mcqs.
+        """
+        model = model_router.route(MCQ, difficulty=difficulty)
+        return await single_flight.do_async(
+            request_key(
+                "mcqs", model=model, subject=subject.value,
+                num_questions=num_questions, difficulty=difficulty
+            ),
+            lambda: self._on_own_session(
+                lambda own_db: self._generate_mcqs(own_db, subject, num_questions, difficulty, priority, model)
+            )
+        )
+
+    async def _generate_mcqs(
+        self,
+        db: AsyncSession,
+        subject: SubjectEnum,
+        num_questions: int = 10,
+        difficulty: str = "medium",
+        priority: str = INTERACTIVE,
+        model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate MCQs from study materials using OpenAI.
+
+        Fans out into concurrent smaller requests (see RAGService.generate_mcqs);
+        wall-clock time is roughly that of one MCQ_QUESTIONS_PER_REQUEST request.
+        """
+        model = model or self.model
+        batches = self._mcq_batches(num_questions)
+
+        chunk_texts = await chunk_sampler.sample_async(
+            db, subject, len(batches) * settings.MCQ_CHUNKS_PER_REQUEST
+        )
+
+        if not chunk_texts:
+            raise ValueError(f"No study materials found for subject: {subject.value}")
+
+        subsets = self._chunk_subsets(chunk_texts, len(batches))
+        semaphore = asyncio.Semaphore(settings.MCQ_MAX_CONCURRENCY)
+
+        async def generate_batch(size: int, chunk_texts: List[str]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                response = await self._chat_completion(
+                    priority=priority, **self._mcq_request(subject, size, difficulty, chunk_texts, model)
+                )
+            return self._parse_mcq_response(response.choices[0].message.content)
+
+        tasks = [
+            asyncio.create_task(generate_batch(size, subset))
+            for size, subset in zip(batches, subsets)
+        ]
+        questions, seen = [], set()
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    self._merge_mcqs(questions, seen, await finished)
+                except Exception as e:
+                    logger.warning("MCQ generation request failed: %s", e)
+                if len(questions) >= num_questions:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if not questions:
+            raise ValueError("Failed to parse MCQ response from OpenAI")
+        return [dict(question, model=model) for question in questions[:num_questions]]
+
+    async def _cached_grade(
+        self,
+        db: AsyncSession,
+        essay_content: str,
+        subject: SubjectEnum,
+        prompt: str,
+        rubric_items: Optional[List[str]],
+        model: str,
+        use_cache: bool
+    ):
+        """
+        Grade cache lookup for the routed model; returns
+        ((cache_key, fallback_key), corpus_version, cached grade or None).
+        """
+        if not (use_cache and settings.GRADE_CACHE_ENABLED):
+            return None, None, None
+        corpus_version = await corpus_service.get_version_async(db, subject)
+        keys = (
+            grade_cache_service.make_key(essay_content, prompt, subject, corpus_version, model, rubric_items),
+            grade_cache_service.make_fallback_key(essay_content, prompt, subject, corpus_version, rubric_items)
+        )
+        cached = await grade_cache_service.get_async(db, keys[0])
+        llm_metrics.record_cache("grade", cached is not None)
+        return keys, corpus_version, cached
+
+    async def _fallback_grade(
+        self,
+        db: AsyncSession,
+        keys: Optional[Tuple[str, str]],
+        error: CircuitOpenError
+    ) -> Dict[str, Any]:
+        """
+        A cached grade of the submission from any model, served while the
+        routed model's circuit is open; re-raises the error if there is none.
+        """
+        fallback = await grade_cache_service.get_fallback_async(db, keys[1]) if keys else None
+        llm_metrics.record_cache("grade_fallback", fallback is not None)
+        if fallback is None:
+            raise error
+        return fallback
+
+    async def _grading_prompt(
+        self,
+        db: AsyncSession,
+        essay_content: str,
+        subject: SubjectEnum,
+        prompt: str,
+        rubric_items: Optional[List[str]],
+        model: str,
+        prompt_rows: Optional[Sequence[Any]] = None
+    ) -> str:
+        """Retrieve reference materials and build the grading prompt."""
+        # Fail fast (before retrieval) while the grading model's circuit is open
+        circuit_breakers.get(model).ensure_closed()
+
+        relevant_chunks = await self.retrieve_many(
+            db=db,
+            subject=subject,
+            **self._grading_retrieval(essay_content, prompt, rubric_items, prompt_rows)
+        )
+
+        if not relevant_chunks:
+            raise ValueError(f"No reference materials found for subject: {subject.value}")
+
+        legal_context = self._pack_grading_context(relevant_chunks)
+        return self._build_grading_prompt(essay_content, prompt, legal_context["text"])
+
+    async def grade_essay(
+        self,
+        db: AsyncSession,
+        essay_content: str,
+        subject: SubjectEnum,
+        prompt: str,
+        rubric_items: Optional[List[str]] = None,
+        use_cache: bool = True,
+        prompt_rows: Optional[Sequence[Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Grade an essay using RAG to ensure grading is based on provided legal materials.
+        Identical resubmissions are served from the grade cache (see RAGService).
+        """
+        model = self._grading_model(essay_content, prompt)
+        keys, corpus_version, cached = await self._cached_grade(
+            db, essay_content, subject, prompt, rubric_items, model, use_cache
+        )
+        if cached is not None:
+            return cached
+
+        try:
+            grading_prompt = await self._grading_prompt(
+                db, essay_content, subject, prompt, rubric_items, model, prompt_rows
+            )
+
+            response = await self._chat_completion(
+                model=model,
+                messages=self._grading_messages(grading_prompt),
+                temperature=0.3,  # Lower temperature for consistent grading
+                max_tokens=2000
+            )
+        except CircuitOpenError as e:
+            return await self._fallback_grade(db, keys, e)
+
+        grade = self._parse_grading_response(response.choices[0].message.content)
+        grade["model"] = model
+        if keys is not None:
+            await grade_cache_service.set_async(db, *keys, subject, model, corpus_version, grade)
+        return grade
+
+    async def grade_essay_stream(
+        self,
+        db: AsyncSession,
+        essay_content: str,
+        subject: SubjectEnum,
+        prompt: str,
+        rubric_items: Optional[List[str]] = None,
+        use_cache: bool = True,
+        prompt_rows: Optional[Sequence[Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Grade an essay, yielding progress as the completion streams in.
+
+        Yields {"event": "token", "data": text} for every completion delta,
+        {"event": "field", "data": {"path": [...], "value": ...}} as soon as a
+        grade field (or a point_breakdown section / citation) is complete,
+        and finally {"event": "grade", "data": <full grade>}. A grade cache
+        hit (or, while the model's circuit is open, a fallback hit) yields
+        only the final event.
+        """
+        model = self._grading_model(essay_content, prompt)
+        keys, corpus_version, cached = await self._cached_grade(
+            db, essay_content, subject, prompt, rubric_items, model, use_cache
+        )
+        if cached is not None:
+            yield {"event": "grade", "data": cached}
+            return
+
+        try:
+            grading_prompt = await self._grading_prompt(
+                db, essay_content, subject, prompt, rubric_items, model, prompt_rows
+            )
+
+            request = {
+                "model": model,
+                "messages": self._grading_messages(grading_prompt),
+                "temperature": 0.3,  # Lower temperature for consistent grading
+                "max_tokens": 2000
+            }
+            completion = await self._chat_completion(stream=True, **request)
+        except CircuitOpenError as e:
+            yield {"event": "grade", "data": await self._fallback_grade(db, keys, e)}
+            return
+
+        parser = JSONObjectStream(max_depth=2)
+        content = []
+        # Closed even if our consumer stops early, so the limiter slot is released
+        async with aclosing(completion) as stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                content.append(delta)
+                yield {"event": "token", "data": delta}
+                if parser is None:
+                    continue
+                try:
+                    fields = parser.feed(delta)
+                except ValueError:
+                    # Not well-formed JSON; fall back to parsing the full text at the end
+                    parser = None
+                    continue
+                for path, value in fields:
+                    yield {"event": "field", "data": {"path": list(path), "value": value}}
+
+        if parser is not None and parser.done:
+            grade = parser.result
+        else:
+            grade = self._parse_grading_response("".join(content))
+        grade["model"] = model
+        # Streamed responses carry no usage; count it here
+        llm_metrics.record_tokens(
+            "chat", model,
+            self._estimate_chat_tokens(request) - request["max_tokens"],
+            len(self.encoding.encode("".join(content)))
+        )
+        if keys is not None:
+            await grade_cache_service.set_async(db, *keys, subject, model, corpus_version, grade)
+        yield {"event": "grade", "data": grade}
+
+
+# Global RAG service instances
 rag_service = RAGService()
+async_rag_service = AsyncRAGService()
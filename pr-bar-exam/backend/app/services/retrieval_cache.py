@@ -0,0 +1,72 @@
+"""
+In-process cache for retrieval results.
+
+Entries are keyed by subject, corpus version, a fingerprint of the query
+and the retrieval parameters. When a subject's corpus version is bumped,
+older entries can no longer be reached and age out of the LRU.
+"""
+from typing import List, Dict, Any, Optional, Tuple, Hashable
+from collections import OrderedDict
+import copy
+import hashlib
+import threading
+from app.core.config import settings
+
+
+def query_fingerprint(query: str) -> str:
+    """Stable fingerprint of a query string (whitespace-normalized)."""
+    normalized = " ".join(query.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    """Thread-safe LRU of retrieval results."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(
+        self,
+        subject: str,
+        corpus_version: int,
+        query: str,
+        **params: Any
+    ) -> Tuple:
+        return (subject, corpus_version, query_fingerprint(query), tuple(sorted(params.items())))
+
+    def get(self, key: Hashable) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            results = self._entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may mutate the chunk dicts they get back
+        return copy.deepcopy(results)
+
+    def set(self, key: Hashable, results: List[Dict[str, Any]]) -> None:
+        if self.max_entries <= 0:
+            return
+        results = copy.deepcopy(results)
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global retrieval cache instance
+retrieval_cache = RetrievalCache(max_entries=settings.RETRIEVAL_CACHE_SIZE)
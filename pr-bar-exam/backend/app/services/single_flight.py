@@ -0,0 +1,122 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several callers make the same request at the same time (a class
+embedding the same essay prompt, popular MCQ parameters), only the first
+one calls upstream; the rest wait for it and share its result. Nothing is
+kept after the call finishes - that's what the caches are for.
+
+Every caller gets its own copy of the result, taken from a snapshot made
+before anyone else can see it, so no caller can mutate what the others
+receive. An async shared call runs as its own task and may outlive the
+caller that started it, so it must not use that caller's database session
+(see AsyncRAGService._on_own_session).
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(kind: str, **params: Any) -> str:
+    """Canonical hash of a request kind and its inputs (order-independent)."""
+    payload = json.dumps({"kind": kind, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Shares one upstream call among concurrent identical requests."""
+
+    def __init__(self, wait_seconds: Optional[float] = None):
+        self.wait_seconds = settings.SINGLE_FLIGHT_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn() unless an identical call is in flight on another thread;
+        then share its result. A follower that waits longer than
+        wait_seconds gives up on the leader and runs fn() itself.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_seconds):
+                logger.warning("Single-flight leader still running after %.0fs; calling directly", self.wait_seconds)
+                return fn()
+            if call.error is not None:
+                raise call.error
+            # Followers get their own copy so nobody mutates a shared result
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+            # Snapshot before followers are released; the leader keeps the original
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of do().
+
+        The upstream call runs as its own task, so a caller that is cancelled
+        (e.g. client disconnected) doesn't cancel it for the others. The
+        task's result is never handed out; every caller, the leader included,
+        gets a copy, since a follower can still join after the leader returns.
+        """
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._tasks)
+        }
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
@@ -0,0 +1,235 @@
+"""
+Vector index maintenance for document_chunks embeddings (pgvector).
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.core.config import settings
+
+
+INDEX_NAME = "document_chunks_embedding_idx"
+INDEX_TYPES = ("hnsw", "ivfflat")
+
+# Session-level, so it holds across the AUTOCOMMIT statements of a rebuild
+TRY_ADVISORY_LOCK = text("SELECT pg_try_advisory_lock(hashtext(:key))")
+ADVISORY_UNLOCK = text("SELECT pg_advisory_unlock(hashtext(:key))")
+
+
+class VectorIndexService:
+    """Builds, rebuilds and tunes the pgvector index on document_chunks."""
+
+    def __init__(self):
+        self.index_type = settings.VECTOR_INDEX_TYPE
+
+    def build_index_sql(
+        self,
+        index_name: str = INDEX_NAME,
+        index_type: Optional[str] = None,
+        table: str = "document_chunks",
+        concurrently: bool = True,
+        opclass: str = "vector_cosine_ops",
+        column: str = "embedding"
+    ) -> str:
+        """
+        Build the CREATE INDEX statement for the configured index type.
+        """
+        index_type = index_type or self.index_type
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported vector index type: {index_type}")
+
+        if index_type == "hnsw":
+            with_clause = f"m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)}"
+        else:
+            with_clause = f"lists = {int(settings.IVFFLAT_LISTS)}"
+
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name} "
+            f"ON {table} USING {index_type} ({column} {opclass}) "
+            f"WITH ({with_clause})"
+        )
+
+    def list_partitions(self, conn: Connection, table: str = "document_chunks") -> List[str]:
+        """Names of a table's partitions (empty if it is not partitioned)."""
+        return conn.execute(
+            text("""
+                SELECT child.relname
+                FROM pg_inherits i
+                JOIN pg_class child ON child.oid = i.inhrelid
+                JOIN pg_class parent ON parent.oid = i.inhparent
+                WHERE parent.relname = :table
+                ORDER BY child.relname
+            """),
+            {"table": table}
+        ).scalars().all()
+
+    def partition_indexes(self, conn: Connection, index_name: str) -> Dict[str, str]:
+        """
+        Names of the partition indexes attached to a partitioned index, by partition.
+
+        Looked up in the catalog rather than derived: partitions created by
+        schema.sql or attached later get names PostgreSQL generates.
+        """
+        return dict(conn.execute(
+            text("""
+                SELECT tbl.relname, child.relname
+                FROM pg_inherits i
+                JOIN pg_class parent ON parent.oid = i.inhparent
+                JOIN pg_class child ON child.oid = i.inhrelid
+                JOIN pg_index x ON x.indexrelid = child.oid
+                JOIN pg_class tbl ON tbl.oid = x.indrelid
+                WHERE parent.relname = :index_name
+            """),
+            {"index_name": index_name}
+        ).all())
+
+    def rebuild_index(
+        self,
+        conn: Connection,
+        index_type: Optional[str] = None,
+        index_name: Optional[str] = None,
+        table: str = "document_chunks",
+        column: str = "embedding"
+    ) -> Dict[str, Any]:
+        """
+        Build a replacement index alongside the live one, then swap it in.
+
+        Uses CREATE/DROP INDEX CONCURRENTLY so reads and writes on
+        document_chunks are never blocked. The connection must be in
+        AUTOCOMMIT mode because concurrent index builds cannot run inside
+        a transaction block.
+
+        The live index is renamed aside and the new one renamed into place
+        in a single transaction, and only then is the old one dropped, so
+        an index with the expected name always exists. Rebuilds of the same
+        index are serialized with an advisory lock; a concurrent rebuild
+        raises ValueError instead of colliding on the `_new` index.
+
+        `column` selects the embedding slot (`embedding` or `embedding_alt`);
+        the index is named `<table>_<column>_idx` unless index_name is given.
+        """
+        index_type = index_type or self.index_type
+        index_name = index_name or f"{table}_{column}_idx"
+        new_name = f"{index_name}_new"
+        old_name = f"{index_name}_old"
+
+        lock = {"key": f"rebuild_index:{index_name}"}
+        if not conn.execute(TRY_ADVISORY_LOCK, lock).scalar():
+            raise ValueError(f"Another rebuild of {index_name} is in progress")
+        try:
+            partitions = self.list_partitions(conn, table)
+            if partitions:
+                self._rebuild_partitioned(conn, table, partitions, index_type, index_name, column)
+            else:
+                # Leftovers from an interrupted build are INVALID/unused and must be dropped first
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {old_name}"))
+                conn.execute(text(self.build_index_sql(
+                    index_name=new_name, index_type=index_type, table=table, column=column
+                )))
+                conn.execute(text(self._swap_sql([(index_name, old_name, new_name)])))
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {old_name}"))
+        finally:
+            conn.execute(ADVISORY_UNLOCK, lock)
+
+        return {
+            "index_name": index_name,
+            "index_type": index_type,
+            "partitions": partitions,
+            "definition": self.build_index_sql(
+                index_name=index_name, index_type=index_type, table=table, concurrently=False, column=column
+            )
+        }
+
+    def _swap_sql(self, names: List[Tuple[str, ...]]) -> str:
+        """
+        Rename each live index aside and its replacement into place.
+
+        Each entry is (live, old, new) or (live, old, new, target) when the
+        replacement's name differs from the live index's. Sent as one
+        multi-statement query, which PostgreSQL runs as a single implicit
+        transaction even in AUTOCOMMIT mode.
+        """
+        statements = []
+        for live, old, new, *target in names:
+            statements.append(f"ALTER INDEX IF EXISTS {live} RENAME TO {old}")
+            statements.append(f"ALTER INDEX {new} RENAME TO {target[0] if target else live}")
+        return "; ".join(statements)
+
+    def _rebuild_partitioned(
+        self,
+        conn: Connection,
+        table: str,
+        partitions: List[str],
+        index_type: str,
+        index_name: str,
+        column: str = "embedding"
+    ) -> None:
+        """
+        Rebuild a partitioned table's vector index one partition at a time.
+
+        CREATE INDEX CONCURRENTLY is not allowed on a partitioned parent, so
+        the new parent index is created ON ONLY the parent (invalid), each
+        partition gets its own concurrently-built index which is attached,
+        and the parent becomes valid once every partition is attached.
+        """
+        new_name = f"{index_name}_new"
+        old_name = f"{index_name}_old"
+
+        # Dropping a partitioned index drops the partition indexes attached to it
+        conn.execute(text(f"DROP INDEX IF EXISTS {new_name}"))
+        conn.execute(text(f"DROP INDEX IF EXISTS {old_name}"))
+        conn.execute(text(self.build_index_sql(
+            index_name=new_name, index_type=index_type, table=f"ONLY {table}", concurrently=False, column=column
+        )))
+
+        for partition in partitions:
+            child_new = f"{partition}_{column}_idx_new"
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {child_new}"))
+            conn.execute(text(self.build_index_sql(
+                index_name=child_new, index_type=index_type, table=partition, column=column
+            )))
+            conn.execute(text(f"ALTER INDEX {new_name} ATTACH PARTITION {child_new}"))
+
+        live = self.partition_indexes(conn, index_name)
+        conn.execute(text(self._swap_sql(
+            [(index_name, old_name, new_name)] + [
+                (
+                    live.get(partition, f"{partition}_{column}_idx"),
+                    f"{partition}_{column}_idx_old",
+                    f"{partition}_{column}_idx_new",
+                    f"{partition}_{column}_idx"
+                )
+                for partition in partitions
+            ]
+        )))
+        # Partitioned indexes can't be dropped concurrently; this lock is brief
+        conn.execute(text(f"DROP INDEX IF EXISTS {old_name}"))
+
+
+def search_settings(
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None
+) -> Dict[str, str]:
+    """
+    Bind parameters for SET_SEARCH_SETTINGS, falling back to the configured defaults.
+
+    Both knobs are set so the query works whichever index type is live;
+    pgvector ignores the one that does not apply.
+    """
+    return {
+        "ef_search": str(ef_search or settings.HNSW_EF_SEARCH),
+        "probes": str(probes or settings.IVFFLAT_PROBES),
+    }
+
+
+# Transaction-local so pooled connections don't keep another request's settings.
+# Both settings go in one statement to keep it to a single round trip.
+SET_SEARCH_SETTINGS = text("""
+    SELECT
+        set_config('hnsw.ef_search', :ef_search, true),
+        set_config('ivfflat.probes', :probes, true)
+""")
+
+
+# Global vector index service instance
+vector_index_service = VectorIndexService()
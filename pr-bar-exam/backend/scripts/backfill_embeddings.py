@@ -0,0 +1,93 @@
+"""
+Embedding model upgrade script.
+Backfills a subject's inactive embedding slot with a new model at a fixed
+rate (so neither the OpenAI quota nor the database sees a spike), then
+switches retrieval over to it atomically once every chunk is covered.
+Retrieval keeps using the old model until the switch; new chunks ingested
+meanwhile are written with both models.
+
+Usage:
+    python scripts/backfill_embeddings.py --subject familia --model text-embedding-3-large
+    python scripts/backfill_embeddings.py --subject familia --model text-embedding-3-large --rate 20 --no-switch
+    python scripts/backfill_embeddings.py --all --model text-embedding-3-large
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import sync_database_url
+from app.models.models import SubjectEnum
+from app.services.rag_service import rag_service
+from app.services.openai_limiter import BACKGROUND
+from app.services.embedding_version_service import embedding_version_service
+
+
+def backfill_subject(db: Session, subject: SubjectEnum, model: str, batch_size: int, rate: float, switch: bool):
+    state = embedding_version_service.get_state(db, subject)
+    if state["model"] == model and not state["target_model"]:
+        print(f"ℹ️  {subject.value} already uses {model}")
+        return
+    if state["target_model"] != model:
+        state = embedding_version_service.start(db, subject, model)
+    print(f"🔁 {subject.value}: {state['model']} ({state['column']}) -> {model} ({state['target_column']})")
+
+    coverage = embedding_version_service.coverage(db, subject)
+    print(f"   {coverage['total'] - coverage['pending']}/{coverage['total']} chunks already covered")
+
+    def embed(texts, target_model):
+        # Background priority: live traffic keeps its share of the model's rate limit
+        return rag_service.create_embeddings(texts, model=target_model, priority=BACKGROUND)
+
+    done = 0
+    while True:
+        start = time.monotonic()
+        written = embedding_version_service.backfill_batch(db, subject, embed, batch_size)
+        if not written:
+            break
+        done += written
+        print(f"   embedded {done}/{coverage['pending']}")
+        # Throttle to `rate` chunks per second
+        time.sleep(max(0.0, written / rate - (time.monotonic() - start)))
+
+    if not switch:
+        print(f"⏸  {subject.value} backfilled; not switching (--no-switch)")
+        return
+
+    try:
+        state = embedding_version_service.switch(db, subject)
+    except ValueError as e:
+        # Chunks ingested between the last batch and the switch; re-run to finish
+        print(f"⚠️  {subject.value}: {e}")
+        return
+    print(f"✅ {subject.value} now retrieves with {state['model']} ({state['column']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill a new embedding model and switch retrieval to it")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--subject", choices=[s.value for s in SubjectEnum])
+    group.add_argument("--all", action="store_true", help="Upgrade every subject, one at a time")
+    parser.add_argument("--model", required=True, help="Target embedding model")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BACKFILL_BATCH_SIZE)
+    parser.add_argument("--rate", type=float, default=settings.EMBEDDING_BACKFILL_RATE, help="Chunks per second")
+    parser.add_argument("--no-switch", action="store_true", help="Backfill only; leave retrieval on the old model")
+    args = parser.parse_args()
+
+    subjects = list(SubjectEnum) if args.all else [SubjectEnum(args.subject)]
+    engine = create_engine(sync_database_url(settings.DATABASE_URL))
+    with Session(engine) as db:
+        for subject in subjects:
+            backfill_subject(db, subject, args.model, args.batch_size, args.rate, not args.no_switch)
+
+    print("\n📝 Once every subject is switched, set OPENAI_EMBEDDING_MODEL to the new model")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Retrieval latency and recall benchmark.
+
+Loads a fixed corpus (seeded synthetic, or a snapshot .npz) into an isolated
+`retrieval_bench` schema, then runs RAGService.retrieve_relevant_chunks for a
+labeled query set under every combination of:
+    - embedding dimensions (Matryoshka truncation + renormalization)
+    - quantization (vector, or halfvec - needs pgvector >= 0.7)
+    - index type (hnsw, ivfflat, or exact scan)
+    - search effort (ef_search for hnsw, probes for ivfflat)
+
+Each configuration reports p50/p95/p99 latency and recall@k against exact
+brute-force search. The JSON report has stable keys so runs from two
+releases can be diffed directly.
+
+Snapshot format (.npz): embeddings (n, d), subjects (n,), queries (m, d),
+query_subjects (m,).
+
+Usage:
+    python scripts/benchmark_retrieval.py --output bench.json
+    python scripts/benchmark_retrieval.py --index hnsw --ef-search 20,40,80,160 --dims 1536,512
+    python scripts/benchmark_retrieval.py --snapshot corpus.npz --quant none,halfvec
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import sync_database_url
+from app.models.models import SubjectEnum
+from app.services.rag_service import RAGService
+from app.services.vector_index_service import vector_index_service
+
+
+SCHEMA = "retrieval_bench"
+INDEX_NAME = "retrieval_bench_embedding_idx"
+OPCLASSES = {"none": "vector_cosine_ops", "halfvec": "halfvec_cosine_ops"}
+COLUMN_TYPES = {"none": "vector", "halfvec": "halfvec"}
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def _str_list(value: str):
+    return [v for v in value.split(",") if v]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def synthetic_corpus(chunks_per_subject: int, num_queries: int, dims: int, seed: int) -> dict:
+    """
+    Clustered corpus: each subject has a handful of topic centroids and
+    chunks scattered around them, so neighbours are meaningful.
+    Queries are perturbed copies of random chunks.
+    """
+    rng = np.random.default_rng(seed)
+    subjects = [s.value for s in SubjectEnum]
+    embeddings, labels = [], []
+    for subject in subjects:
+        centroids = rng.standard_normal((8, dims), dtype=np.float32)
+        assignment = rng.integers(0, len(centroids), chunks_per_subject)
+        noise = rng.standard_normal((chunks_per_subject, dims), dtype=np.float32)
+        embeddings.append(centroids[assignment] + 0.6 * noise)
+        labels += [subject] * chunks_per_subject
+    embeddings = _normalize(np.vstack(embeddings)).astype(np.float32)
+    labels = np.array(labels)
+
+    picks = rng.integers(0, len(embeddings), num_queries)
+    noise = rng.standard_normal((num_queries, dims), dtype=np.float32)
+    queries = _normalize(embeddings[picks] + 0.3 * noise).astype(np.float32)
+    return {"embeddings": embeddings, "subjects": labels, "queries": queries, "query_subjects": labels[picks]}
+
+
+def load_snapshot(path: str) -> dict:
+    data = np.load(path, allow_pickle=False)
+    return {key: data[key] for key in ("embeddings", "subjects", "queries", "query_subjects")}
+
+
+def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """Matryoshka-style truncation, as the text-embedding-3 `dimensions` option does."""
+    return _normalize(vectors[:, :dims]).astype(np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, subjects: np.ndarray, queries: np.ndarray, query_subjects: np.ndarray, k: int):
+    """Brute-force cosine top-k per query within its subject (ground truth)."""
+    truth = []
+    for query, subject in zip(queries, query_subjects):
+        candidates = np.flatnonzero(subjects == subject)
+        scores = corpus[candidates] @ query
+        best = candidates[np.argsort(-scores)[:k]]
+        truth.append(set(int(i) + 1 for i in best))  # row ids are 1-based
+    return truth
+
+
+def load_corpus(conn, corpus: np.ndarray, subjects: np.ndarray, quant: str, batch_size: int = 500):
+    """(Re)create the benchmark tables and bulk-load the corpus."""
+    dims = corpus.shape[1]
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+    conn.execute(text(
+        f"DROP TABLE IF EXISTS {SCHEMA}.document_chunks, {SCHEMA}.study_materials, {SCHEMA}.embedding_versions"
+    ))
+    # Empty, so every subject searches the `embedding` column (shadows public.embedding_versions)
+    conn.execute(text(f"""
+        CREATE TABLE {SCHEMA}.embedding_versions (
+            subject TEXT PRIMARY KEY, active_column TEXT NOT NULL, active_model TEXT NOT NULL, target_model TEXT
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE {SCHEMA}.study_materials (
+            id INTEGER PRIMARY KEY, subject TEXT NOT NULL, title TEXT NOT NULL, file_type TEXT
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TABLE {SCHEMA}.document_chunks (
+            id INTEGER PRIMARY KEY,
+            material_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            chunk_text TEXT NOT NULL,
+            page_number INTEGER,
+            embedding {COLUMN_TYPES[quant]}({dims})
+        )
+    """))
+
+    material_ids = {s.value: i + 1 for i, s in enumerate(SubjectEnum)}
+    conn.execute(
+        text(f"INSERT INTO {SCHEMA}.study_materials VALUES (:id, :subject, :title, 'pdf')"),
+        [{"id": i, "subject": s, "title": f"bench-{s}"} for s, i in material_ids.items()]
+    )
+
+    insert = text(f"""
+        INSERT INTO {SCHEMA}.document_chunks (id, material_id, subject, chunk_text, page_number, embedding)
+        VALUES (:id, :material_id, :subject, :chunk_text, 1, :embedding)
+    """)
+    for start in range(0, len(corpus), batch_size):
+        conn.execute(insert, [
+            {
+                "id": i + 1,
+                "material_id": material_ids[str(subjects[i])],
+                "subject": str(subjects[i]),
+                "chunk_text": f"chunk {i + 1}",
+                "embedding": str(corpus[i].tolist()),
+            }
+            for i in range(start, min(start + batch_size, len(corpus)))
+        ])
+    conn.execute(text(f"ANALYZE {SCHEMA}.document_chunks"))
+
+
+def build_index(conn, index_type: str, quant: str):
+    conn.execute(text(f"DROP INDEX IF EXISTS {SCHEMA}.{INDEX_NAME}"))
+    if index_type == "exact":
+        return
+    conn.execute(text(vector_index_service.build_index_sql(
+        index_name=INDEX_NAME,
+        index_type=index_type,
+        table=f"{SCHEMA}.document_chunks",
+        concurrently=False,
+        opclass=OPCLASSES[quant]
+    )))
+    conn.execute(text(f"ANALYZE {SCHEMA}.document_chunks"))
+
+
+class BenchmarkRAGService(RAGService):
+    """RAGService whose query embeddings come from the labeled query set, not the API."""
+
+    def __init__(self, query_vectors: dict):
+        super().__init__()
+        self.query_vectors = query_vectors
+
+    def create_embedding(self, text: str, model=None):
+        return self.query_vectors[text]
+
+
+def run_config(session, service, query_subjects, truth, top_k, ef_search, probes, warmup: int):
+    latencies, recalls = [], []
+    for i, subject in enumerate(query_subjects):
+        start = time.perf_counter()
+        chunks = service.retrieve_relevant_chunks(
+            db=session,
+            query=f"q{i}",
+            subject=SubjectEnum(str(subject)),
+            top_k=top_k,
+            similarity_threshold=-1.0,  # measure ranking only, not the threshold
+            ef_search=ef_search,
+            probes=probes,
+            use_cache=False
+        )
+        elapsed = time.perf_counter() - start
+        session.rollback()
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        retrieved = set(chunk["chunk_id"] for chunk in chunks)
+        recalls.append(len(retrieved & truth[i]) / max(1, len(truth[i])))
+
+    return {
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(np.mean(latencies)), 3),
+        },
+        f"recall_at_{top_k}": round(float(np.mean(recalls)), 4),
+        "queries": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and recall")
+    parser.add_argument("--snapshot", help="Load corpus and queries from an .npz snapshot")
+    parser.add_argument("--chunks-per-subject", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K_RESULTS)
+    parser.add_argument("--index", type=_str_list, default=["hnsw", "ivfflat", "exact"])
+    parser.add_argument("--ef-search", type=_int_list, default=[20, 40, 80, 160])
+    parser.add_argument("--probes", type=_int_list, default=[1, 5, 10, 20])
+    parser.add_argument("--dims", type=_int_list, default=[1536])
+    parser.add_argument("--quant", type=_str_list, default=["none"], help="none,halfvec")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--output", default="retrieval_benchmark.json")
+    args = parser.parse_args()
+
+    data = load_snapshot(args.snapshot) if args.snapshot else synthetic_corpus(
+        args.chunks_per_subject, args.queries, max(args.dims), args.seed
+    )
+
+    engine = create_engine(sync_database_url(settings.DATABASE_URL))
+    results = []
+
+    with engine.connect() as conn:
+        conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        conn.commit()
+
+        for dims in args.dims:
+            corpus = truncate(data["embeddings"], dims)
+            queries = truncate(data["queries"], dims)
+            truth = exact_top_k(corpus, data["subjects"], queries, data["query_subjects"], args.top_k)
+            service = BenchmarkRAGService({f"q{i}": q.tolist() for i, q in enumerate(queries)})
+
+            for quant in args.quant:
+                print(f"📋 Loading {len(corpus)} chunks ({dims} dims, quantization={quant})...")
+                load_corpus(conn, corpus, data["subjects"], quant)
+                conn.commit()
+
+                for index_type in args.index:
+                    print(f"🧭 Building {index_type} index...")
+                    build_index(conn, index_type, quant)
+                    conn.commit()
+
+                    knobs = {"hnsw": [(ef, None) for ef in args.ef_search],
+                             "ivfflat": [(None, p) for p in args.probes]}.get(index_type, [(None, None)])
+                    for ef_search, probes in knobs:
+                        with Session(bind=conn) as session:
+                            metrics = run_config(
+                                session, service, data["query_subjects"], truth,
+                                args.top_k, ef_search, probes, args.warmup
+                            )
+                        config = {
+                            "dims": dims,
+                            "quantization": quant,
+                            "index_type": index_type,
+                            "ef_search": ef_search,
+                            "probes": probes,
+                        }
+                        results.append({"config": config, **metrics})
+                        print(f"   {config} -> p50 {metrics['latency_ms']['p50']}ms "
+                              f"p99 {metrics['latency_ms']['p99']}ms "
+                              f"recall@{args.top_k} {metrics[f'recall_at_{args.top_k}']}")
+
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.commit()
+
+    report = {
+        "app_version": settings.APP_VERSION,
+        "generated_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "corpus": {
+            "source": args.snapshot or f"synthetic(seed={args.seed})",
+            "chunks": int(len(data["embeddings"])),
+            "queries": int(len(data["queries"])),
+            "top_k": args.top_k,
+        },
+        "index_build": {
+            "hnsw_m": settings.HNSW_M,
+            "hnsw_ef_construction": settings.HNSW_EF_CONSTRUCTION,
+            "ivfflat_lists": settings.IVFFLAT_LISTS,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\n✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Vector binding benchmark.
+Compares the old retrieval path (vector bound as a decimal string, statement
+re-prepared on every call) with the new one (pgvector binary codec plus a
+cached prepared statement), and reports client CPU and latency per query.
+
+Usage:
+    python scripts/benchmark_vector_binding.py --subject familia --queries 500 --qps 20
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from app.core.config import settings
+
+
+QUERY = """
+    SELECT dc.id, (dc.embedding <=> CAST($1 AS vector)) AS distance
+    FROM document_chunks dc
+    JOIN study_materials sm ON dc.material_id = sm.id
+    WHERE sm.subject = $2
+    ORDER BY dc.embedding <=> CAST($1 AS vector)
+    LIMIT $3
+"""
+
+
+def _asyncpg_dsn(url: str) -> str:
+    url = url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return url.replace("postgres://", "postgresql://", 1)
+
+
+def _random_embeddings(n: int, dims: int = 1536) -> np.ndarray:
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((n, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _summarize(name: str, latencies: list, cpu_seconds: float, qps: float) -> dict:
+    n = len(latencies)
+    cpu_ms = cpu_seconds / n * 1000
+    return {
+        "name": name,
+        "queries": n,
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": sorted(latencies)[int(n * 0.95) - 1] * 1000,
+        "cpu_ms_per_query": cpu_ms,
+        # Fraction of one core spent on the client side at the target QPS
+        "cpu_core_share_at_qps": cpu_ms * qps / 1000,
+    }
+
+
+async def _run_text(dsn: str, embeddings: np.ndarray, subject: str, top_k: int) -> tuple:
+    """Old path: decimal-string vectors, no statement reuse."""
+    conn = await asyncpg.connect(dsn, statement_cache_size=0)
+    latencies = []
+    cpu_start = time.process_time()
+    try:
+        for embedding in embeddings:
+            start = time.perf_counter()
+            await conn.fetch(QUERY, str(embedding.tolist()), subject, top_k)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        cpu = time.process_time() - cpu_start
+        await conn.close()
+    return latencies, cpu
+
+
+async def _run_binary(dsn: str, embeddings: np.ndarray, subject: str, top_k: int) -> tuple:
+    """New path: binary vectors through a prepared statement."""
+    conn = await asyncpg.connect(dsn)
+    await register_vector(conn)
+    statement = await conn.prepare(QUERY)
+    latencies = []
+    cpu_start = time.process_time()
+    try:
+        for embedding in embeddings:
+            start = time.perf_counter()
+            await statement.fetch(embedding, subject, top_k)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        cpu = time.process_time() - cpu_start
+        await conn.close()
+    return latencies, cpu
+
+
+def _encode_only(embeddings: np.ndarray) -> dict:
+    """Client-side encode cost alone (no database needed)."""
+    start = time.process_time()
+    for embedding in embeddings:
+        str(embedding.tolist())
+    text_cpu = time.process_time() - start
+
+    start = time.process_time()
+    for embedding in embeddings:
+        embedding.astype(">f4").tobytes()
+    binary_cpu = time.process_time() - start
+
+    n = len(embeddings)
+    return {
+        "text_encode_us": text_cpu / n * 1e6,
+        "binary_encode_us": binary_cpu / n * 1e6,
+        "text_bytes": len(str(embeddings[0].tolist())),
+        "binary_bytes": embeddings[0].nbytes + 4,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark text vs binary vector binding")
+    parser.add_argument("--subject", default="familia")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K_RESULTS)
+    parser.add_argument("--qps", type=float, default=20.0, help="Production QPS to project CPU savings at")
+    args = parser.parse_args()
+
+    embeddings = _random_embeddings(args.queries)
+    dsn = _asyncpg_dsn(settings.DATABASE_URL)
+
+    print("🔧 Encoding only")
+    for key, value in _encode_only(embeddings).items():
+        print(f"   {key}: {value:.1f}")
+
+    results = []
+    for name, runner in (("text+unprepared", _run_text), ("binary+prepared", _run_binary)):
+        print(f"⏱  Running {name} ({args.queries} queries)...")
+        latencies, cpu = await runner(dsn, embeddings, args.subject, args.top_k)
+        results.append(_summarize(name, latencies, cpu, args.qps))
+
+    for result in results:
+        print(f"\n📊 {result['name']}")
+        for key, value in result.items():
+            if key != "name":
+                print(f"   {key}: {value:.3f}" if isinstance(value, float) else f"   {key}: {value}")
+
+    old, new = results
+    print(f"\n✅ Saved per query: {old['latency_p50_ms'] - new['latency_p50_ms']:.2f} ms p50 latency, "
+          f"{old['cpu_ms_per_query'] - new['cpu_ms_per_query']:.3f} ms client CPU "
+          f"({(old['cpu_core_share_at_qps'] - new['cpu_core_share_at_qps']) * 100:.1f}% of a core at {args.qps:g} QPS)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
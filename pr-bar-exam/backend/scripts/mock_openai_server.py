@@ -0,0 +1,249 @@
+"""
+Deterministic local stand-in for the OpenAI API.
+
+Implements POST /v1/embeddings and POST /v1/chat/completions (including
+stream=True) so RAGService can be load tested, benchmarked and debugged
+offline:
+    - embeddings are hash-derived: each word maps to a fixed random vector and
+      a text embeds to the normalized sum, so texts sharing words are similar
+      and retrieval behaves plausibly;
+    - chat completions return canned JSON MCQs (for MCQ generation prompts),
+      canned grades (for grading prompts) or a short answer, all derived from
+      a hash of the request, so identical requests get identical responses;
+    - latency, token throughput and injected 429s / 500s / timeouts are
+      configurable, with a seed so a run can be reproduced.
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=local
+
+Usage:
+    python scripts/mock_openai_server.py
+    python scripts/mock_openai_server.py --latency 0.3 --jitter 0.1 --tokens-per-second 60
+    python scripts/mock_openai_server.py --rate-limit-rate 0.05 --timeout-rate 0.01 --seed 7
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from functools import lru_cache
+from typing import Any, Dict, List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+DEFAULT_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536
+}
+
+WORD = re.compile(r"\w+", re.UNICODE)
+MCQ_COUNT = re.compile(r"generate (\d+) multiple-choice", re.IGNORECASE)
+SUBJECT = re.compile(r"specifically in (\w+)")
+
+config = argparse.Namespace()
+rng = random.Random()
+app = FastAPI(title="Mock OpenAI API")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _count_tokens(text: str) -> int:
+    # Roughly 4 characters per token, like the limiter's estimates
+    return max(1, len(text) // 4)
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+
+
+def embed(text: str, dimensions: int) -> List[float]:
+    words = WORD.findall(text.lower()) or [""]
+    vector = np.sum([_word_vector(word, dimensions) for word in words], axis=0)
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+def mcq_content(prompt: str, key: str) -> str:
+    count = int(MCQ_COUNT.search(prompt).group(1)) if MCQ_COUNT.search(prompt) else 5
+    subject = SUBJECT.search(prompt).group(1) if SUBJECT.search(prompt) else "derecho"
+    questions = []
+    for i in range(count):
+        seed = _digest([key, i])
+        questions.append({
+            "question": f"[{subject}] Practice question {seed[:10]}: which statement is correct?",
+            "options": {label: f"Option {label} ({seed[j * 4:j * 4 + 4]})" for j, label in enumerate("ABCD")},
+            "correct_answer": "ABCD"[int(seed[-1], 16) % 4],
+            "explanation": f"Deterministic explanation {seed[10:18]}."
+        })
+    return json.dumps(questions, ensure_ascii=False)
+
+
+def grade_content(key: str) -> str:
+    legal, citation, writing = (int(key[i:i + 2], 16) for i in (0, 2, 4))
+    legal, citation, writing = 20 + legal % 21, 15 + citation % 16, 15 + writing % 16
+    return json.dumps({
+        "overall_score": float(legal + citation + writing),
+        "legal_analysis_score": float(legal),
+        "citation_accuracy_score": float(citation),
+        "writing_quality_score": float(writing),
+        "feedback": f"Deterministic feedback {key[:12]}. The analysis identifies the main issues.",
+        "point_breakdown": {
+            "strengths": ["Identifies the governing rule", "Clear structure"],
+            "weaknesses": ["Limited application to the facts"],
+            "suggestions": ["Cite the reference materials more precisely"]
+        },
+        "citations": [{"source": "Reference material 1", "page": str(1 + int(key[6:8], 16) % 300), "quote": "..."}]
+    })
+
+
+def completion_content(messages: List[Dict[str, Any]]) -> str:
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    key = _digest(messages)
+    if MCQ_COUNT.search(prompt):
+        return mcq_content(prompt, key)
+    if "overall_score" in prompt:
+        return grade_content(key)
+    return f"Deterministic answer {key[:12]} based on the provided materials."
+
+
+def _error(status: int, kind: str, message: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": kind, "param": None, "code": kind}},
+        headers=headers
+    )
+
+
+async def _fault():
+    """Injected failure for this request, if any (may also just hang)."""
+    roll = rng.random()
+    if roll < config.rate_limit_rate:
+        return _error(
+            429, "rate_limit_exceeded", "Rate limit reached (mock)",
+            {"retry-after-ms": str(int(config.retry_after * 1000))}
+        )
+    roll -= config.rate_limit_rate
+    if roll < config.error_rate:
+        return _error(500, "server_error", "The server had an error (mock)")
+    roll -= config.error_rate
+    if roll < config.timeout_rate:
+        # Hold the request long enough for the client's timeout to fire
+        await asyncio.sleep(config.timeout_seconds)
+        return _error(504, "timeout", "Request timed out (mock)")
+    return None
+
+
+async def _base_latency():
+    await asyncio.sleep(max(0.0, rng.gauss(config.latency, config.jitter)))
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    if (fault := await _fault()) is not None:
+        return fault
+    await _base_latency()
+
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    model = body.get("model", "text-embedding-3-small")
+    dimensions = body.get("dimensions") or DEFAULT_DIMENSIONS.get(model, 1536)
+    tokens = sum(_count_tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "model": model,
+        "data": [
+            {"object": "embedding", "index": i, "embedding": embed(text, dimensions)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if (fault := await _fault()) is not None:
+        return fault
+    await _base_latency()
+
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-3.5-turbo")
+    content = completion_content(messages)
+    completion_id = f"chatcmpl-{_digest(messages)[:24]}"
+    created = int(time.time())
+    prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in messages)
+    completion_tokens = _count_tokens(content)
+
+    if body.get("stream"):
+        async def stream():
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            # ~4 characters per token, paced at the configured throughput
+            for start in range(0, len(content), 16):
+                await asyncio.sleep(4 / config.tokens_per_second)
+                yield chunk({"content": content[start:start + 16]})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(completion_tokens / config.tokens_per_second)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic local stand-in for the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean time to first byte (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Std deviation of the latency (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Completion throughput")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--timeout-seconds", type=float, default=120.0, help="How long hanging requests hang")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and fault injection")
+    parser.parse_args(namespace=config)
+
+    rng.seed(config.seed)
+    print(f"🧪 Mock OpenAI API on http://{config.host}:{config.port}/v1")
+    print(f"   Set OPENAI_BASE_URL=http://{config.host}:{config.port}/v1")
+    uvicorn.run(app, host=config.host, port=config.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Online migration of document_chunks to a subject-partitioned table.
+
+Steps (each is safe to re-run):
+    1. Add/backfill document_chunks.subject from study_materials
+    2. Create document_chunks_partitioned with one partition per subject
+    3. Mirror live writes into it with a trigger, then copy existing rows in batches
+    4. Build vector indexes (both embedding slots) on every partition (concurrently)
+    5. Swap the tables in one short transaction, copying the old table's RLS
+       policies (old table kept as document_chunks_old)
+
+Usage:
+    python scripts/partition_document_chunks.py
+    python scripts/partition_document_chunks.py --batch-size 2000 --no-swap
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+from app.core.database import sync_database_url
+from app.models.models import SubjectEnum
+from app.services.vector_index_service import vector_index_service
+from app.services.embedding_version_service import EMBEDDING_COLUMNS
+
+
+SOURCE = "document_chunks"
+TARGET = "document_chunks_partitioned"
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return conn.execute(
+        text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = :table AND column_name = :column
+        """),
+        {"table": table, "column": column}
+    ).first() is not None
+
+
+def backfill_subject(conn, batch_size: int):
+    """Add the subject column and fill it from the owning study material."""
+    conn.execute(text(f"ALTER TABLE {SOURCE} ADD COLUMN IF NOT EXISTS subject TEXT"))
+    if not _has_column(conn, SOURCE, "material_id"):
+        return
+
+    total = 0
+    while True:
+        # Only rows that can be matched, so a batch of orphans can't end the loop early
+        updated = conn.execute(
+            text(f"""
+                UPDATE {SOURCE} dc
+                SET subject = lower(sm.subject::text)
+                FROM study_materials sm
+                WHERE dc.material_id = sm.id
+                  AND dc.id IN (
+                      SELECT id FROM {SOURCE}
+                      WHERE subject IS NULL
+                        AND material_id IN (SELECT id FROM study_materials WHERE subject IS NOT NULL)
+                      LIMIT :batch_size
+                  )
+            """),
+            {"batch_size": batch_size}
+        ).rowcount
+        total += updated
+        if updated == 0:
+            break
+    print(f"   subject backfilled on {total} rows")
+
+    # subject is part of the new primary key, so it can't stay NULL
+    unmatched = conn.execute(text(f"""
+        SELECT
+            count(*) FILTER (WHERE sm.id IS NULL) AS orphans,
+            count(*) FILTER (WHERE sm.id IS NOT NULL) AS no_subject
+        FROM {SOURCE} dc
+        LEFT JOIN study_materials sm ON sm.id = dc.material_id
+        WHERE dc.subject IS NULL
+    """)).first()
+    if unmatched.orphans or unmatched.no_subject:
+        raise SystemExit(
+            f"❌ {unmatched.orphans} chunks reference no study material and "
+            f"{unmatched.no_subject} belong to materials without a subject; fix them and re-run"
+        )
+
+
+def create_partitioned_table(conn):
+    """Partitioned copy of document_chunks: one partition per subject plus a default."""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {TARGET}
+        (LIKE {SOURCE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY LIST (subject)
+    """))
+    for subject in SubjectEnum:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SOURCE}_{subject.value} "
+            f"PARTITION OF {TARGET} FOR VALUES IN ('{subject.value}')"
+        ))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {SOURCE}_default PARTITION OF {TARGET} DEFAULT"))
+
+    # Primary keys on partitioned tables must include the partition key
+    has_pk = conn.execute(text(f"""
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = '{TARGET}'::regclass AND contype = 'p'
+    """)).first()
+    if not has_pk:
+        conn.execute(text(f"ALTER TABLE {TARGET} ADD PRIMARY KEY (id, subject)"))
+
+    if _has_column(conn, SOURCE, "material_id"):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {TARGET}_material_idx ON {TARGET} (material_id)"))
+
+
+def install_mirror_trigger(conn):
+    """Apply every write on the live table to the partitioned copy while it's being filled."""
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION mirror_document_chunks() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {TARGET} WHERE id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {TARGET} SELECT (NEW).* ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+    """))
+    conn.execute(text(f"DROP TRIGGER IF EXISTS document_chunks_mirror ON {SOURCE}"))
+    conn.execute(text(f"""
+        CREATE TRIGGER document_chunks_mirror
+        AFTER INSERT OR UPDATE OR DELETE ON {SOURCE}
+        FOR EACH ROW EXECUTE FUNCTION mirror_document_chunks()
+    """))
+
+
+def copy_rows(conn, batch_size: int, pause: float):
+    """Copy existing rows in keyset-paginated batches (each batch its own transaction)."""
+    last_id = None
+    total = 0
+    while True:
+        params = {"batch_size": batch_size}
+        where = ""
+        if last_id is not None:
+            where = "WHERE id > :last_id"
+            params["last_id"] = last_id
+
+        # ids may be UUIDs, which have no max() aggregate
+        batch = conn.execute(
+            text(f"""
+                WITH batch AS (
+                    SELECT * FROM {SOURCE} {where} ORDER BY id LIMIT :batch_size
+                ), inserted AS (
+                    INSERT INTO {TARGET} SELECT * FROM batch ON CONFLICT DO NOTHING
+                )
+                SELECT
+                    (SELECT id FROM batch ORDER BY id DESC LIMIT 1) AS last_id,
+                    (SELECT count(*) FROM batch) AS n
+            """),
+            params
+        ).first()
+        if not batch.n:
+            break
+        last_id = batch.last_id
+        total += batch.n
+        print(f"   copied {total} rows")
+        time.sleep(pause)
+
+
+def policy_sql(table: str, policy) -> str:
+    """CREATE POLICY recreating a pg_policies row on another table."""
+    name = policy.policyname.replace('"', '""')
+    statement = f'CREATE POLICY "{name}" ON {table} AS {policy.permissive} FOR {policy.cmd} TO {policy.roles}'
+    if policy.qual is not None:
+        statement += f" USING ({policy.qual})"
+    if policy.with_check is not None:
+        statement += f" WITH CHECK ({policy.with_check})"
+    return statement
+
+
+def swap_tables(conn):
+    """Swap the partitioned table in; the old table is kept for rollback."""
+    with conn.begin():
+        conn.execute(text(f"LOCK TABLE {SOURCE} IN ACCESS EXCLUSIVE MODE"))
+        rls = conn.execute(text(
+            f"SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = '{SOURCE}'::regclass"
+        )).first()
+        policies = conn.execute(text("""
+            SELECT policyname, permissive, array_to_string(roles, ', ') AS roles, cmd, qual, with_check
+            FROM pg_policies
+            WHERE schemaname = current_schema() AND tablename = :table
+        """), {"table": SOURCE}).fetchall()
+        # Serial ids: the sequence must outlive the old table
+        id_sequence = conn.execute(text(
+            f"SELECT pg_get_serial_sequence('{SOURCE}', 'id')"
+        )).scalar()
+
+        conn.execute(text(f"DROP TRIGGER IF EXISTS document_chunks_mirror ON {SOURCE}"))
+        conn.execute(text(f"ALTER TABLE {SOURCE} RENAME TO {SOURCE}_old"))
+        conn.execute(text(f"ALTER TABLE {TARGET} RENAME TO {SOURCE}"))
+        for column in EMBEDDING_COLUMNS:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {SOURCE}_{column}_idx RENAME TO {SOURCE}_old_{column}_idx"))
+            conn.execute(text(f"ALTER INDEX IF EXISTS {TARGET}_{column}_idx RENAME TO {SOURCE}_{column}_idx"))
+        if id_sequence:
+            conn.execute(text(f"ALTER SEQUENCE {id_sequence} OWNED BY {SOURCE}.id"))
+
+        # Policies belong to the old table; recreate each one on the new table
+        if rls.relrowsecurity:
+            conn.execute(text(f"ALTER TABLE {SOURCE} ENABLE ROW LEVEL SECURITY"))
+        if rls.relforcerowsecurity:
+            conn.execute(text(f"ALTER TABLE {SOURCE} FORCE ROW LEVEL SECURITY"))
+        for policy in policies:
+            conn.execute(text(policy_sql(SOURCE, policy)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition document_chunks by subject online")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between copy batches")
+    parser.add_argument("--no-swap", action="store_true", help="Stop before swapping the tables")
+    args = parser.parse_args()
+
+    engine = create_engine(sync_database_url(settings.DATABASE_URL), isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        if vector_index_service.list_partitions(conn, SOURCE):
+            print("ℹ️  document_chunks is already partitioned")
+            return
+
+        print("🔧 Backfilling subject column...")
+        backfill_subject(conn, args.batch_size)
+
+        print("📋 Creating partitioned table...")
+        create_partitioned_table(conn)
+
+        print("🔁 Mirroring writes and copying rows...")
+        install_mirror_trigger(conn)
+        copy_rows(conn, args.batch_size, args.pause)
+
+        print("🧭 Building per-partition vector indexes...")
+        for column in EMBEDDING_COLUMNS:
+            if _has_column(conn, TARGET, column):
+                vector_index_service.rebuild_index(
+                    conn, index_name=f"{TARGET}_{column}_idx", table=TARGET, column=column
+                )
+
+        if args.no_swap:
+            print("⏸  Skipping swap (writes are still mirrored)")
+            return
+
+        print("🔀 Swapping tables...")
+    with engine.connect().execution_options(isolation_level="READ COMMITTED") as conn:
+        swap_tables(conn)
+
+    print("\n✨ document_chunks is now partitioned by subject")
+    print(f"   Drop {SOURCE}_old once retrieval has been verified")
+
+
+if __name__ == "__main__":
+    main()
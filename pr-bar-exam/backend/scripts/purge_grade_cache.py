@@ -0,0 +1,30 @@
+"""
+Grade cache purge script.
+Deletes cached grades computed against an older corpus version (they can no
+longer be hit once new materials are ingested). Safe to run from cron.
+
+Usage:
+    python scripts/purge_grade_cache.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import sync_database_url
+from app.services.grade_cache_service import grade_cache_service
+
+
+def main():
+    engine = create_engine(sync_database_url(settings.DATABASE_URL))
+    with Session(engine) as db:
+        deleted = grade_cache_service.purge_stale(db)
+    print(f"✅ Purged {deleted} stale cached grades")
+
+
+if __name__ == "__main__":
+    main()
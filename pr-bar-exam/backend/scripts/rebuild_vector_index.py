@@ -0,0 +1,51 @@
+"""
+Vector index rebuild script.
+Builds (or rebuilds) the document_chunks embedding index without blocking
+reads or writes, e.g. to migrate from ivfflat to HNSW or to retune lists.
+
+Usage:
+    python scripts/rebuild_vector_index.py                 # use VECTOR_INDEX_TYPE
+    python scripts/rebuild_vector_index.py --type ivfflat  # override index type
+    python scripts/rebuild_vector_index.py --dry-run       # print the DDL only
+    python scripts/rebuild_vector_index.py --column embedding_alt  # second embedding slot
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from app.core.config import settings
+from app.core.database import sync_database_url
+from app.services.vector_index_service import vector_index_service, INDEX_TYPES
+from app.services.embedding_version_service import EMBEDDING_COLUMNS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the document_chunks vector index")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=settings.VECTOR_INDEX_TYPE)
+    parser.add_argument("--column", choices=EMBEDDING_COLUMNS, default="embedding")
+    parser.add_argument("--dry-run", action="store_true", help="Print the DDL without running it")
+    args = parser.parse_args()
+
+    print(f"🔧 Rebuilding vector index ({args.type}) on {args.column}...")
+    print(f"   {vector_index_service.build_index_sql(index_name=f'document_chunks_{args.column}_idx', index_type=args.type, column=args.column)}")
+
+    if args.dry_run:
+        return
+
+    engine = create_engine(
+        sync_database_url(settings.DATABASE_URL),
+        isolation_level="AUTOCOMMIT"
+    )
+    with engine.connect() as conn:
+        result = vector_index_service.rebuild_index(conn, index_type=args.type, column=args.column)
+
+    print(f"✅ {result['index_name']} rebuilt as {result['index_type']}")
+    print("\n📝 Per-query search effort is set via HNSW_EF_SEARCH / IVFFLAT_PROBES")
+
+
+if __name__ == "__main__":
+    main()
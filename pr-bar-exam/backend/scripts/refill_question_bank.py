@@ -0,0 +1,42 @@
+"""
+Question bank refill script.
+Runs one refill pass (every subject and difficulty up to
+QUESTION_BANK_TARGET_DEPTH). Use it from cron where the API can't run a
+background task (e.g. serverless, with QUESTION_BANK_REFILL_ENABLED=false).
+
+Usage:
+    python scripts/refill_question_bank.py
+    python scripts/refill_question_bank.py --depth 200
+"""
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.database import AsyncSessionLocal
+from app.services.question_bank_service import question_bank_service
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Top up the precomputed MCQ question bank")
+    parser.add_argument("--depth", type=int, help="Override QUESTION_BANK_TARGET_DEPTH")
+    args = parser.parse_args()
+
+    if args.depth:
+        question_bank_service.target_depth = args.depth
+
+    print(f"🔄 Refilling question bank to {question_bank_service.target_depth} per subject/difficulty...")
+    added = await question_bank_service.refill_all()
+    print(f"✅ Added {added} questions")
+
+    async with AsyncSessionLocal() as db:
+        levels = await question_bank_service.stock_levels(db)
+    for (subject, difficulty), count in sorted(levels.items(), key=lambda item: (item[0][0].value, item[0][1].value)):
+        print(f"   {subject.value}/{difficulty.value}: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
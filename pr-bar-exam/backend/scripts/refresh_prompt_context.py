@@ -0,0 +1,37 @@
+"""
+Essay prompt context refresh script.
+Recomputes the precomputed retrieval context of every essay prompt whose
+subject's corpus (or embedding model) changed since it was computed. Run it
+after ingesting materials so the next submissions don't pay for the refresh.
+
+Usage:
+    python scripts/refresh_prompt_context.py
+    python scripts/refresh_prompt_context.py --subject familia
+"""
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.database import AsyncSessionLocal
+from app.models.models import SubjectEnum
+from app.services.prompt_context_service import prompt_context_service
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Refresh stale essay prompt retrieval context")
+    parser.add_argument("--subject", choices=[s.value for s in SubjectEnum], help="Only this subject")
+    args = parser.parse_args()
+
+    subject = SubjectEnum(args.subject) if args.subject else None
+    print(f"🔄 Refreshing essay prompt context{f' for {subject.value}' if subject else ''}...")
+    async with AsyncSessionLocal() as db:
+        refreshed = await prompt_context_service.refresh_stale(db, subject)
+    print(f"✅ Refreshed {refreshed} essay prompts")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -23,17 +23,101 @@ CREATE TABLE IF NOT EXISTS bll_rules (
 );
 
 -- Document Chunks (for RAG embeddings)
+-- List-partitioned by subject so each retrieval scans one subject's
+-- partition and its own vector index.
+-- Existing unpartitioned tables: python scripts/partition_document_chunks.py
 CREATE TABLE IF NOT EXISTS document_chunks (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     subject TEXT NOT NULL,
     chunk_text TEXT NOT NULL,
     page_number INTEGER,
     source_file TEXT,
     embedding vector(1536),
+    embedding_model TEXT,
+    -- Second slot, backfilled during an embedding model upgrade
+    embedding_alt vector(1536),
+    embedding_alt_model TEXT,
     metadata JSONB DEFAULT '{}',
-    created_at TIMESTAMPTZ DEFAULT NOW()
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (id, subject)
+) PARTITION BY LIST (subject);
+
+-- Existing tables: add the model tag and second embedding slot
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_alt vector(1536);
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_alt_model TEXT;
+
+-- Partitions, only if document_chunks is partitioned: on an existing install
+-- the CREATE TABLE above is a no-op and the table stays unpartitioned until
+-- scripts/partition_document_chunks.py converts it, so this stays re-runnable.
+DO $$
+DECLARE
+    subject_name TEXT;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'document_chunks' AND c.relnamespace = 'public'::regnamespace
+    ) THEN
+        RAISE NOTICE 'document_chunks is not partitioned; run scripts/partition_document_chunks.py to convert it';
+        RETURN;
+    END IF;
+
+    FOREACH subject_name IN ARRAY ARRAY[
+        'familia', 'sucesiones', 'reales', 'hipoteca', 'obligaciones',
+        'etica', 'constitucional', 'administrativo', 'danos', 'penal',
+        'proc_penal', 'evidencia', 'proc_civil'
+    ] LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF document_chunks FOR VALUES IN (%L)',
+            'document_chunks_' || subject_name, subject_name
+        );
+    END LOOP;
+    CREATE TABLE IF NOT EXISTS document_chunks_default PARTITION OF document_chunks DEFAULT;
+END $$;
+
+-- Corpus Versions (bumped on every ingestion/deletion; keys retrieval caches)
+CREATE TABLE IF NOT EXISTS corpus_versions (
+    subject TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Embedding Versions (which slot/model retrieval uses per subject; no row =
+-- `embedding` with OPENAI_EMBEDDING_MODEL). Upgrade with:
+-- python scripts/backfill_embeddings.py
+CREATE TABLE IF NOT EXISTS embedding_versions (
+    subject TEXT PRIMARY KEY,
+    active_column TEXT NOT NULL DEFAULT 'embedding'
+        CHECK (active_column IN ('embedding', 'embedding_alt')),
+    active_model TEXT NOT NULL,
+    target_model TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Grade Cache (identical essay resubmissions; keyed by a hash that includes
+-- the subject's corpus version, so new materials invalidate old grades, and
+-- the grading model; fallback_key omits the model, for degraded grading)
+CREATE TABLE IF NOT EXISTS grade_cache (
+    cache_key TEXT PRIMARY KEY,
+    fallback_key TEXT,
+    subject TEXT NOT NULL,
+    corpus_version BIGINT NOT NULL,
+    model TEXT NOT NULL,
+    grade JSONB NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ
+);
+
+ALTER TABLE grade_cache ADD COLUMN IF NOT EXISTS fallback_key TEXT;
+
+CREATE INDEX IF NOT EXISTS grade_cache_subject_version_idx
+    ON grade_cache (subject, corpus_version);
+
+CREATE INDEX IF NOT EXISTS grade_cache_fallback_key_idx
+    ON grade_cache (fallback_key);
+
 -- Study Materials (PDFs)
 CREATE TABLE IF NOT EXISTS study_materials (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -144,10 +228,18 @@ CREATE TABLE IF NOT EXISTS chat_messages (
 -- INDEXES
 -- ==============================================
 
--- Vector similarity search index
+-- Vector similarity search index (created on every partition)
+-- HNSW needs no training data, so it can be built on an empty table.
+-- Rebuild/retune online with: python scripts/rebuild_vector_index.py
 CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx 
-ON document_chunks USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Same for the second slot; NULL embeddings aren't indexed, so it costs
+-- nothing until a backfill starts writing to it
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_alt_idx
+ON document_chunks USING hnsw (embedding_alt vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- Performance indexes
 CREATE INDEX IF NOT EXISTS idx_bll_rules_subject ON bll_rules(subject);
@@ -206,6 +298,23 @@ BEGIN
 END;
 $$;
 
+-- Bump a subject's corpus version (call after ingesting or deleting chunks)
+CREATE OR REPLACE FUNCTION bump_corpus_version(subject_input TEXT)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    INSERT INTO corpus_versions (subject, version)
+    VALUES (subject_input, 1)
+    ON CONFLICT (subject) DO UPDATE
+    SET version = corpus_versions.version + 1, updated_at = NOW()
+    RETURNING version INTO new_version;
+    RETURN new_version;
+END;
+$$;
+
 -- ==============================================
 -- ROW LEVEL SECURITY (RLS)
 -- ==============================================
@@ -0,0 +1,103 @@
+"""Tests for coverage-aware chunk sampling."""
+import asyncio
+import random
+from types import SimpleNamespace
+
+from app.models.models import SubjectEnum
+from app.services import chunk_sampler as sampler_module
+from app.services.chunk_sampler import ChunkSampler, SubjectChunkIndex
+
+
+def _layout(materials=2, pages=5, chunks_per_page=3):
+    """(id, material_id, page_number) rows in corpus order."""
+    rows = []
+    for material in range(materials):
+        for page in range(1, pages + 1):
+            for _ in range(chunks_per_page):
+                rows.append((len(rows) + 1, material, page))
+    return rows
+
+
+def test_index_records_page_boundaries():
+    index = SubjectChunkIndex(1, _layout(materials=2, pages=2, chunks_per_page=2))
+    assert index.ids == list(range(1, 9))
+    assert index.page_starts == [0, 2, 4, 6, 8]
+    assert index.pages == 4
+
+
+def test_sample_fewer_than_pages_takes_one_chunk_per_evenly_spaced_page():
+    rows = _layout()
+    page_of = {chunk_id: (material, page) for chunk_id, material, page in rows}
+    index = SubjectChunkIndex(1, rows)
+
+    for seed in range(20):
+        ids = index.sample(5, random.Random(seed))
+        pages = [page_of[chunk_id] for chunk_id in ids]
+        assert len(set(pages)) == 5
+        # Every other page of the 10, so both materials are covered
+        assert {material for material, _ in pages} == {0, 1}
+        assert ids == sorted(ids)
+
+
+def test_sample_more_than_pages_spreads_over_chunks():
+    index = SubjectChunkIndex(1, _layout())
+    ids = index.sample(15, random.Random(0))
+    assert len(set(ids)) == 15
+    gaps = [b - a for a, b in zip(ids, ids[1:])]
+    assert set(gaps) == {2}
+
+
+def test_sample_everything_when_k_covers_the_subject():
+    index = SubjectChunkIndex(1, _layout(pages=1))
+    assert index.sample(100, random.Random(0)) == index.ids
+    assert SubjectChunkIndex(1, []).sample(3, random.Random(0)) == []
+
+
+def test_random_offset_moves_the_sample():
+    index = SubjectChunkIndex(1, _layout(pages=50))
+    samples = {tuple(index.sample(5, random.Random(seed))) for seed in range(10)}
+    assert len(samples) > 1
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeAsyncSession:
+    def __init__(self, layout):
+        self.layout = layout
+        self.layout_reads = 0
+
+    async def execute(self, statement, params):
+        if "ids" in params:
+            return FakeResult([SimpleNamespace(id=chunk_id, chunk_text=f"text {chunk_id}") for chunk_id in params["ids"]])
+        self.layout_reads += 1
+        return FakeResult(self.layout)
+
+
+def test_index_is_rebuilt_when_the_corpus_version_changes(monkeypatch):
+    version = {"value": 1}
+
+    async def get_version_async(db, subject):
+        return version["value"]
+
+    monkeypatch.setattr(sampler_module.corpus_service, "get_version_async", get_version_async)
+    sampler = ChunkSampler()
+    db = FakeAsyncSession(_layout(materials=1, pages=4, chunks_per_page=1))
+
+    async def run():
+        first = await sampler.sample_async(db, SubjectEnum.FAMILIA, 2)
+        await sampler.sample_async(db, SubjectEnum.FAMILIA, 2)
+        assert db.layout_reads == 1
+        version["value"] = 2
+        await sampler.sample_async(db, SubjectEnum.FAMILIA, 2)
+        assert db.layout_reads == 2
+        return first
+
+    texts = asyncio.run(run())
+    assert len(texts) == 2 and all(text.startswith("text ") for text in texts)
+    assert sampler.stats() == {"familia": {"version": 2, "chunks": 4, "pages": 4}}
@@ -0,0 +1,118 @@
+"""Tests for per-model circuit breakers."""
+import pytest
+
+from app.services import circuit_breaker as breaker_module
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module.time, "monotonic", clock.monotonic)
+    for name, value in {
+        "CIRCUIT_WINDOW_SECONDS": 30.0,
+        "CIRCUIT_MIN_CALLS": 4,
+        "CIRCUIT_ERROR_RATE": 0.5,
+        "CIRCUIT_SLOW_CALL_SECONDS": 10.0,
+        "CIRCUIT_SLOW_RATE": 0.5,
+        "CIRCUIT_OPEN_SECONDS": 30.0,
+    }.items():
+        monkeypatch.setattr(breaker_module.settings, name, value)
+    return clock
+
+
+def _calls(breaker, outcomes):
+    for failed, latency in outcomes:
+        breaker.before_call()
+        breaker.record(failed, latency)
+
+
+def _opened(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(True, None)] * 4)
+    assert breaker.state == OPEN
+    clock.now += 31
+    return breaker
+
+
+def test_no_decision_before_min_calls(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(True, None)] * 3)
+    assert breaker.state == CLOSED
+
+
+def test_error_rate_opens_the_circuit(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(False, 1.0), (True, None), (False, 1.0), (True, None)])
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_in == pytest.approx(30.0)
+    assert breaker.is_open()
+
+
+def test_slow_calls_open_the_circuit(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(False, 1.0), (False, 11.0), (False, 1.0), (False, 12.0)])
+    assert breaker.state == OPEN
+
+
+def test_neutral_outcomes_are_not_counted(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(None, None)] * 10)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = CircuitBreaker("m")
+    _calls(breaker, [(True, None)] * 3)
+    clock.now += 31
+    _calls(breaker, [(False, 1.0)])
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_half_open_admits_a_single_probe(clock):
+    breaker = _opened(clock)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    # ensure_closed doesn't take the probe slot and doesn't refuse while half-open
+    breaker.ensure_closed()
+
+
+def test_fast_successful_probe_closes_the_circuit(clock):
+    breaker = _opened(clock)
+    _calls(breaker, [(False, 1.0)])
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = _opened(clock)
+    _calls(breaker, [(True, None)])
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+
+
+def test_slow_probe_reopens_the_circuit(clock):
+    breaker = _opened(clock)
+    _calls(breaker, [(False, 15.0)])
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+
+
+def test_neutral_probe_frees_the_probe_slot(clock):
+    breaker = _opened(clock)
+    _calls(breaker, [(None, None)])
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
@@ -0,0 +1,64 @@
+import re
+from app.services.context_packer import ContextPacker
+
+
+class WordEncoding:
+    """One token per word (with its trailing whitespace); decode inverts encode."""
+
+    def encode(self, text):
+        return re.findall(r"\S+\s*", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def sentences(count, words_per_sentence=5):
+    return " ".join(" ".join(["word"] * (words_per_sentence - 1) + ["end."]) for _ in range(count))
+
+
+def packer(min_chunk_tokens=5):
+    return ContextPacker(WordEncoding(), min_chunk_tokens=min_chunk_tokens)
+
+
+def test_chunks_that_fit_are_kept_whole():
+    chunks = [{"text": sentences(2)}, {"text": sentences(2)}]
+    packed = packer().pack(chunks, budget=100, separator=" ")
+    assert packed["chunks"] == chunks
+    assert packed["token_count"] == 20
+    assert not packed["trimmed"]
+
+
+def test_last_chunk_is_trimmed_at_a_sentence_boundary():
+    chunks = [{"text": sentences(2)}, {"text": sentences(4)}]
+    packed = packer().pack(chunks, budget=27, separator=" ")
+    assert packed["trimmed"]
+    assert packed["token_count"] <= 27
+    assert packed["text"].endswith("end.")
+    assert len(packed["chunks"]) == 2
+
+
+def test_header_larger_than_remaining_budget_skips_chunk():
+    header = "header " * 30
+
+    def format_chunk(chunk, text):
+        return header + text if chunk.get("big_header") else text
+
+    chunks = [{"text": sentences(2)}, {"text": sentences(4), "big_header": True}, {"text": sentences(1)}]
+    packed = packer().pack(chunks, budget=25, format_chunk=format_chunk, separator=" ")
+    assert packed["token_count"] <= 25
+    assert chunks[1] not in packed["chunks"]
+    assert chunks[2] in packed["chunks"]
+
+
+def test_trim_rejects_non_positive_budget():
+    assert packer().trim_to_sentences(sentences(3), 0) is None
+    assert packer().trim_to_sentences(sentences(3), -4) is None
+    assert packer().trim_to_sentences("no sentence end here at all", 3) is None
+
+
+def test_budget_is_never_exceeded():
+    chunks = [{"text": sentences(n)} for n in (3, 1, 5, 2, 7)]
+    for budget in range(0, 80, 3):
+        packed = packer().pack(chunks, budget=budget, format_chunk=lambda c, t: "[src] " + t)
+        assert packed["token_count"] <= budget
+        assert packer().count_tokens(packed["text"]) <= budget
@@ -0,0 +1,13 @@
+from app.core.database import sync_database_url
+from app.models.models import SubjectEnum, subject_value
+
+
+def test_sync_database_url_normalizes_async_and_heroku_urls():
+    assert sync_database_url("postgres://u:p@h/db") == "postgresql://u:p@h/db"
+    assert sync_database_url("postgresql+asyncpg://u:p@h/db") == "postgresql://u:p@h/db"
+    assert sync_database_url("postgresql://u:p@h/db") == "postgresql://u:p@h/db"
+
+
+def test_subject_value_accepts_enum_or_string():
+    assert subject_value(SubjectEnum.FAMILIA) == "familia"
+    assert subject_value("penal") == "penal"
@@ -0,0 +1,156 @@
+"""Tests for deferred essay grading."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+from sqlalchemy.dialects import postgresql
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.services import deferred_grading_service as deferred_module
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.deferred_grading_service import DeferredGradingService, DEFERRED, FAILED
+
+
+def _essay(essay_id, **feedback):
+    return SimpleNamespace(
+        id=essay_id, user_id=1, prompt_id=None, essay_text="text", score=None, graded_at=None,
+        feedback={"status": DEFERRED, "subject": "familia", "prompt": "p", **feedback}
+    )
+
+
+class Nested:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    """Hands out `essays` to _claim, skipping ids the query excludes."""
+
+    def __init__(self, essays):
+        self.essays = essays
+        self.queries = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query):
+        self.queries.append(query)
+        params = query.compile(dialect=postgresql.dialect()).params
+        skip = set(next((value for key, value in params.items() if key.startswith("id_")), []))
+        pending = [essay for essay in self.essays if essay.id not in skip and essay.graded_at is None
+                   and essay.feedback.get("status") == DEFERRED]
+        return FakeResult(pending[0] if pending else None)
+
+    def begin_nested(self):
+        return Nested()
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = DeferredGradingService()
+    service.batch_size = 5
+    service.max_attempts = 2
+    monkeypatch.setattr(deferred_module.model_router, "available", lambda task: True)
+
+    async def update_progress(db, user_id, subject, score):
+        pass
+
+    monkeypatch.setattr(deferred_module, "update_essay_progress", update_progress)
+    return service
+
+
+def _run(service, monkeypatch, essays, grade):
+    db = FakeSession(essays)
+    monkeypatch.setattr(deferred_module, "AsyncSessionLocal", lambda: db)
+    monkeypatch.setattr(service, "_grade", grade)
+    return asyncio.run(service.grade_pending()), db
+
+
+def test_claim_locks_rows_with_skip_locked(service):
+    db = FakeSession([])
+    asyncio.run(service._claim(db, [3]))
+    sql = str(db.queries[0].compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "LIMIT" in sql
+    assert "NOT IN" in sql
+
+
+def test_unexpected_errors_are_retried_then_marked_failed(service, monkeypatch):
+    essay = _essay(1)
+
+    async def grade(db, essay, subject):
+        raise RuntimeError("boom")
+
+    graded, _ = _run(service, monkeypatch, [essay], grade)
+    assert graded == 0
+    assert essay.feedback["status"] == DEFERRED
+    assert essay.feedback["attempts"] == 1
+
+    _run(service, monkeypatch, [essay], grade)
+    assert essay.feedback["status"] == FAILED
+    assert essay.feedback["attempts"] == 2
+    assert essay.graded_at is not None
+
+
+def test_one_failing_essay_does_not_stop_the_batch(service, monkeypatch):
+    essays = [_essay(1), _essay(2)]
+
+    async def grade(db, essay, subject):
+        if essay.id == 1:
+            raise RuntimeError("boom")
+        return {"overall_score": 75}
+
+    graded, db = _run(service, monkeypatch, essays, grade)
+    assert graded == 1
+    assert essays[1].score == 75
+    assert db.commits == 2
+
+
+def test_value_errors_fail_immediately(service, monkeypatch):
+    essay = _essay(1)
+
+    async def grade(db, essay, subject):
+        raise ValueError("No reference materials")
+
+    _run(service, monkeypatch, [essay], grade)
+    assert essay.feedback["status"] == FAILED
+    assert essay.feedback["error"] == "No reference materials"
+
+
+def test_open_circuit_stops_the_pass(service, monkeypatch):
+    essays = [_essay(1), _essay(2)]
+
+    async def grade(db, essay, subject):
+        raise CircuitOpenError("m", 30)
+
+    graded, db = _run(service, monkeypatch, essays, grade)
+    assert graded == 0
+    assert db.rollbacks == 1
+    assert all(essay.feedback["status"] == DEFERRED and "attempts" not in essay.feedback for essay in essays)
@@ -0,0 +1,131 @@
+"""Tests for grade cache keys and stored values."""
+import asyncio
+import json
+
+from app.models.models import SubjectEnum
+import pytest
+
+from app.services.grade_cache_service import GradeCacheService, grade_cache_service, normalize_text, _grade_value
+
+BASE = {
+    "essay_content": "El contrato es nulo.",
+    "prompt": "Analice el contrato.",
+    "subject": SubjectEnum.FAMILIA,
+    "corpus_version": 3,
+    "model": "gpt-4o-mini",
+    "rubric_items": ["Capacidad", "Consentimiento"],
+}
+
+
+def _key(**changes):
+    return grade_cache_service.make_key(**{**BASE, **changes})
+
+
+def test_normalize_text_collapses_whitespace_and_unicode_forms():
+    assert normalize_text("  El\tcontrato\n\nes  nulo ") == "El contrato es nulo"
+    # Decomposed "ó" (o + combining acute) matches the composed form
+    assert normalize_text("Co\u0301digo") == normalize_text("C\u00f3digo")
+    assert normalize_text("Codigo") != normalize_text("C\u00f3digo")
+
+
+def test_trivial_resubmission_edits_hit_the_same_key():
+    assert _key() == _key(essay_content="El  contrato\nes nulo.  ", prompt=" Analice el contrato.")
+
+
+def test_every_grade_input_changes_the_key():
+    key = _key()
+    for changes in [
+        {"essay_content": "El contrato es válido."},
+        {"prompt": "Analice la capacidad."},
+        {"subject": SubjectEnum.SUCESIONES},
+        {"corpus_version": 4},
+        {"model": "gpt-4o"},
+        {"rubric_items": ["Capacidad"]},
+        {"rubric_items": ["Consentimiento", "Capacidad"]},
+    ]:
+        assert _key(**changes) != key, changes
+
+
+def test_fallback_key_is_shared_across_models_but_not_submissions():
+    fallback = grade_cache_service.make_fallback_key(**{k: v for k, v in BASE.items() if k != "model"})
+    assert fallback not in (_key(), _key(model="gpt-4o"))
+    assert fallback != grade_cache_service.make_fallback_key(
+        **{**{k: v for k, v in BASE.items() if k != "model"}, "corpus_version": 4}
+    )
+
+
+def test_missing_and_empty_rubrics_share_a_key():
+    assert _key(rubric_items=None) == _key(rubric_items=[])
+
+
+def test_grade_value_accepts_decoded_and_text_json():
+    grade = {"overall_score": 80}
+    assert _grade_value(grade) == grade
+    assert _grade_value(json.dumps(grade)) == grade
+    assert _grade_value(None) is None
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeAsyncSession:
+    def __init__(self, value=None, fail=False):
+        self.value = value
+        self.fail = fail
+        self.executed = []
+        self.commits = 0
+
+    async def execute(self, statement, params):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        self.executed.append(params)
+        return FakeResult(self.value)
+
+    async def commit(self):
+        self.commits += 1
+
+
+def test_set_async_stores_grade_as_json():
+    db = FakeAsyncSession()
+    asyncio.run(grade_cache_service.set_async(db, "k", "f", SubjectEnum.FAMILIA, "m", 2, {"overall_score": 70}))
+    assert db.executed == [{
+        "cache_key": "k", "fallback_key": "f", "subject": "familia", "corpus_version": 2, "model": "m",
+        "grade": json.dumps({"overall_score": 70})
+    }]
+
+
+def test_get_async_returns_cached_grade():
+    db = FakeAsyncSession({"overall_score": 70})
+    assert asyncio.run(grade_cache_service.get_async(db, "k")) == {"overall_score": 70}
+    assert db.executed == [{"cache_key": "k"}]
+
+
+def test_hits_are_counted_in_memory_and_flushed_in_one_batch():
+    service = GradeCacheService()
+    hit, miss = FakeAsyncSession({"overall_score": 70}), FakeAsyncSession()
+    for key in ["b", "a", "b"]:
+        asyncio.run(service.get_async(hit, key))
+    asyncio.run(service.get_async(miss, "c"))
+
+    db = FakeAsyncSession()
+    assert asyncio.run(service.flush_hits(db)) == 2
+    assert db.executed == [{"cache_keys": ["a", "b"], "hits": [1, 2]}]
+    assert db.commits == 1
+    # Nothing left to write
+    assert asyncio.run(service.flush_hits(FakeAsyncSession())) == 0
+
+
+def test_failed_flush_keeps_hit_counts():
+    service = GradeCacheService()
+    asyncio.run(service.get_async(FakeAsyncSession({"overall_score": 70}), "a"))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.flush_hits(FakeAsyncSession(fail=True)))
+    db = FakeAsyncSession()
+    asyncio.run(service.flush_hits(db))
+    assert db.executed == [{"cache_keys": ["a"], "hits": [1]}]
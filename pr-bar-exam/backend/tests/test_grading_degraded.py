@@ -0,0 +1,85 @@
+"""Tests for grading while the routed grading model's circuit is open."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.models.models import SubjectEnum
+from app.services import rag_service as rag_module
+from app.services.circuit_breaker import CircuitBreakers, CircuitOpenError
+from app.services.rag_service import async_rag_service
+
+
+@pytest.fixture
+def grading(monkeypatch):
+    stored = {}
+    breakers = CircuitBreakers()
+
+    async def get_version_async(db, subject):
+        return 7
+
+    async def get_async(db, cache_key):
+        return stored.get(cache_key)
+
+    async def get_fallback_async(db, fallback_key):
+        return stored.get(("fallback", fallback_key))
+
+    monkeypatch.setattr(rag_module.settings, "GRADE_CACHE_ENABLED", True)
+    monkeypatch.setattr(rag_module.corpus_service, "get_version_async", get_version_async)
+    monkeypatch.setattr(rag_module.grade_cache_service, "get_async", get_async)
+    monkeypatch.setattr(rag_module.grade_cache_service, "get_fallback_async", get_fallback_async)
+    monkeypatch.setattr(rag_module, "circuit_breakers", breakers)
+    monkeypatch.setattr(async_rag_service, "_grading_model", lambda essay, prompt: "routed-model")
+    # Open the routed model's circuit
+    breakers.get("routed-model")._open(time.monotonic(), "test")
+    return stored
+
+
+def _grade():
+    return asyncio.run(async_rag_service.grade_essay(None, "Essay text.", SubjectEnum.FAMILIA, "Prompt."))
+
+
+def test_cached_grade_from_another_model_is_served_while_circuit_is_open(grading):
+    key = rag_module.grade_cache_service.make_fallback_key("Essay text.", "Prompt.", SubjectEnum.FAMILIA, 7)
+    grading[("fallback", key)] = {"overall_score": 88, "model": "other-model"}
+    assert _grade() == {"overall_score": 88, "model": "other-model"}
+
+
+def test_grade_from_another_model_is_not_served_while_routed_model_is_up(grading, monkeypatch):
+    key = rag_module.grade_cache_service.make_fallback_key("Essay text.", "Prompt.", SubjectEnum.FAMILIA, 7)
+    grading[("fallback", key)] = {"overall_score": 88, "model": "other-model"}
+    # A closed circuit for the routed model
+    monkeypatch.setattr(rag_module, "circuit_breakers", CircuitBreakers())
+
+    async def grading_prompt(*args, **kwargs):
+        return "Grade this."
+
+    async def chat_completion(**request):
+        content = '{"overall_score": 75}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def set_async(*args):
+        pass
+
+    monkeypatch.setattr(async_rag_service, "_grading_prompt", grading_prompt)
+    monkeypatch.setattr(async_rag_service, "_chat_completion", chat_completion)
+    monkeypatch.setattr(rag_module.grade_cache_service, "set_async", set_async)
+    assert _grade() == {"overall_score": 75, "model": "routed-model"}
+
+
+def test_grade_by_the_routed_model_is_a_normal_hit(grading):
+    key = rag_module.grade_cache_service.make_key("Essay text.", "Prompt.", SubjectEnum.FAMILIA, 7, "routed-model")
+    grading[key] = {"overall_score": 90, "model": "routed-model"}
+    assert _grade() == {"overall_score": 90, "model": "routed-model"}
+
+
+def test_cache_miss_fails_fast_while_circuit_is_open(grading):
+    with pytest.raises(CircuitOpenError):
+        _grade()
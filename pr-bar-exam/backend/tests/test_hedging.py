@@ -0,0 +1,128 @@
+"""Tests for hedged OpenAI calls."""
+import asyncio
+import time
+
+import pytest
+
+from app.services import hedging as hedging_module
+from app.services.hedging import Hedger, MAX_HEDGE_CREDIT
+
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_PERCENTILE", 0.95)
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_MIN_DELAY", 0.01)
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_BUDGET", 1.0)
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_MIN_SAMPLES", 5)
+
+
+@pytest.fixture
+def hedges(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(
+        hedging_module.llm_metrics, "record_hedge",
+        lambda kind, hedged, hedge_won: recorded.append((hedged, hedge_won))
+    )
+    return recorded
+
+
+def _warmed(latency=0.02):
+    hedger = Hedger("test")
+    for _ in range(5):
+        hedger._observe(latency)
+    return hedger
+
+
+def test_no_delay_until_enough_samples():
+    hedger = Hedger("test")
+    for _ in range(4):
+        hedger._observe(1.0)
+    assert hedger.delay() is None
+    hedger._observe(1.0)
+    assert hedger.delay() == 1.0
+
+
+def test_delay_has_a_floor():
+    assert _warmed(latency=0.001).delay() == 0.01
+
+
+def test_budget_caps_hedges(monkeypatch):
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_BUDGET", 0.5)
+    hedger = Hedger("test")
+    hedger._earn()
+    assert not hedger._take_budget()
+    hedger._earn()
+    assert hedger._take_budget()
+    for _ in range(100):
+        hedger._earn()
+    assert hedger._credit == MAX_HEDGE_CREDIT
+
+
+def test_disabled_hedger_calls_once(monkeypatch, hedges):
+    monkeypatch.setattr(hedging_module.settings, "HEDGE_ENABLED", False)
+    assert _warmed().call(lambda: "ok") == "ok"
+    assert hedges == []
+
+
+def test_slow_sync_call_is_hedged_and_the_hedge_wins(hedges):
+    hedger = _warmed()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.3)
+            return "slow"
+        return "fast"
+
+    assert hedger.call(fn) == "fast"
+    assert hedges == [(True, True)]
+
+
+def test_slow_async_call_is_hedged_and_the_loser_cancelled(hedges):
+    hedger = _warmed()
+    calls = []
+    cancelled = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "slow"
+        return "fast"
+
+    async def run():
+        result = await hedger.call_async(fn)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "fast"
+    assert cancelled == [1]
+    assert hedges == [(True, True)]
+
+
+def test_fast_call_is_not_hedged(hedges):
+    hedger = _warmed(latency=0.5)
+
+    async def fn():
+        return "ok"
+
+    assert asyncio.run(hedger.call_async(fn)) == "ok"
+    assert hedges == [(False, False)]
+
+
+def test_error_is_raised_when_every_attempt_fails(hedges):
+    hedger = _warmed()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream failed")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hedger.call_async(fn))
+    assert hedges == [(True, False)]
@@ -0,0 +1,106 @@
+"""Tests for the vector index health report and its metrics export."""
+import asyncio
+from types import SimpleNamespace
+
+from app.services import index_health_service as module
+from app.services.index_health_service import (
+    IndexHealthService,
+    RetrievalStats,
+    recommended_ivfflat_lists,
+)
+
+
+def _index_row(**overrides):
+    row = dict(
+        table_name="document_chunks_familia", index_name="document_chunks_familia_embedding_idx",
+        index_type="hnsw", index_bytes=8192, is_valid=True, options="m=16,ef_construction=64",
+        live_tuples=50_000, dead_tuples=0, last_vacuum=None
+    )
+    row.update(overrides)
+    return SimpleNamespace(**row)
+
+
+def test_recommended_ivfflat_lists_follows_pgvector_guidance():
+    assert recommended_ivfflat_lists(0) == 1
+    assert recommended_ivfflat_lists(200_000) == 200
+    assert recommended_ivfflat_lists(4_000_000) == 2000
+
+
+def test_healthy_index_is_not_flagged():
+    health = IndexHealthService()._index_health(_index_row())
+    assert health["reindex_recommended"] is False
+    assert health["reasons"] == []
+    assert health["lists"] is None
+
+
+def test_invalid_and_bloated_index_is_flagged():
+    health = IndexHealthService()._index_health(_index_row(is_valid=False, live_tuples=600, dead_tuples=400))
+    assert health["dead_tuple_ratio"] == 0.4
+    assert health["reindex_recommended"] is True
+    assert len(health["reasons"]) == 2
+
+
+def test_ivfflat_built_on_small_table_is_flagged_once_it_grows():
+    service = IndexHealthService()
+    grown = service._index_health(_index_row(index_type="ivfflat", options="lists=10", live_tuples=100_000))
+    assert grown["lists"] == 10
+    assert grown["recommended_lists"] == 100
+    assert grown["list_imbalance"] == 10
+    assert grown["reindex_recommended"] is True
+
+    # Too few rows for ivfflat sizing to matter
+    small = service._index_health(_index_row(index_type="ivfflat", options="lists=100", live_tuples=5_000))
+    assert small["reindex_recommended"] is False
+
+
+def test_retrieval_stats_average_per_subject():
+    stats = RetrievalStats()
+    stats.record("familia", [0.1, 0.3])
+    stats.record("familia", [0.3, 0.5])
+    stats.record("penal", [])
+
+    snapshot = stats.snapshot()
+    assert set(snapshot) == {"familia"}
+    assert snapshot["familia"]["retrievals"] == 2
+    assert abs(snapshot["familia"]["avg_distance"] - 0.3) < 1e-9
+    assert abs(snapshot["familia"]["avg_top1_distance"] - 0.2) < 1e-9
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    async def execute(self, statement, params=None):
+        if statement is module.CORPUS_STATS:
+            return _Result([
+                SimpleNamespace(subject="familia", chunks=120, embedding_nulls=3),
+                SimpleNamespace(subject="penal", chunks=40, embedding_nulls=0),
+            ])
+        return _Result([_index_row(), _index_row(index_name="document_chunks_penal_embedding_idx", is_valid=False)])
+
+
+def test_report_and_prometheus_export(monkeypatch):
+    stats = RetrievalStats()
+    stats.record("familia", [0.2, 0.4])
+    monkeypatch.setattr(module, "retrieval_stats", stats)
+    service = IndexHealthService()
+
+    report = asyncio.run(service.report(FakeSession()))
+    assert report["reindex_recommended"] is True
+    familia, penal = report["subjects"]
+    assert familia["retrievals"] == 1 and abs(familia["avg_retrieval_distance"] - 0.3) < 1e-9
+    assert penal["retrievals"] == 0 and penal["avg_retrieval_distance"] is None
+
+    metrics = service.to_prometheus(report)
+    assert "# TYPE barprep_document_chunks gauge" in metrics
+    assert 'barprep_document_chunks{subject="familia"} 120' in metrics
+    assert 'barprep_vector_index_reindex_recommended{index="document_chunks_penal_embedding_idx"} 1' in metrics
+    # Missing values are left out rather than exported as None
+    assert 'barprep_retrieval_avg_distance{subject="penal"}' not in metrics
+    assert 'barprep_vector_index_list_imbalance{' not in metrics
+    assert metrics.endswith("\n")
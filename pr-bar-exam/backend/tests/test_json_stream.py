@@ -0,0 +1,72 @@
+"""Tests for the incremental JSON object parser."""
+import json
+
+import pytest
+
+from app.services.json_stream import JSONObjectStream
+
+DOCUMENT = {
+    "overall_score": 85.5,
+    "feedback": "Good \"issue\" spotting, weak on {remedies}.",
+    "point_breakdown": {"strengths": ["rule", "analysis"], "weaknesses": []},
+    "citations": [{"source": "Código Civil", "page": 12}, {"source": "Caso", "page": None}],
+    "passed": True
+}
+
+
+def _feed_all(text, chunk_size, **kwargs):
+    stream = JSONObjectStream(**kwargs)
+    events = []
+    for start in range(0, len(text), chunk_size):
+        events.extend(stream.feed(text[start:start + chunk_size]))
+    return stream, events
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_events_do_not_depend_on_chunking(chunk_size):
+    stream, events = _feed_all(json.dumps(DOCUMENT, ensure_ascii=False), chunk_size)
+
+    assert stream.done
+    assert stream.result == DOCUMENT
+    assert events == [
+        (("overall_score",), 85.5),
+        (("feedback",), DOCUMENT["feedback"]),
+        (("point_breakdown", "strengths"), ["rule", "analysis"]),
+        (("point_breakdown", "weaknesses"), []),
+        (("point_breakdown",), DOCUMENT["point_breakdown"]),
+        (("citations", 0), DOCUMENT["citations"][0]),
+        (("citations", 1), DOCUMENT["citations"][1]),
+        (("citations",), DOCUMENT["citations"]),
+        (("passed",), True),
+    ]
+
+
+def test_value_is_reported_as_soon_as_it_is_complete():
+    stream = JSONObjectStream()
+    assert stream.feed('{"overall_score": 9') == []
+    # A number is only complete once a delimiter follows it
+    assert stream.feed("0,") == [(("overall_score",), 90)]
+    assert stream.feed(' "feedback": "ok') == []
+    assert stream.feed('"') == [(("feedback",), "ok")]
+    assert not stream.done
+
+
+def test_max_depth_limits_reported_paths():
+    _, events = _feed_all(json.dumps(DOCUMENT), 5, max_depth=1)
+    assert [path for path, _ in events] == [
+        ("overall_score",), ("feedback",), ("point_breakdown",), ("citations",), ("passed",)
+    ]
+
+
+def test_text_around_the_object_is_ignored():
+    stream = JSONObjectStream()
+    events = stream.feed('```json\n{"a": [1, {"b": "}"}]}\n```')
+    assert stream.result == {"a": [1, {"b": "}"}]}
+    assert events == [(("a", 0), 1), (("a", 1), {"b": "}"}), (("a",), [1, {"b": "}"}])]
+
+
+def test_escaped_quotes_and_backslashes_in_keys_and_values():
+    text = json.dumps({'say "hi"': "a\\", "next": "b"})
+    stream, events = _feed_all(text, 2)
+    assert stream.result == {'say "hi"': "a\\", "next": "b"}
+    assert events == [(('say "hi"',), "a\\"), (("next",), "b")]
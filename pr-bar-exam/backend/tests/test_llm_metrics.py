@@ -0,0 +1,101 @@
+"""Tests for LLM usage accounting."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import llm_metrics as metrics_module
+from app.services.llm_metrics import LLMMetrics, call_cost, set_request_tags, reset_request_tags, _percentile
+
+
+@pytest.fixture(autouse=True)
+def pricing(monkeypatch):
+    monkeypatch.setattr(metrics_module.settings, "OPENAI_PRICING", {"chat-model": {"prompt": 1.0, "completion": 2.0}})
+    monkeypatch.setattr(metrics_module.settings, "LLM_USAGE_LOG_ENABLED", False)
+
+
+@pytest.fixture
+def tagged():
+    token = set_request_tags("/api/essays/submit", "user-1")
+    yield
+    reset_request_tags(token)
+
+
+def _usage(prompt, completion):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion)
+
+
+def test_call_cost_uses_per_million_pricing():
+    assert call_cost("chat-model", 1_000_000, 500_000) == pytest.approx(2.0)
+    assert call_cost("unknown", 1000, 1000) == 0.0
+
+
+def test_percentile_uses_nearest_rank():
+    assert _percentile([], 0.95) is None
+    assert _percentile(range(1, 101), 0.95) == 95
+    assert _percentile([3.0], 0.5) == 3.0
+
+
+def test_calls_are_aggregated_per_route_kind_and_model(tagged):
+    metrics = LLMMetrics()
+    metrics.record("chat", "chat-model", 1.0, 0, usage=_usage(100, 50))
+    metrics.record("chat", "chat-model", 3.0, 2, error="APITimeoutError")
+
+    (series,) = metrics.snapshot()["calls"]
+    assert series["route"] == "/api/essays/submit"
+    assert (series["calls"], series["errors"], series["retries"]) == (2, 1, 2)
+    assert (series["prompt_tokens"], series["completion_tokens"]) == (100, 50)
+    assert series["cost_usd"] == pytest.approx(200 / 1_000_000)
+    assert metrics.snapshot()["users"]["user-1"]["calls"] == 2
+
+
+def test_calls_outside_a_request_are_background():
+    metrics = LLMMetrics()
+    metrics.record("embedding", "chat-model", 0.1, 0)
+    assert metrics.snapshot()["calls"][0]["route"] == "background"
+    assert metrics.snapshot()["users"] == {}
+
+
+def test_streamed_tokens_add_usage_without_counting_a_call(tagged):
+    metrics = LLMMetrics()
+    metrics.record("chat", "chat-model", 2.0, 0)
+    metrics.record_tokens("chat", "chat-model", 10, 20)
+
+    (series,) = metrics.snapshot()["calls"]
+    assert series["calls"] == 1
+    assert (series["prompt_tokens"], series["completion_tokens"]) == (10, 20)
+
+
+def test_model_stats_exclude_failed_calls_from_latency():
+    metrics = LLMMetrics()
+    for latency in (1.0, 2.0, 3.0):
+        metrics.record("chat", "chat-model", latency, 0)
+    metrics.record("chat", "chat-model", 100.0, 0, error="InternalServerError")
+
+    stats = metrics.model_stats("chat-model")
+    assert stats == {"calls": 4, "latency_p95": 3.0, "error_rate": 0.25}
+    assert metrics.model_stats("other") == {"calls": 0, "latency_p95": None, "error_rate": 0.0}
+
+
+def test_cache_and_hedge_outcomes_are_counted():
+    metrics = LLMMetrics()
+    metrics.record_cache("retrieval", True)
+    metrics.record_cache("retrieval", False)
+    metrics.record_hedge("embedding", hedged=True, hedge_won=True)
+    metrics.record_hedge("embedding", hedged=False, hedge_won=False)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["caches"] == [{"route": "background", "cache": "retrieval", "hits": 1, "misses": 1}]
+    assert snapshot["hedges"] == {"embedding": {"calls": 2, "hedged": 1, "hedge_wins": 1}}
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = LLMMetrics()
+    metrics.record("chat", "chat-model", 0.2, 0)
+    metrics.record("chat", "chat-model", 4.0, 0)
+    text = metrics.to_prometheus()
+
+    base = 'route="background",kind="chat",model="chat-model"'
+    assert f'barprep_llm_latency_seconds_bucket{{{base},le="0.25"}} 1' in text
+    assert f'barprep_llm_latency_seconds_bucket{{{base},le="5.0"}} 2' in text
+    assert f'barprep_llm_latency_seconds_bucket{{{base},le="+Inf"}} 2' in text
+    assert f"barprep_llm_calls_total{{{base}}} 2" in text
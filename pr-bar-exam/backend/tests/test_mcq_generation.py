@@ -0,0 +1,66 @@
+"""Tests for concurrent MCQ generation (RAGService._generate_mcqs)."""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.core.config import settings
+from app.models.models import SubjectEnum
+from app.services import rag_service as rag_module
+from app.services.rag_service import RAGService
+
+
+def _mcq(number):
+    return {
+        "question": f"Question {number}?",
+        "options": {"A": "a", "B": "b", "C": "c", "D": "d"},
+        "correct_answer": "A",
+        "explanation": "Because."
+    }
+
+
+def _response(items):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(items)))])
+
+
+def test_returns_once_enough_questions_arrive_without_waiting_for_slow_batches(monkeypatch):
+    monkeypatch.setattr(settings, "MCQ_QUESTIONS_PER_REQUEST", 5)
+    monkeypatch.setattr(settings, "MCQ_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(rag_module.chunk_sampler, "sample", lambda db, subject, count: ["chunk"] * count)
+    service = RAGService()
+    monkeypatch.setattr(service, "_mcq_request", lambda subject, size, difficulty, chunks, model: {"model": model})
+
+    release = threading.Event()
+    lock = threading.Lock()
+    calls = []
+
+    def chat_completion(priority=None, **request):
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        if first:
+            # One batch returns more than its share: enough for the whole quiz
+            return _response([_mcq(number) for number in range(10)])
+        release.wait(5)
+        return _response([])
+
+    monkeypatch.setattr(service, "_chat_completion", chat_completion)
+
+    started = time.monotonic()
+    try:
+        questions = service._generate_mcqs(None, SubjectEnum.FAMILIA, num_questions=10, model="gpt-test")
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+
+    assert len(questions) == 10
+    assert all(question["model"] == "gpt-test" for question in questions)
+    assert elapsed < 2
@@ -0,0 +1,32 @@
+import numpy as np
+from app.services.mmr import mmr_select, as_matrix
+
+
+def test_pure_relevance_orders_by_score():
+    embeddings = np.eye(4, dtype=np.float32)
+    assert mmr_select([0.2, 0.9, 0.5, 0.7], embeddings, 3, lambda_mult=1.0) == [1, 3, 2]
+
+
+def test_diversity_skips_near_duplicates():
+    # 0 and 1 are the same direction; 2 is orthogonal but less relevant
+    embeddings = np.array([[1, 0], [1, 0.01], [0, 1]], dtype=np.float32)
+    assert mmr_select([0.9, 0.89, 0.6], embeddings, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_k_is_capped_and_empty_input():
+    embeddings = np.eye(2, dtype=np.float32)
+    assert sorted(mmr_select([0.1, 0.2], embeddings, 5)) == [0, 1]
+    assert mmr_select([], np.zeros((0, 2)), 3) == []
+    assert mmr_select([0.1], np.eye(1), 0) == []
+
+
+def test_zero_vectors_do_not_divide_by_zero():
+    embeddings = np.array([[0, 0], [1, 0]], dtype=np.float32)
+    assert mmr_select([0.5, 0.4], embeddings, 2) == [0, 1]
+
+
+def test_as_matrix_accepts_pgvector_text():
+    matrix = as_matrix(["[0.5,1.0]", [0.25, 0.0], np.array([1.0, 2.0])])
+    assert matrix.shape == (3, 2)
+    assert matrix.dtype == np.float32
+    assert matrix[0].tolist() == [0.5, 1.0]
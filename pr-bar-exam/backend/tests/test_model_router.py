@@ -0,0 +1,90 @@
+"""Tests for latency-aware model routing."""
+import time
+
+import pytest
+
+from app.services import model_router as router_module
+from app.services.circuit_breaker import CircuitBreakers
+from app.services.model_router import ModelRouter, GRADING, MCQ
+
+ROUTES = {
+    GRADING: [{"model": "small", "max_input_tokens": 1000}, {"model": "large"}],
+    MCQ: [{"model": "small", "difficulties": ["easy", "medium"]}, {"model": "large"}],
+}
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = {}
+    breakers = CircuitBreakers()
+    monkeypatch.setattr(router_module.settings, "MODEL_ROUTES", ROUTES)
+    monkeypatch.setattr(router_module.settings, "MODEL_TARGET_LATENCY", {GRADING: 30.0, MCQ: 20.0})
+    monkeypatch.setattr(router_module.settings, "MODEL_ROUTING_MIN_SAMPLES", 20)
+    monkeypatch.setattr(router_module.settings, "MODEL_ROUTING_MAX_ERROR_RATE", 0.2)
+    monkeypatch.setattr(router_module, "circuit_breakers", breakers)
+    monkeypatch.setattr(
+        router_module.llm_metrics, "model_stats",
+        lambda model: stats.get(model, {"calls": 0, "latency_p95": None, "error_rate": 0.0})
+    )
+    stats["breakers"] = breakers
+    return stats
+
+
+def _open(stats, model):
+    stats["breakers"].get(model)._open(time.monotonic(), "test")
+
+
+def test_without_routes_uses_the_default_model(monkeypatch):
+    monkeypatch.setattr(router_module.settings, "MODEL_ROUTES", {})
+    monkeypatch.setattr(router_module.settings, "OPENAI_MODEL", "default")
+    assert ModelRouter().route(GRADING, input_tokens=10_000) == "default"
+
+
+def test_routes_on_input_size_and_difficulty(stats):
+    router = ModelRouter()
+    assert router.route(GRADING, input_tokens=500) == "small"
+    assert router.route(GRADING, input_tokens=5000) == "large"
+    assert router.route(MCQ, difficulty="easy") == "small"
+    assert router.route(MCQ, difficulty="hard") == "large"
+
+
+def test_too_few_samples_count_as_healthy(stats):
+    stats["small"] = {"calls": 5, "latency_p95": 100.0, "error_rate": 1.0}
+    assert ModelRouter().route(GRADING, input_tokens=500) == "small"
+
+
+@pytest.mark.parametrize("small_stats", [
+    {"calls": 50, "latency_p95": 45.0, "error_rate": 0.0},
+    {"calls": 50, "latency_p95": 5.0, "error_rate": 0.3},
+])
+def test_slow_or_failing_model_is_skipped(stats, small_stats):
+    stats["small"] = small_stats
+    assert ModelRouter().route(GRADING, input_tokens=500) == "large"
+
+
+def test_open_circuit_is_skipped(stats):
+    _open(stats, "small")
+    router = ModelRouter()
+    assert router.route(GRADING, input_tokens=500) == "large"
+    assert router.available(GRADING)
+
+
+def test_falls_back_to_fastest_available_model_ignoring_input_limits(stats):
+    stats["large"] = {"calls": 50, "latency_p95": 60.0, "error_rate": 0.0}
+    stats["small"] = {"calls": 50, "latency_p95": 40.0, "error_rate": 0.0}
+    # Only "large" admits this input, but it's unhealthy and slower than "small"
+    assert ModelRouter().route(GRADING, input_tokens=5000) == "small"
+
+
+def test_every_circuit_open(stats):
+    _open(stats, "small")
+    _open(stats, "large")
+    router = ModelRouter()
+    assert not router.available(GRADING)
+    assert router.route(GRADING, input_tokens=500) == "small"
+
+
+def test_stats_include_circuit_state(stats):
+    _open(stats, "large")
+    grading = ModelRouter().stats()[GRADING]
+    assert [(route["model"], route["circuit"]) for route in grading] == [("small", "closed"), ("large", "open")]
@@ -0,0 +1,221 @@
+"""Tests for the OpenAI limiter's token buckets, AIMD concurrency and streaming."""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services import openai_limiter as limiter_module
+from app.services.circuit_breaker import CircuitBreakers
+from app.services.openai_limiter import ModelBudget, OpenAILimiter, TokenBucket, BACKGROUND, INTERACTIVE
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _server_error():
+    return openai.InternalServerError("boom", response=httpx.Response(500, request=REQUEST), body=None)
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(limiter_module.settings, "OPENAI_INITIAL_CONCURRENCY", 8)
+    monkeypatch.setattr(limiter_module.settings, "OPENAI_MAX_CONCURRENCY", 64)
+    monkeypatch.setattr(limiter_module.settings, "OPENAI_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(limiter_module.settings, "OPENAI_MAX_RETRIES", 2)
+    monkeypatch.setattr(limiter_module, "circuit_breakers", CircuitBreakers())
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        limiter_module.llm_metrics, "record",
+        lambda kind, model, latency, retries, usage=None, error=None: calls.append((latency, retries, error))
+    )
+    return calls
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60, 0.0, bucket.updated) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, 0.0, bucket.updated) == pytest.approx(1.0)
+    assert bucket.wait_time(1, 0.0, bucket.updated + 1.0) == pytest.approx(0.0)
+
+
+def test_token_bucket_keeps_reserve_from_background_calls():
+    bucket = TokenBucket(per_minute=100)
+    bucket.take(75)
+    now = bucket.updated
+    # 25 left: interactive can take 10, background must leave 20 untouched
+    assert bucket.wait_time(10, 0.0, now) == 0
+    assert bucket.wait_time(10, 0.2, now) == pytest.approx(5 / (100 / 60))
+
+
+def test_token_bucket_refunds_are_capped():
+    bucket = TokenBucket(per_minute=10)
+    bucket.adjust(5)
+    assert bucket.level == 10
+    bucket.adjust(-4)
+    assert bucket.level == 6
+
+
+def test_background_priority_respects_reserve(monkeypatch):
+    monkeypatch.setattr(limiter_module.settings, "OPENAI_BACKGROUND_RESERVE", 0.5)
+    budget = ModelBudget("m", rpm=2, tpm=1000)
+    assert budget.try_acquire(10, BACKGROUND) == 0
+    assert budget.try_acquire(10, BACKGROUND) > 0
+    assert budget.try_acquire(10, INTERACTIVE) == 0
+
+
+def _acquired(budget):
+    assert budget.try_acquire(1, INTERACTIVE) == 0
+    return budget
+
+
+def test_successful_calls_increase_concurrency_additively():
+    budget = ModelBudget("m", rpm=1000, tpm=100000)
+    for _ in range(8):
+        _acquired(budget).release(1.0)
+    assert budget.limit == pytest.approx(9, abs=0.1)
+    assert budget.in_flight == 0
+
+
+@pytest.mark.parametrize("signal", [{"throttled": True}, {"overloaded": True}])
+def test_throttling_and_overload_halve_concurrency(signal):
+    budget = ModelBudget("m", rpm=1000, tpm=100000)
+    _acquired(budget).release(None, **signal)
+    assert budget.limit == 4
+    # At most one decrease per second of signals
+    _acquired(budget).release(None, **signal)
+    assert budget.limit == 4
+
+
+def test_other_failures_leave_concurrency_unchanged():
+    budget = ModelBudget("m", rpm=1000, tpm=100000)
+    _acquired(budget).release(None)
+    assert budget.limit == 8
+    assert budget.samples == 0
+
+
+def test_latency_spike_halves_concurrency():
+    budget = ModelBudget("m", rpm=1000, tpm=100000)
+    for _ in range(10):
+        _acquired(budget).release(1.0)
+    limit = budget.limit
+    _acquired(budget).release(10.0)
+    assert budget.limit == pytest.approx(limit / 2)
+
+
+def test_concurrency_limit_blocks_acquire():
+    budget = ModelBudget("m", rpm=1000, tpm=100000)
+    budget.limit = 1.0
+    _acquired(budget)
+    assert budget.try_acquire(1, INTERACTIVE) > 0
+
+
+@pytest.mark.parametrize("error", [
+    lambda: openai.APITimeoutError(request=REQUEST),
+    _server_error,
+])
+def test_timeouts_and_server_errors_back_off_concurrency(error, recorded):
+    limiter = OpenAILimiter()
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise error()
+        return "ok"
+
+    assert asyncio.run(limiter.call_async("m", 10, fn)) == "ok"
+    budget = limiter.budget("m")
+    # Halved by the failure, then one additive step from the success
+    assert budget.limit == pytest.approx(4.25)
+    assert budget.in_flight == 0
+    assert recorded[-1][1:] == (1, None)
+
+
+def test_sync_call_retries_and_backs_off(recorded):
+    limiter = OpenAILimiter()
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _server_error()
+        return "ok"
+
+    assert limiter.call("m", 10, fn) == "ok"
+    assert len(attempts) == 3
+    assert limiter.budget("m").limit < 8
+
+
+def test_last_retry_failure_is_raised_and_recorded(recorded):
+    limiter = OpenAILimiter()
+
+    async def fn():
+        raise openai.APITimeoutError(request=REQUEST)
+
+    with pytest.raises(openai.APITimeoutError):
+        asyncio.run(limiter.call_async("m", 10, fn))
+    assert recorded == [(recorded[0][0], 2, "APITimeoutError")]
+    assert limiter.budget("m").in_flight == 0
+
+
+class FakeStream:
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def test_streamed_call_holds_its_slot_and_latency_until_the_end(recorded):
+    limiter = OpenAILimiter()
+    response = FakeStream(["a", "b", "c"], delay=0.02)
+
+    async def run():
+        async def fn():
+            return response
+        stream = await limiter.call_async("m", 10, fn, stream=True)
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            assert limiter.budget("m").in_flight == 1
+        return chunks
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert limiter.budget("m").in_flight == 0
+    latency, retries, error = recorded[0]
+    assert latency >= 0.06
+    assert error is None
+
+
+def test_stream_closed_early_releases_without_recording_an_error(recorded):
+    limiter = OpenAILimiter()
+    response = FakeStream(["a", "b", "c"], delay=0)
+
+    async def run():
+        async def fn():
+            return response
+        stream = await limiter.call_async("m", 10, fn, stream=True)
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert limiter.budget("m").in_flight == 0
+    assert limiter.budget("m").limit == 8
+    assert response.closed
+    assert recorded == []
@@ -0,0 +1,39 @@
+import importlib.util
+from pathlib import Path
+from types import SimpleNamespace
+
+_spec = importlib.util.spec_from_file_location(
+    "partition_document_chunks", Path(__file__).parent.parent / "scripts" / "partition_document_chunks.py"
+)
+partition = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(partition)
+
+
+def policy(**fields):
+    defaults = {
+        "policyname": "Authenticated users can read document chunks",
+        "permissive": "PERMISSIVE",
+        "roles": "authenticated",
+        "cmd": "SELECT",
+        "qual": "true",
+        "with_check": None,
+    }
+    return SimpleNamespace(**{**defaults, **fields})
+
+
+def test_policy_sql_recreates_select_policy():
+    assert partition.policy_sql("document_chunks", policy()) == (
+        'CREATE POLICY "Authenticated users can read document chunks" ON document_chunks '
+        "AS PERMISSIVE FOR SELECT TO authenticated USING (true)"
+    )
+
+
+def test_policy_sql_keeps_with_check_and_quotes_name():
+    sql = partition.policy_sql("document_chunks", policy(
+        policyname='Admins "write"', cmd="INSERT", roles="service_role, postgres",
+        qual=None, with_check="(auth.role() = 'service_role'::text)"
+    ))
+    assert sql == (
+        'CREATE POLICY "Admins ""write""" ON document_chunks AS PERMISSIVE FOR INSERT '
+        "TO service_role, postgres WITH CHECK ((auth.role() = 'service_role'::text))"
+    )
@@ -0,0 +1,97 @@
+"""Tests for PDF ingestion's embedding batching and version locking."""
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.models.models import SubjectEnum
+from app.services import pdf_service as pdf_module
+from app.services.pdf_service import pdf_service
+
+
+class FakeQuery:
+    def __init__(self, material):
+        self.material = material
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.material
+
+
+class FakeSession:
+    def __init__(self, material, events):
+        self.material = material
+        self.events = events
+        self.added = []
+
+    def query(self, model):
+        return FakeQuery(self.material)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    def commit(self):
+        self.events.append("commit")
+
+
+def _state(model, target_model=None):
+    return {
+        "model": model, "column": "embedding",
+        "target_model": target_model, "target_column": "embedding_v2" if target_model else None,
+    }
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    events = []
+    states = []
+
+    def get_state(db, subject, for_share=False):
+        events.append("lock" if for_share else "read")
+        return states.pop(0) if len(states) > 1 else states[0]
+
+    def create_embeddings(texts, model=None, priority=None):
+        events.append(("embed", model, len(texts)))
+        return [[float(len(text))] for text in texts]
+
+    pages = [{"page_number": 1, "text": "One. Two. Three."}, {"page_number": 2, "text": "Four. Five."}]
+    monkeypatch.setattr(pdf_service, "extract_text_from_pdf", lambda path: pages)
+    monkeypatch.setattr(pdf_service, "chunk_text", lambda text, page_number: [
+        {"text": word, "page_number": page_number, "chunk_index": index}
+        for index, word in enumerate(text.split())
+    ])
+    monkeypatch.setattr(pdf_module.embedding_version_service, "get_state", get_state)
+    monkeypatch.setattr(pdf_module.rag_service, "create_embeddings", create_embeddings)
+    monkeypatch.setattr(pdf_module.corpus_service, "bump", lambda db, subject: events.append("bump"))
+    monkeypatch.setattr(pdf_module.settings, "INGEST_EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(pdf_module, "DocumentChunk", SimpleNamespace)
+    material = SimpleNamespace(subject=SubjectEnum.FAMILIA, processed=False)
+    return SimpleNamespace(db=FakeSession(material, events), events=events, states=states, material=material)
+
+
+def test_embeds_in_batches_before_taking_the_lock(ingestion):
+    ingestion.states.append(_state("small"))
+    total = pdf_service.process_pdf_and_create_embeddings(ingestion.db, 1, "file.pdf")
+
+    assert total == 5 == len(ingestion.db.added)
+    assert ingestion.events == [
+        "read", ("embed", "small", 2), ("embed", "small", 2), ("embed", "small", 1),
+        "lock", "bump", "commit",
+    ]
+    assert ingestion.material.processed
+
+
+def test_migration_started_while_embedding_embeds_the_target_model(ingestion):
+    ingestion.states.extend([_state("small"), _state("small", "large")])
+    pdf_service.process_pdf_and_create_embeddings(ingestion.db, 1, "file.pdf")
+
+    lock = ingestion.events.index("lock")
+    assert ("embed", "large", 2) in ingestion.events[lock:]
+    assert all(chunk.embedding_v2_model == "large" for chunk in ingestion.db.added)
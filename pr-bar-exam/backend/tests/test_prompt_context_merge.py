@@ -0,0 +1,47 @@
+"""Tests for merging an essay prompt's precomputed rows with the essay's own retrieval."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.models.models import SubjectEnum
+from app.services.prompt_context_service import _row_dict
+from app.services.rag_service import async_rag_service
+
+
+def _row(query_index, chunk_id, distance):
+    return SimpleNamespace(
+        query_index=query_index, id=chunk_id, chunk_text=f"chunk {chunk_id}", page_number=1,
+        source_title="Source", file_type="pdf", distance=distance, embedding=[1.0, 0.0]
+    )
+
+
+def test_prompt_rows_get_their_own_query_indices(monkeypatch):
+    essay_rows = [_row(0, "a", 0.2), _row(1, "b", 0.3)]
+
+    async def retrieve_rows(db, queries, subject, *args, **kwargs):
+        assert queries == ["paragraph one", "paragraph two"]
+        return essay_rows
+
+    monkeypatch.setattr(async_rag_service, "retrieve_rows", retrieve_rows)
+    # Stored the way prompt_context_service keeps them, numbered from 0
+    prompt_rows = [SimpleNamespace(**_row_dict(row)) for row in (_row(0, "a", 0.1), _row(1, "c", 0.4))]
+
+    chunks = asyncio.run(async_rag_service.retrieve_many(
+        None, ["paragraph one", "paragraph two"], SubjectEnum.FAMILIA, extra_rows=prompt_rows
+    ))
+
+    by_id = {chunk["chunk_id"]: chunk for chunk in chunks}
+    assert sorted(by_id["a"]["query_indices"]) == [0, 2]
+    assert by_id["b"]["query_indices"] == [1]
+    assert by_id["c"]["query_indices"] == [3]
+    # The best similarity across both sources wins
+    assert by_id["a"]["similarity_score"] == pytest.approx(0.9)
+    # The stored rows themselves are left as they were
+    assert [row.query_index for row in prompt_rows] == [0, 1]
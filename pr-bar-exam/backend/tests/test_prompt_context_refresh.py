@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.models.models import SubjectEnum
+from app.services import prompt_context_service as module
+from app.services.prompt_context_service import PromptContextService
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_request_refresh_runs_in_background(monkeypatch):
+    service = PromptContextService()
+    subjects = list(SubjectEnum)[:2]
+    refreshed = []
+
+    async def refresh_stale(db, subject=None):
+        refreshed.append(subject)
+        return 1
+
+    monkeypatch.setattr(module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(service, "refresh_stale", refresh_stale)
+
+    async def run():
+        service.request_refresh(subjects[0])
+        service.request_refresh(subjects[1])
+        assert refreshed == []  # the caller's request doesn't wait for it
+        await service._task
+
+    asyncio.run(run())
+    assert sorted(refreshed, key=str) == sorted(subjects, key=str)
+
+
+def test_failed_refresh_moves_on(monkeypatch):
+    service = PromptContextService()
+    subjects = list(SubjectEnum)[:2]
+    refreshed = []
+
+    async def refresh_stale(db, subject=None):
+        refreshed.append(subject)
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(service, "refresh_stale", refresh_stale)
+
+    async def run():
+        for subject in subjects:
+            service.request_refresh(subject)
+        await service._task
+
+    asyncio.run(run())
+    assert len(refreshed) == 2
+
+
+def test_request_refresh_outside_event_loop_is_noop():
+    service = PromptContextService()
+    service.request_refresh(list(SubjectEnum)[0])
+    assert service._task is None and not service._pending
@@ -0,0 +1,103 @@
+"""Tests for question bank draws, serve counting and the quiz request bounds."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.api.quiz import QuizGenerateRequest
+from app.models.models import SubjectEnum, DifficultyEnum
+from app.services import question_bank_service as bank_module
+from app.services.question_bank_service import QuestionBankService
+
+
+class FakeResult:
+    def __init__(self, values):
+        self.values = values
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.values
+
+
+class FakeSession:
+    """Answers selects from `picks` in order and updates with `retired`."""
+
+    def __init__(self, picks, retired):
+        self.picks = list(picks)
+        self.retired = retired
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        if statement.is_select:
+            return FakeResult(self.picks.pop(0))
+        return FakeResult(self.retired)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def bank(monkeypatch):
+    service = QuestionBankService()
+    service.refills = 0
+    monkeypatch.setattr(service, "request_refill", lambda: setattr(service, "refills", service.refills + 1))
+    monkeypatch.setattr(bank_module.model_router, "available", lambda task: True)
+    return service
+
+
+def _draw(service, db, num_questions):
+    return asyncio.run(service.draw(db, SubjectEnum.FAMILIA, DifficultyEnum.MEDIUM, num_questions))
+
+
+def test_draw_prefers_active_least_served_and_counts_serves(bank):
+    questions = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+    db = FakeSession([questions], retired=[None, None])
+
+    assert _draw(bank, db, 2) == questions
+    select_sql, update_sql = db.statements
+    assert "retired_at IS NULL" in select_sql
+    assert "ORDER BY questions.served_count, random()" in select_sql
+    assert "served_count=(questions.served_count" in update_sql
+    assert db.commits == 1
+    assert bank.refills == 0
+
+
+def test_retiring_a_question_wakes_the_refill(bank):
+    db = FakeSession([[SimpleNamespace(id=1)]], retired=["2026-10-19"])
+    _draw(bank, db, 1)
+    assert bank.refills == 1
+
+
+def test_short_pool_requests_refill(bank):
+    db = FakeSession([[]], retired=[])
+    assert _draw(bank, db, 3) == []
+    # Nothing drawn, so nothing to mark served
+    assert len(db.statements) == 1
+    assert bank.refills == 1
+
+
+def test_degraded_draw_tops_up_from_other_difficulties(bank, monkeypatch):
+    monkeypatch.setattr(bank_module.model_router, "available", lambda task: False)
+    db = FakeSession([[SimpleNamespace(id=1)], [SimpleNamespace(id=2)]], retired=[None, None])
+
+    assert [question.id for question in _draw(bank, db, 2)] == [1, 2]
+    assert "questions.difficulty != " in db.statements[1]
+    assert bank.refills == 0
+
+
+@pytest.mark.parametrize("num_questions", [0, 51])
+def test_quiz_request_bounds_num_questions(num_questions):
+    with pytest.raises(ValidationError):
+        QuizGenerateRequest(subject="familia", num_questions=num_questions)
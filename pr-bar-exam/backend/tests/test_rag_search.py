@@ -0,0 +1,113 @@
+"""Tests for AsyncRAGService.retrieve_each (the /rag/search retrieval path)."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+try:
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    pytest.skip("tiktoken encoding data unavailable", allow_module_level=True)
+
+from app.models.models import SubjectEnum
+from app.services import rag_service as rag_module
+from app.services.rag_service import async_rag_service
+from app.services.retrieval_cache import retrieval_cache
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    """Answers the retrieval query with two rows tagged by the embedded query."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if params and "subject" in params and "embedding" in params:
+            query = params["embedding"]
+            if query == "boom":
+                raise RuntimeError("connection reset")
+            return _Result([
+                SimpleNamespace(id=f"{query}-2", chunk_text=f"{query} 2", source_title="Source", page_number=1, distance=0.3),
+                SimpleNamespace(id=f"{query}-1", chunk_text=f"{query} 1", source_title="Source", page_number=1, distance=0.1),
+            ])
+        return _Result([])
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    state = {"embedded": []}
+
+    async def get_state_async(db, subject):
+        return {"model": "text-embedding-3-small", "column": "embedding"}
+
+    async def get_version_async(db, subject):
+        return 1
+
+    async def create_embedding(text, model=None, priority=None):
+        state["embedded"].append(text)
+        await asyncio.sleep(0.01)
+        # Stands in for the vector; the fake session reads it back
+        return text
+
+    monkeypatch.setattr(rag_module.embedding_version_service, "get_state_async", get_state_async)
+    monkeypatch.setattr(rag_module.corpus_service, "get_version_async", get_version_async)
+    monkeypatch.setattr(rag_module, "AsyncSessionLocal", FakeSession)
+    monkeypatch.setattr(async_rag_service, "create_embedding", create_embedding)
+    monkeypatch.setattr(async_rag_service, "_retrieval_params", lambda *args: {"subject": "x", "embedding": args[0]})
+    retrieval_cache.clear()
+    yield state
+    retrieval_cache.clear()
+
+
+def _collect(queries):
+    async def run():
+        return [item async for item in async_rag_service.retrieve_each(None, queries)]
+    return asyncio.run(run())
+
+
+def test_each_query_is_retrieved_and_identical_ones_coalesce(retrieval):
+    queries = [
+        ("a", SubjectEnum.FAMILIA, 5),
+        ("a", SubjectEnum.FAMILIA, 5),
+        ("b", SubjectEnum.FAMILIA, 3),
+    ]
+    results = dict(_collect(queries))
+
+    assert set(results) == {0, 1, 2}
+    # Identical in-flight queries share one embedding call and search
+    assert sorted(retrieval["embedded"]) == ["a", "b"]
+    assert [chunk["chunk_id"] for chunk in results[0]] == ["a-2", "a-1"]
+    assert results[0] == results[1]
+
+
+def test_cached_queries_skip_retrieval(retrieval):
+    queries = [("a", SubjectEnum.FAMILIA, 5)]
+    first = _collect(queries)
+    retrieval["embedded"].clear()
+    second = _collect(queries)
+
+    assert retrieval["embedded"] == []
+    assert second == first
+
+
+def test_failed_query_raises_after_finished_ones(retrieval):
+    async def run():
+        seen = []
+        with pytest.raises(RuntimeError):
+            async for index, _ in async_rag_service.retrieve_each(None, [("boom", SubjectEnum.FAMILIA, 5)]):
+                seen.append(index)
+        return seen
+
+    assert asyncio.run(run()) == []
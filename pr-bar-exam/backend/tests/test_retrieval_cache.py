@@ -0,0 +1,43 @@
+from app.services.retrieval_cache import RetrievalCache, query_fingerprint
+
+
+def test_fingerprint_ignores_whitespace_only():
+    assert query_fingerprint("  patria   potestad\n") == query_fingerprint("patria potestad")
+    assert query_fingerprint("patria potestad") != query_fingerprint("Patria potestad")
+
+
+def test_key_changes_with_corpus_version_and_params():
+    cache = RetrievalCache()
+    key = cache.make_key("familia", 1, "q", top_k=5, mmr_lambda=None)
+    assert key == cache.make_key("familia", 1, " q ", mmr_lambda=None, top_k=5)
+    assert key != cache.make_key("familia", 2, "q", top_k=5, mmr_lambda=None)
+    assert key != cache.make_key("familia", 1, "q", top_k=3, mmr_lambda=None)
+    assert key != cache.make_key("penal", 1, "q", top_k=5, mmr_lambda=None)
+
+
+def test_lru_eviction_and_stats():
+    cache = RetrievalCache(max_entries=2)
+    cache.set("a", [{"id": 1}])
+    cache.set("b", [{"id": 2}])
+    assert cache.get("a") == [{"id": 1}]
+    cache.set("c", [{"id": 3}])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1}
+
+
+def test_results_are_copied_in_and_out():
+    cache = RetrievalCache()
+    results = [{"text": "original"}]
+    cache.set("k", results)
+    results[0]["text"] = "mutated by caller"
+    served = cache.get("k")
+    served[0]["text"] = "mutated by reader"
+    assert cache.get("k") == [{"text": "original"}]
+
+
+def test_disabled_cache_stores_nothing():
+    cache = RetrievalCache(max_entries=0)
+    cache.set("k", [])
+    assert cache.get("k") is None
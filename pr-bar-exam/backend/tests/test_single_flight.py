@@ -0,0 +1,160 @@
+"""Tests for single-flight request coalescing."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight, request_key
+
+
+def test_request_key_ignores_parameter_order():
+    assert request_key("embedding", model="m", input="x") == request_key("embedding", input="x", model="m")
+    assert request_key("embedding", model="m", input="x") != request_key("embeddings", model="m", input="x")
+
+
+def _run_threads(flight, fn, count):
+    results = [None] * count
+
+    def worker(index):
+        results[index] = flight.do("key", fn)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_sync_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"value": [1, 2]}
+
+    results = _run_threads(flight, fn, 4)
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 3, "in_flight": 0}
+    assert all(result == {"value": [1, 2]} for result in results)
+    assert len({id(result) for result in results}) == 4
+
+
+def test_leader_mutation_does_not_reach_followers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait()
+        return {"value": 1}
+
+    leader_result = {}
+
+    def leader():
+        result = flight.do("key", fn)
+        # Mutate before the follower wakes up and copies
+        result["value"] = "mutated"
+        leader_result.update(result)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    follower_result = []
+    follower = threading.Thread(target=lambda: follower_result.append(flight.do("key", fn)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader_thread.join()
+    follower.join()
+
+    assert leader_result == {"value": "mutated"}
+    assert follower_result == [{"value": 1}]
+
+
+def test_sync_follower_stops_waiting_after_timeout():
+    flight = SingleFlight(wait_seconds=0.05)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return "leader"
+
+    leader = threading.Thread(target=lambda: flight.do("key", slow))
+    leader.start()
+    started.wait()
+    try:
+        assert flight.do("key", lambda: "own") == "own"
+    finally:
+        release.set()
+        leader.join()
+
+
+def test_sync_errors_reach_followers():
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.05)
+        raise ValueError("upstream failed")
+
+    errors = []
+
+    def worker():
+        try:
+            flight.do("key", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_calls_share_one_task_and_get_copies():
+    flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": [1]}
+
+    async def run():
+        results = await asyncio.gather(*(flight.do_async("key", fn) for _ in range(3)))
+        results[0]["value"].append("mutated")
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results[1:] == [{"value": [1]}, {"value": [1]}]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "done"
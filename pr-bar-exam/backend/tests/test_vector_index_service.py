@@ -0,0 +1,93 @@
+import pytest
+from app.services.vector_index_service import vector_index_service
+
+
+class _Result:
+    def __init__(self, value=None, rows=()):
+        self.value = value
+        self.rows = list(rows)
+
+    def scalar(self):
+        return self.value
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeConnection:
+    """Records executed SQL; answers the advisory lock and partition lookups."""
+
+    def __init__(self, partitions=(), locked=False, attached=()):
+        self.partitions = list(partitions)
+        self.attached = list(attached)
+        self.locked = locked
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "pg_try_advisory_lock" in sql:
+            return _Result(not self.locked)
+        if "pg_index" in sql:
+            return _Result(rows=self.attached)
+        if "pg_inherits" in sql:
+            return _Result(rows=self.partitions)
+        return _Result()
+
+    def index_of(self, prefix):
+        return next(i for i, sql in enumerate(self.statements) if sql.strip().startswith(prefix))
+
+
+def test_rebuild_renames_new_index_into_place_before_dropping_old():
+    conn = FakeConnection()
+    result = vector_index_service.rebuild_index(conn, index_type="hnsw")
+
+    assert result["index_name"] == "document_chunks_embedding_idx"
+    swap = conn.index_of("ALTER INDEX IF EXISTS document_chunks_embedding_idx RENAME TO document_chunks_embedding_idx_old")
+    assert "ALTER INDEX document_chunks_embedding_idx_new RENAME TO document_chunks_embedding_idx" in conn.statements[swap]
+    drop_old = max(i for i, sql in enumerate(conn.statements) if "DROP INDEX CONCURRENTLY IF EXISTS document_chunks_embedding_idx_old" in sql)
+    assert drop_old > swap
+    assert not any(sql.strip() == "DROP INDEX CONCURRENTLY IF EXISTS document_chunks_embedding_idx" for sql in conn.statements)
+    assert "pg_advisory_unlock" in conn.statements[-1]
+
+
+def test_rebuild_partitioned_swaps_parent_and_partition_indexes_together():
+    conn = FakeConnection(partitions=["document_chunks_familia", "document_chunks_penal"])
+    vector_index_service.rebuild_index(conn, index_type="hnsw")
+
+    swap = next(sql for sql in conn.statements if "RENAME TO document_chunks_embedding_idx_old" in sql)
+    assert "document_chunks_familia_embedding_idx_new RENAME TO document_chunks_familia_embedding_idx" in swap
+    assert "document_chunks_penal_embedding_idx_new RENAME TO document_chunks_penal_embedding_idx" in swap
+    drop_old = max(i for i, sql in enumerate(conn.statements) if sql == "DROP INDEX IF EXISTS document_chunks_embedding_idx_old")
+    assert drop_old > conn.statements.index(swap)
+
+
+def test_rebuild_partitioned_renames_generated_partition_index_names():
+    conn = FakeConnection(
+        partitions=["document_chunks_familia", "document_chunks_penal"],
+        attached=[
+            ("document_chunks_familia", "document_chunks_familia_embedding_idx1"),
+            ("document_chunks_penal", "document_chunks_penal_embedding_idx"),
+        ]
+    )
+    vector_index_service.rebuild_index(conn, index_type="hnsw")
+
+    swap = next(sql for sql in conn.statements if "RENAME TO document_chunks_embedding_idx_old" in sql)
+    assert "ALTER INDEX IF EXISTS document_chunks_familia_embedding_idx1 RENAME TO document_chunks_familia_embedding_idx_old" in swap
+    assert "document_chunks_familia_embedding_idx_new RENAME TO document_chunks_familia_embedding_idx" in swap
+    assert "ALTER INDEX IF EXISTS document_chunks_penal_embedding_idx RENAME TO document_chunks_penal_embedding_idx_old" in swap
+
+
+def test_concurrent_rebuild_is_refused():
+    conn = FakeConnection(locked=True)
+    with pytest.raises(ValueError):
+        vector_index_service.rebuild_index(conn, index_type="hnsw")
+    assert not any("CREATE INDEX" in sql for sql in conn.statements)
+
+
+def test_build_index_sql_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        vector_index_service.build_index_sql(index_type="btree")